@@ -0,0 +1,124 @@
+"""
+Benchmark streaming history export and import.
+
+Fills a scratch history store with synthetic conversations, then exports it
+as plain and gzipped JSONL and imports the gzipped archive into a fresh
+store, reporting throughput for each step. With ``--trace-memory`` the plain
+export is repeated under tracemalloc to show its peak allocation, which
+should not grow with ``--size-mb``.
+
+Usage:
+    python -m dev.benchmarks.history_archive [--size-mb 256] [--dir /tmp/bench]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from src.services.archive import (
+    encode_archive,
+    export_records,
+    import_records,
+    read_archive,
+)
+from src.services.history_store import HistoryStore
+
+WORDS = ["stream", "token", "reply", "model", "chunk", "buffer", "frame", "text"]
+MESSAGES_PER_CONVERSATION = 40
+
+
+def fill_store(history, size_bytes, seed=0):
+    """
+    Write synthetic conversations until their content reaches ``size_bytes``.
+    """
+    rng = random.Random(seed)
+    corpus = " ".join(rng.choice(WORDS) for _ in range(200_000))
+    written = 0
+    conversation = 0
+    while written < size_bytes:
+        conversation_id = f"bench-{conversation:08d}"
+        messages = []
+        parent_id = None
+        first_id = history.reserve_ids(MESSAGES_PER_CONVERSATION)
+        for index in range(MESSAGES_PER_CONVERSATION):
+            length = rng.randint(200, 4000)
+            start = rng.randrange(len(corpus) - length)
+            content = corpus[start : start + length]
+            role = "user" if index % 2 == 0 else "ai"
+            message_id = first_id + index
+            messages.append(
+                (message_id, conversation_id, role, content, time.time(), parent_id)
+            )
+            parent_id = message_id
+            written += length
+        history.import_batch(
+            [(conversation_id, "bench", "Bench", time.time())], messages
+        )
+        conversation += 1
+    return conversation
+
+
+def export_to(history, path, compress):
+    size = 0
+    with open(path, "wb") as output:
+        for chunk in encode_archive(export_records(history), compress=compress):
+            output.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def timed(label, size_mb, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<16}{elapsed:>10.2f}{size_mb / elapsed:>12.1f}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--dir", default=None, help="Scratch directory")
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="history-archive-", dir=args.dir)
+    try:
+        source = HistoryStore(os.path.join(directory, "source.sqlite3"))
+        started = time.perf_counter()
+        conversations = fill_store(source, args.size_mb * 1_000_000)
+        print(
+            f"{conversations:,} conversations, {args.size_mb:,} MB of content, "
+            f"filled in {time.perf_counter() - started:.1f}s"
+        )
+
+        plain = os.path.join(directory, "history.jsonl")
+        compressed = os.path.join(directory, "history.jsonl.gz")
+        plain_mb = export_to(source, os.devnull, False) / 1e6
+        print(f"{'step':<16}{'wall (s)':>10}{'MB/s':>12}  (MB of JSONL)")
+        timed("export", plain_mb, export_to, source, plain, False)
+        gzip_bytes = timed("export gzip", plain_mb, export_to, source, compressed, True)
+
+        target = HistoryStore(os.path.join(directory, "target.sqlite3"))
+        with open(compressed, "rb") as f:
+            timed("import gzip", plain_mb, import_records, target, read_archive(f))
+        target.close()
+        print(f"JSONL {plain_mb:,.0f} MB, gzip {gzip_bytes / 1e6:,.0f} MB")
+
+        if args.trace_memory:
+            tracemalloc.start()
+            export_to(source, os.devnull, False)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"export peak allocation: {peak / 1024:,.0f} KiB")
+        source.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark reply accumulation while streaming.
+
+Compares the previous approach (a chunk list kept next to a string grown by
+``+=`` and shared with the message dict) with StreamBuffer. Both consume
+``--chunks-per-frame`` chunks per painted frame; ConversationService reveals
+every chunk due per frame, about 10 at the default rate and frame interval.
+
+Usage:
+    python -m dev.benchmarks.stream_buffer [--tokens 50000] [--chunks-per-frame 10]
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from src.services.stream_buffer import StreamBuffer
+
+WORDS = ["stream", "token", "reply", "model", "chunk", "buffer", "frame", "text"]
+
+
+def make_chunks(count, seed=0):
+    rng = random.Random(seed)
+    return [" " + rng.choice(WORDS) for _ in range(count)]
+
+
+def concatenate(chunks, per_frame):
+    state = {"stream_chunks": list(chunks), "streaming_response": ""}
+    message = {"role": "ai", "content": ""}
+    for index in range(0, len(state["stream_chunks"]), per_frame):
+        for chunk in state["stream_chunks"][index : index + per_frame]:
+            state["streaming_response"] += chunk
+        message["content"] = state["streaming_response"]
+    return message["content"]
+
+
+def stream_buffer(chunks, per_frame):
+    buffer = StreamBuffer()
+    for chunk in chunks:
+        buffer.append(chunk)
+    message = {"role": "ai", "content": ""}
+    while buffer.pending:
+        buffer.reveal(per_frame)
+        message["content"] = buffer.text
+    text = message["content"]
+    buffer.release()
+    return text
+
+
+def measure(strategy, chunks, per_frame):
+    gc.collect()
+    started = time.perf_counter()
+    strategy(chunks, per_frame)
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    strategy(chunks, per_frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=50_000)
+    parser.add_argument("--chunks-per-frame", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    per_frame = args.chunks_per_frame
+    chunks = make_chunks(args.tokens)
+    assert concatenate(chunks, per_frame) == stream_buffer(chunks, per_frame)
+    reply_kib = sum(len(chunk) for chunk in chunks) / 1024
+    print(
+        f"{args.tokens:,} chunks, {reply_kib:,.0f} KiB reply, "
+        f"{per_frame} chunk(s) per frame"
+    )
+    print(f"{'strategy':<14}{'cpu (s)':>10}{'peak (KiB)':>14}")
+    for name, strategy in [
+        ("concatenate", concatenate),
+        ("StreamBuffer", stream_buffer),
+    ]:
+        elapsed, peak = measure(strategy, chunks, per_frame)
+        print(f"{name:<14}{elapsed:>10.3f}{peak / 1024:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
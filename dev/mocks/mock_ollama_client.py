@@ -35,7 +35,16 @@ class MockOllamaApiClient(OllamaClientInterface):
             else:
                 yield word
 
-    def generate(self, prompt: str, model: str = None) -> AsyncGenerator[str, None]:
+    def generate(
+        self,
+        prompt: str,
+        model: str = None,
+        context=None,
+        on_done=None,
+        stop=None,
+        max_chars=None,
+        max_tokens=None,
+    ) -> AsyncGenerator[str, None]:
         """
         Generates mock text responses with streaming.
 
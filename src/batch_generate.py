@@ -0,0 +1,198 @@
+"""
+Run prompts from a JSONL file through the Ollama client in batch.
+
+Usage:
+    python src/batch_generate.py prompts.jsonl results.jsonl --concurrency 8
+
+Each input line is a JSON object with a ``prompt`` and an optional ``id``
+(the line number is used otherwise). Results are appended to the output file
+as they finish, one JSON object per line with per-item timings. Re-running
+with the same output file skips prompts that already succeeded.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def read_prompts(path, prompt_field="prompt", id_field="id"):
+    """
+    Yield ``(item_id, prompt)`` pairs from a JSONL file without loading it whole.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping invalid JSON on line %d", line_number)
+                continue
+            prompt = record.get(prompt_field)
+            if not isinstance(prompt, str):
+                logger.warning("Skipping line %d without a prompt", line_number)
+                continue
+            yield str(record.get(id_field, line_number)), prompt
+
+
+def completed_ids(path):
+    """
+    Return the ids that already succeeded in an existing output file.
+    """
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted run
+                    continue
+                if "error" not in result:
+                    done.add(result["id"])
+    except FileNotFoundError:
+        pass
+    return done
+
+
+async def generate_one(client, item_id, prompt, model=None):
+    """
+    Generate a single response and measure its timings.
+
+    The client logs upstream failures and ends the stream instead of
+    raising, so a stream without a final message, or without any text, is
+    recorded as an error and retried on the next run.
+    """
+    started = time.perf_counter()
+    first_chunk_at = None
+    chunks = []
+    done = []
+    result = {"id": item_id}
+    try:
+        async for chunk in client.generate(prompt, model, on_done=done.append):
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            chunks.append(chunk)
+    except Exception as e:
+        result["error"] = str(e)
+    else:
+        if not done:
+            result["error"] = "Stream ended without a final message"
+        elif not chunks:
+            result["error"] = "Empty response"
+    finished = time.perf_counter()
+
+    result["response"] = "".join(chunks)
+    result["chunks"] = len(chunks)
+    result["chars"] = len(result["response"])
+    result["ttft_ms"] = (
+        round((first_chunk_at - started) * 1000, 1) if first_chunk_at else None
+    )
+    result["total_ms"] = round((finished - started) * 1000, 1)
+    return result
+
+
+async def run_batch(client, prompts, output, concurrency=4, model=None, skip=()):
+    """
+    Run prompts with at most ``concurrency`` generations in flight.
+
+    Input is consumed lazily, so memory stays bounded by ``concurrency``
+    regardless of the size of the prompt file.
+
+    Returns:
+        A dict of aggregate statistics.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight = set()
+    stats = {"completed": 0, "failed": 0, "skipped": 0, "chars": 0}
+    started = time.perf_counter()
+
+    async def worker(item_id, prompt):
+        try:
+            result = await generate_one(client, item_id, prompt, model)
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            stats["failed" if "error" in result else "completed"] += 1
+            stats["chars"] += result["chars"]
+        finally:
+            semaphore.release()
+
+    for item_id, prompt in prompts:
+        if item_id in skip:
+            stats["skipped"] += 1
+            continue
+        await semaphore.acquire()
+        task = asyncio.create_task(worker(item_id, prompt))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["items_per_s"] = round(stats["completed"] / elapsed, 3) if elapsed else 0.0
+    stats["chars_per_s"] = round(stats["chars"] / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate responses for JSONL prompts with bounded concurrency."
+    )
+    parser.add_argument("input", help="JSONL file with one prompt object per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model", default=None, help="Defaults to OLLAMA_MODEL")
+    parser.add_argument("--prompt-field", default="prompt")
+    parser.add_argument("--id-field", default="id")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    from clients.ollama_api_client import OllamaApiClient
+    from config import get_settings
+
+    client = OllamaApiClient.from_settings(get_settings())
+    skip = completed_ids(args.output)
+    prompts = read_prompts(args.input, args.prompt_field, args.id_field)
+
+    async def run_pooled(output):
+        # One connection pool sized to the concurrency serves the whole batch
+        client.pool_size = args.concurrency
+        await client.open_pool()
+        try:
+            return await run_batch(
+                client,
+                prompts,
+                output,
+                concurrency=args.concurrency,
+                model=args.model,
+                skip=skip,
+            )
+        finally:
+            await client.close_pool()
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        try:
+            stats = asyncio.run(run_pooled(output))
+        except KeyboardInterrupt:
+            logger.info("Interrupted; re-run with the same output file to resume")
+            return 130
+
+    print(json.dumps(stats), file=sys.stderr)
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
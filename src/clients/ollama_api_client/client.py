@@ -1,52 +1,223 @@
+import asyncio
 import json
 import logging
-import os
+import time
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
 import httpx
-import streamlit as st
 
 from .interface import OllamaClientInterface
+from .output_limiter import OutputLimiter
 
 logger = logging.getLogger(__name__)
 
+MODEL_COLD = "cold"
+MODEL_WARMING = "warming"
+MODEL_WARM = "warm"
+
+# Fields of the final stream message passed to on_done callbacks
+DONE_FIELDS = (
+    "context",
+    "done_reason",
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+
+def _event(name, level=logging.INFO, **attributes):
+    """
+    Log a structured event; request correlation fields are added by the handler.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, name, extra={"event": name, "attributes": attributes})
+
 
 class OllamaApiClient(OllamaClientInterface):
     """
     A client for interacting with the Ollama API.
     """
 
-    def __init__(self):
-        self.api_url = os.getenv("OLLAMA_API_ENDPOINT")
-        if not self.api_url:
-            # Fallback to Streamlit secrets if available
-            try:
-                self.api_url = st.secrets.get("OLLAMA_API_ENDPOINT")
-            except Exception:
-                pass
-
-        if not self.api_url:
+    def __init__(
+        self,
+        api_url,
+        default_model=None,
+        pool_size=10,
+        keep_alive=600,
+        connect_timeout=10.0,
+        read_timeout=120.0,
+        stop=(),
+        max_chars=None,
+        max_tokens=None,
+    ):
+        if not api_url:
             raise ValueError(
                 "OLLAMA_API_ENDPOINT is not configured in environment variables or Streamlit secrets."
             )
+        self.api_url = api_url
+        self.default_model = default_model
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = httpx.Timeout(connect_timeout, read=read_timeout)
+        self.stop = tuple(stop)
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
         self.generate_endpoint = f"{self.api_url}/api/v1/generate"
+        self._pool = None
+        self._pool_loop = None
+        self._model_state = {}
+        self._warmed_at = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Create a client from the application settings.
+        """
+        return cls(
+            settings.ollama_api_endpoint,
+            default_model=settings.ollama_model,
+            pool_size=settings.ollama_pool_size,
+            keep_alive=settings.ollama_keep_alive,
+            connect_timeout=settings.ollama_connect_timeout,
+            read_timeout=settings.ollama_read_timeout,
+            # Environment values cannot hold newlines, so "\n" is accepted instead
+            stop=tuple(s.replace("\\n", "\n") for s in settings.ollama_stop),
+            max_chars=settings.ollama_max_output_chars or None,
+            max_tokens=settings.ollama_max_output_tokens or None,
+        )
+
+    async def open_pool(self):
+        """
+        Create a pooled HTTP client bound to the running event loop.
+
+        Requests made on that loop reuse keep-alive connections; requests on
+        any other loop fall back to a short-lived client.
+        """
+        if self._pool is not None:
+            return
+        self._pool = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+        self._pool_loop = asyncio.get_running_loop()
+
+    async def close_pool(self):
+        if self._pool is not None:
+            await self._pool.aclose()
+            self._pool = None
+            self._pool_loop = None
+
+    async def prewarm_connections(self, count=None):
+        """
+        Open pooled connections ahead of the first request.
+        """
+        if self._pool is None:
+            await self.open_pool()
+        count = min(count or self.pool_size, self.pool_size)
+
+        async def touch():
+            try:
+                await self._pool.get(self.api_url)
+            except httpx.HTTPError as e:
+                logger.warning("Connection prewarm failed: %s", e)
+
+        await asyncio.gather(*(touch() for _ in range(count)))
+
+    @asynccontextmanager
+    async def _http_client(self):
+        if self._pool is not None and self._pool_loop is asyncio.get_running_loop():
+            yield self._pool
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                yield client
+
+    async def warm_up(self, model: str = None) -> bool:
+        """
+        Load a model on the server and refresh its keep-alive.
+
+        Sends an empty prompt, which makes Ollama-style backends load the
+        model without generating, and waits for the stream to finish.
+
+        Returns:
+            True if the model is now warm.
+        """
+        model = model or self._default_model()
+        self._model_state[model] = MODEL_WARMING
+        payload = {
+            "prompt": "",
+            "model_name": model,
+            "stream": True,
+            "keep_alive": f"{int(self.keep_alive)}s",
+        }
+        try:
+            async with self._http_client() as client:
+                async with client.stream(
+                    "POST",
+                    self.generate_endpoint,
+                    json=payload,
+                    headers={"Accept": "text/event-stream"},
+                ) as response:
+                    response.raise_for_status()
+                    async for _ in response.aiter_lines():
+                        pass
+        except httpx.HTTPError as e:
+            logger.error("Warm-up of model %s failed: %s", model, e)
+            self._model_state[model] = MODEL_COLD
+            return False
+        self._mark_warm(model)
+        return True
+
+    def model_status(self, model: str = None) -> str:
+        """
+        Return whether a model is believed to be loaded on the server.
+
+        A model is warm until its keep-alive expires without a new request.
+        """
+        model = model or self._default_model()
+        state = self._model_state.get(model, MODEL_COLD)
+        if state == MODEL_WARM:
+            if time.monotonic() - self._warmed_at[model] > self.keep_alive:
+                return MODEL_COLD
+        return state
+
+    def _mark_warm(self, model):
+        self._model_state[model] = MODEL_WARM
+        self._warmed_at[model] = time.monotonic()
 
     async def _stream_response(
-        self, prompt: str, model: str
+        self, prompt: str, model: str, context=None, on_done=None, limiter=None
     ) -> AsyncGenerator[str, None]:
         """
         Stream response from the Ollama API.
+
+        When the limiter stops the reply, the response is closed right away
+        instead of being drained, which tells the server to stop generating.
         """
         payload = {
             "prompt": prompt,
             "model_name": model,
             "stream": True,
         }
+        if context:
+            payload["context"] = list(context)
+        started = time.monotonic()
+        _event(
+            "upstream.request",
+            model=model,
+            endpoint=self.generate_endpoint,
+            prompt_chars=len(prompt),
+            context_tokens=len(context or ()),
+        )
 
         try:
-            async with httpx.AsyncClient(
-                timeout=httpx.Timeout(10.0, read=120.0)
-            ) as client:
+            async with self._http_client() as client:
                 async with client.stream(
                     "POST",
                     self.generate_endpoint,
@@ -54,29 +225,101 @@ class OllamaApiClient(OllamaClientInterface):
                     headers={"Accept": "text/event-stream"},
                 ) as response:
                     response.raise_for_status()
+                    # Any served request keeps the model loaded
+                    self._mark_warm(model)
+                    first_token = True
 
                     async for line in response.aiter_lines():
                         if line.startswith("data: "):
                             try:
                                 data = json.loads(line[6:])  # Remove "data: " prefix
-                                if "response" in data:
-                                    yield data["response"]
                             except json.JSONDecodeError:
                                 continue
+                            chunk = data.get("response")
+                            if chunk and limiter is not None:
+                                chunk = limiter.feed(chunk)
+                            if chunk:
+                                if first_token:
+                                    first_token = False
+                                    _event(
+                                        "upstream.first_token",
+                                        model=model,
+                                        ttft_ms=_ms_since(started),
+                                    )
+                                yield chunk
+                            if limiter is not None and limiter.stopped:
+                                _event(
+                                    "upstream.stopped",
+                                    model=model,
+                                    done_reason=limiter.done_reason,
+                                    duration_ms=_ms_since(started),
+                                )
+                                if on_done is not None:
+                                    on_done({"done_reason": limiter.done_reason})
+                                return
+                            if data.get("done"):
+                                tail = limiter.flush() if limiter else ""
+                                if tail:
+                                    yield tail
+                                _event(
+                                    "upstream.done",
+                                    model=model,
+                                    duration_ms=_ms_since(started),
+                                    context_tokens=len(data.get("context") or ()),
+                                    **{
+                                        k: data[k]
+                                        for k in DONE_FIELDS
+                                        if k in data and k != "context"
+                                    },
+                                )
+                                if on_done is not None:
+                                    on_done(
+                                        {k: data[k] for k in DONE_FIELDS if k in data}
+                                    )
+
+                    # A stream cut off without a final message keeps held text
+                    tail = limiter.flush() if limiter else ""
+                    if tail:
+                        yield tail
         except httpx.RequestError as e:
-            logger.error(f"Ollama API streaming request failed: {e}")
+            _event(
+                "upstream.error",
+                logging.ERROR,
+                model=model,
+                endpoint=self.generate_endpoint,
+                error=repr(e),
+                duration_ms=_ms_since(started),
+            )
             return
         except Exception as e:
-            logger.error(f"Unexpected error in Ollama API streaming: {e}")
+            logger.exception("Unexpected error in Ollama API streaming: %s", e)
             return
 
-    def generate(self, prompt: str, model: str = None) -> AsyncGenerator[str, None]:
+    def generate(
+        self,
+        prompt: str,
+        model: str = None,
+        context=None,
+        on_done=None,
+        stop=None,
+        max_chars=None,
+        max_tokens=None,
+    ) -> AsyncGenerator[str, None]:
         """
         Generates text using the Ollama API with streaming.
 
         Args:
             prompt: The prompt to send to the model.
             model: The name of the model to use for generation.
+            context: Token context returned by a previous generation. The
+                server continues from it, so only ``prompt`` needs prefill.
+            on_done: Called with the final message's context and timing
+                fields once the server reports the generation as done, or
+                with just a ``done_reason`` if the reply was cut short.
+            stop: Sequences that end the reply; they are not included in it.
+                Added to the stop sequences the client was configured with.
+            max_chars: Maximum characters of the reply, overriding the default.
+            max_tokens: Maximum streamed tokens of the reply, overriding the default.
 
         Returns:
             AsyncGenerator yielding text chunks.
@@ -84,12 +327,24 @@ class OllamaApiClient(OllamaClientInterface):
         Raises:
             httpx.RequestError: If a network error occurs.
         """
-        # Use environment variable model if not specified
+        # Use the configured default model if not specified
         if model is None:
-            model = os.getenv("OLLAMA_MODEL")
-            if not model:
-                raise ValueError(
-                    "OLLAMA_MODEL is not configured in environment variables."
-                )
+            model = self._default_model()
+
+        stop = self.stop + tuple(stop or ())
+        max_chars = max_chars if max_chars is not None else self.max_chars
+        max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+        limiter = None
+        if stop or max_chars is not None or max_tokens is not None:
+            limiter = OutputLimiter(stop, max_chars, max_tokens)
+
+        return self._stream_response(prompt, model, context, on_done, limiter)
+
+    def _default_model(self):
+        if not self.default_model:
+            raise ValueError("OLLAMA_MODEL is not configured in environment variables.")
+        return self.default_model
+
 
-        return self._stream_response(prompt, model)
+def _ms_since(started):
+    return round((time.monotonic() - started) * 1000, 1)
@@ -8,15 +8,48 @@ class OllamaClientInterface(ABC):
     """
 
     @abstractmethod
-    def generate(self, prompt: str, model: str = None) -> AsyncGenerator[str, None]:
+    def generate(
+        self,
+        prompt: str,
+        model: str = None,
+        context=None,
+        on_done=None,
+        stop=None,
+        max_chars=None,
+        max_tokens=None,
+    ) -> AsyncGenerator[str, None]:
         """
         Generate text using the model with streaming.
 
         Args:
             prompt: The prompt to send to the model.
             model: The name of the model to use for generation.
+            context: Token context of a previous generation to continue from.
+                Clients without server-side state may ignore it.
+            on_done: Optional callback receiving the final context and timing
+                fields, if the client reports them.
+            stop: Sequences that end the reply, excluded from the output.
+            max_chars: Maximum characters of the reply.
+            max_tokens: Maximum streamed tokens of the reply.
 
         Returns:
             AsyncGenerator yielding text chunks.
         """
         pass
+
+    async def warm_up(self, model: str = None) -> bool:
+        """
+        Load a model on the server ahead of the first request.
+
+        Clients without a server-side model have nothing to load.
+
+        Returns:
+            True if the model is ready to serve requests.
+        """
+        return True
+
+    def model_status(self, model: str = None) -> str:
+        """
+        Return "warm", "warming" or "cold" for a model.
+        """
+        return "warm"
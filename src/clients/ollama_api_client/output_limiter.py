@@ -0,0 +1,118 @@
+from collections import deque
+
+DONE_STOP = "stop"
+DONE_LENGTH = "length"
+
+
+class OutputLimiter:
+    """
+    Applies stop sequences and length caps to a streamed reply.
+
+    Stop sequences are matched with an Aho-Corasick automaton that is fed
+    each chunk once, so the accumulated text is never rescanned and a stop
+    sequence split across chunks is still found. Text that could be the
+    start of a stop sequence is held back until the next chunk decides it,
+    so a matched stop sequence is never emitted.
+    """
+
+    def __init__(self, stop=(), max_chars=None, max_tokens=None):
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.done_reason = None
+        self._chars = 0
+        self._tokens = 0
+        self._held = ""
+        self._state = 0
+        self._build([s for s in dict.fromkeys(stop) if s])
+
+    @property
+    def stopped(self):
+        return self.done_reason is not None
+
+    def feed(self, chunk):
+        """
+        Consume one streamed chunk and return the text that is safe to emit.
+
+        Once a stop sequence or a cap is reached, ``stopped`` is set and
+        further chunks are ignored.
+        """
+        if self.stopped:
+            return ""
+        self._tokens += 1
+
+        text = self._held + chunk
+        offset = len(self._held)
+        goto, fail, depth, match = self._goto, self._fail, self._depth, self._match
+        state = self._state
+        for index, char in enumerate(chunk):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if match[state]:
+                # Cut before the stop sequence that ends at this character
+                self.done_reason = DONE_STOP
+                self._held = ""
+                return self._cap(text[: offset + index + 1 - match[state]])
+        self._state = state
+
+        # Hold back the longest suffix that may still grow into a stop sequence
+        cut = len(text) - depth[state]
+        self._held = text[cut:]
+        emitted = self._cap(text[:cut])
+        if (
+            not self.stopped
+            and self.max_tokens is not None
+            and self._tokens >= self.max_tokens
+        ):
+            self.done_reason = DONE_LENGTH
+            emitted += self._cap(self._held)
+            self._held = ""
+        return emitted
+
+    def flush(self):
+        """
+        Return text still held back once the stream has ended.
+        """
+        held, self._held = self._held, ""
+        return "" if self.stopped else self._cap(held)
+
+    def _cap(self, text):
+        if self.max_chars is None:
+            return text
+        room = self.max_chars - self._chars
+        if len(text) >= room:
+            text = text[:room]
+            self.done_reason = self.done_reason or DONE_LENGTH
+        self._chars += len(text)
+        return text
+
+    def _build(self, patterns):
+        """
+        Build the automaton: a trie with failure links, where ``_match[s]`` is
+        the length of the longest stop sequence ending at state ``s``.
+        """
+        goto, depth, match = [{}], [0], [0]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                if char not in goto[state]:
+                    goto.append({})
+                    depth.append(depth[state] + 1)
+                    match.append(0)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            match[state] = len(pattern)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                queue.append(child)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(char, 0)
+                match[child] = max(match[child], match[fail[child]])
+
+        self._goto, self._fail, self._depth, self._match = goto, fail, depth, match
@@ -2,9 +2,21 @@ import html
 
 import streamlit as st
 
+from components.markdown import render_markdown
 
-def render_user_message(message):
+
+def user_text_html(text):
+    """Escape user text for a bubble, keeping its line breaks"""
+    return html.escape(text).replace(chr(10), "<br>")
+
+
+def render_user_message(message, renderer=None):
     """Render user message with inline styles"""
+    body = (
+        renderer.render(message, user_text_html)
+        if renderer
+        else user_text_html(str(message))
+    )
     return f"""
     <style>
     .user-message {{
@@ -24,14 +36,15 @@ def render_user_message(message):
     </style>
     <div class="user-message">
         <div class="user-content">
-            {html.escape(message).replace(chr(10), '<br>')}
+            {body}
         </div>
     </div>
     """
 
 
-def render_ai_message(message):
-    """Render AI message with inline styles"""
+def render_ai_message(message, renderer=None):
+    """Render AI message as sanitized Markdown with inline styles"""
+    body = renderer.render(message) if renderer else render_markdown(str(message))
     return f"""
     <style>
     .ai-message {{
@@ -48,45 +61,75 @@ def render_ai_message(message):
         border-radius: 20px;
         word-wrap: break-word;
     }}
+    .ai-content p, .ai-content ul, .ai-content ol, .ai-content pre,
+    .ai-content table, .ai-content blockquote {{
+        margin: 0 0 8px 0;
+    }}
+    .ai-content > :last-child {{
+        margin-bottom: 0;
+    }}
+    .ai-content pre {{
+        background-color: #272822;
+        color: #f8f8f2;
+        padding: 8px 12px;
+        border-radius: 8px;
+        overflow-x: auto;
+    }}
+    .ai-content table {{
+        border-collapse: collapse;
+    }}
+    .ai-content th, .ai-content td {{
+        border: 1px solid #ccc;
+        padding: 4px 8px;
+    }}
+    .ai-content blockquote {{
+        border-left: 3px solid #ccc;
+        padding-left: 8px;
+        color: #555;
+    }}
     </style>
     <div class="ai-message">
         <div class="ai-content">
-            {html.escape(message).replace(chr(10), '<br>')}
+            {body}
         </div>
     </div>
     """
 
 
-def render_thinking_bubble():
+def render_thinking_bubble(queue_position=None):
     """Render AI thinking bubble with inline styles"""
-    return """
+    if queue_position:
+        status = f"Waiting in queue (position {int(queue_position)})..."
+    else:
+        status = "Thinking..."
+    return f"""
     <style>
-    .thinking-message {
+    .thinking-message {{
         display: flex;
         align-items: flex-start;
         justify-content: flex-start;
         margin: 10px 0;
-    }
-    .thinking-content {
+    }}
+    .thinking-content {{
         background-color: #f1f1f1;
         color: #333;
         max-width: 70%;
         padding: 12px 16px;
         border-radius: 20px;
-    }
-    .thinking-dots {
+    }}
+    .thinking-dots {{
         animation: thinking 1.5s infinite;
-    }
-    @keyframes thinking {
-        0%, 50%, 100% { opacity: 1; }
-        25%, 75% { opacity: 0.5; }
-    }
+    }}
+    @keyframes thinking {{
+        0%, 50%, 100% {{ opacity: 1; }}
+        25%, 75% {{ opacity: 0.5; }}
+    }}
     </style>
     <div class="thinking-message">
         <div class="thinking-content">
             <div style="display: flex; align-items: center;">
                 <div class="thinking-dots">
-                    Thinking...
+                    {status}
                 </div>
             </div>
         </div>
@@ -94,8 +137,14 @@ def render_thinking_bubble():
     """
 
 
-def render_chat_messages(messages):
-    """Render all chat messages with inline styles"""
+def render_chat_messages(
+    messages, stream_renderer=None, html_cache=None, message_actions=None
+):
+    """Render all chat messages, streaming the last one through stream_renderer
+
+    message_actions is called with the index and message after each message,
+    e.g. to draw its controls.
+    """
     st.markdown(
         """
     <style>
@@ -113,12 +162,16 @@ def render_chat_messages(messages):
     for i, msg in enumerate(messages):
         # Use unique keys to prevent flickering
         if msg["role"] == "user":
-            html_content = render_user_message(msg["content"])
+            html_content = render_user_message(msg["content"], html_cache)
         else:
-            html_content = render_ai_message(msg["content"])
+            streaming = stream_renderer is not None and i == len(messages) - 1
+            renderer = stream_renderer if streaming else html_cache
+            html_content = render_ai_message(msg["content"], renderer)
 
         # Use a container with unique key to prevent re-rendering
         with st.container():
             st.markdown(html_content, unsafe_allow_html=True)
+            if message_actions is not None:
+                message_actions(i, msg)
 
     st.markdown("</div>", unsafe_allow_html=True)
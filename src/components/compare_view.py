@@ -0,0 +1,53 @@
+import html
+
+import streamlit as st
+
+from components.chat_ui import render_ai_message, render_thinking_bubble
+
+
+def format_run_metrics(run):
+    """Format TTFT and throughput of a model run for display"""
+    if run.error:
+        return f"❌ {run.error}"
+    parts = []
+    if run.ttft_ms is None:
+        parts.append("TTFT —" if run.done else "waiting for first token...")
+    else:
+        parts.append(f"TTFT {run.ttft_ms:,.0f} ms")
+    if run.tokens_per_second is not None:
+        parts.append(f"{run.tokens_per_second:,.1f} tok/s")
+    parts.append(f"{len(run.chunks)} tokens")
+    if run.done:
+        parts.append("done")
+    return " · ".join(parts)
+
+
+def render_model_column(run, renderer=None):
+    """Render one model's answer bubble and metrics"""
+    header = f"<strong>{html.escape(run.model)}</strong>"
+    if run.chunks:
+        bubble = render_ai_message(run.text, renderer)
+    elif run.done:
+        bubble = render_ai_message("(no response)")
+    else:
+        bubble = render_thinking_bubble()
+    return f"""
+    {header}
+    {bubble}
+    <div style="color: #888; font-size: 0.85em;">{html.escape(format_run_metrics(run))}</div>
+    """
+
+
+def create_comparison_placeholders(models):
+    """Create one side-by-side placeholder per model"""
+    columns = st.columns(len(models))
+    return {model: column.empty() for model, column in zip(models, columns)}
+
+
+def render_comparison(placeholders, runs, renderers=None):
+    """Paint every model's column into its placeholder"""
+    for run in runs:
+        renderer = renderers.get(run.model) if renderers else None
+        placeholders[run.model].markdown(
+            render_model_column(run, renderer), unsafe_allow_html=True
+        )
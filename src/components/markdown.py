@@ -0,0 +1,319 @@
+import html
+import re
+import threading
+from collections import OrderedDict
+
+FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([\w+#.-]*)")
+HEADING = re.compile(r"^ {0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+RULE = re.compile(r"^ {0,3}([-*_])(\s*\1){2,}\s*$")
+LIST_ITEM = re.compile(r"^\s{0,3}([-*+]|(\d{1,9})[.)])\s+(.*)$")
+QUOTE = re.compile(r"^ {0,3}>\s?(.*)$")
+TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+CODE_SPAN = re.compile(r"(`+)(.+?)\1")
+LINK = re.compile(r"\[([^\]\n]+)\]\(([^)\s]+)\)")
+BOLD = re.compile(r"\*\*(?=\S)(.+?)(?<=\S)\*\*|__(?=\S)(.+?)(?<=\S)__")
+ITALIC = re.compile(r"(?<![*\w])\*(?=\S)(.+?)(?<=\S)\*(?!\*)|\b_(?=\S)(.+?)(?<=\S)_\b")
+STRIKE = re.compile(r"~~(?=\S)(.+?)(?<=\S)~~")
+PLACEHOLDER = re.compile("\x00(\\d+)\x00")
+
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:")
+
+
+def split_blocks(text, start=0):
+    """
+    Split Markdown into blocks whose rendering can no longer change.
+
+    Blocks end at blank lines and closing code fences. Whatever follows the
+    last boundary may still grow while a reply streams in.
+
+    Returns:
+        A tuple of the completed blocks and the offset where the open tail starts.
+    """
+    blocks = []
+    block_start = start
+    fence = None
+    line_start = start
+    while True:
+        line_end = text.find("\n", line_start)
+        if line_end == -1:
+            break
+        line = text[line_start:line_end]
+        if fence is not None:
+            if line.strip().startswith(fence) and not line.strip(fence[0]).strip():
+                blocks.append(text[block_start : line_end + 1])
+                block_start = line_end + 1
+                fence = None
+        elif not line.strip():
+            if block_start < line_start:
+                blocks.append(text[block_start:line_start])
+            block_start = line_end + 1
+        else:
+            match = FENCE.match(line)
+            if match:
+                if block_start < line_start:
+                    blocks.append(text[block_start:line_start])
+                block_start = line_start
+                fence = match.group(1)
+        line_start = line_end + 1
+    return blocks, block_start
+
+
+def render_block(block):
+    """
+    Render one Markdown block to sanitized HTML.
+    """
+    lines = block.rstrip("\n").split("\n")
+    match = FENCE.match(lines[0])
+    if match:
+        return _render_code(lines, match)
+
+    parts = []
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        if not line.strip():
+            index += 1
+        elif HEADING.match(line):
+            heading = HEADING.match(line)
+            level = len(heading.group(1))
+            parts.append(f"<h{level}>{render_inline(heading.group(2))}</h{level}>")
+            index += 1
+        elif RULE.match(line):
+            parts.append("<hr>")
+            index += 1
+        elif LIST_ITEM.match(line):
+            index = _render_list(lines, index, parts)
+        elif QUOTE.match(line):
+            quoted = []
+            while index < len(lines) and QUOTE.match(lines[index]):
+                quoted.append(QUOTE.match(lines[index]).group(1))
+                index += 1
+            parts.append(
+                f"<blockquote>{render_block(chr(10).join(quoted))}</blockquote>"
+            )
+        elif (
+            "|" in line
+            and index + 1 < len(lines)
+            and TABLE_SEPARATOR.match(lines[index + 1])
+        ):
+            index = _render_table(lines, index, parts)
+        else:
+            paragraph = []
+            while index < len(lines) and not _starts_block(lines, index):
+                paragraph.append(render_inline(lines[index].strip()))
+                index += 1
+            parts.append(f"<p>{'<br>'.join(paragraph)}</p>")
+    return "".join(parts)
+
+
+def render_inline(text):
+    """
+    Render inline Markdown (code, links, emphasis) to sanitized HTML.
+    """
+    stash = []
+
+    def keep(fragment):
+        stash.append(fragment)
+        return f"\x00{len(stash) - 1}\x00"
+
+    def code(match):
+        return keep(f"<code>{html.escape(match.group(2).strip())}</code>")
+
+    def restore(text):
+        return PLACEHOLDER.sub(lambda m: stash[int(m.group(1))], text)
+
+    def link(match):
+        label, url = restore(match.group(1)), html.unescape(match.group(2))
+        if not url.lower().startswith(SAFE_URL_SCHEMES):
+            return label
+        return keep(
+            f'<a href="{html.escape(url)}" target="_blank" rel="noopener noreferrer">'
+            f"{label}</a>"
+        )
+
+    text = CODE_SPAN.sub(code, text.replace("\x00", ""))
+    text = html.escape(text)
+    text = LINK.sub(link, text)
+    text = BOLD.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    text = ITALIC.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+    text = STRIKE.sub(r"<del>\1</del>", text)
+    return restore(text)
+
+
+def render_markdown(text):
+    """
+    Render a complete Markdown message to sanitized HTML.
+    """
+    blocks, tail_start = split_blocks(text)
+    blocks.append(text[tail_start:])
+    return "".join(render_block(block) for block in blocks if block.strip())
+
+
+class IncrementalMarkdown:
+    """
+    Renders a growing Markdown text, re-parsing only its trailing open block.
+
+    Completed blocks are rendered once and cached, so each streamed chunk
+    costs time proportional to the last block instead of the whole reply.
+    Output is identical to render_markdown() for the same text.
+    """
+
+    def __init__(self):
+        self._prefix = ""
+        self._rendered = []
+
+    def render(self, text):
+        if not text.startswith(self._prefix):
+            # Not a continuation of the previous text, start over
+            self._prefix = ""
+            self._rendered = []
+
+        blocks, tail_start = split_blocks(text, len(self._prefix))
+        if blocks:
+            self._rendered.extend(render_block(block) for block in blocks)
+            self._prefix = text[:tail_start]
+
+        tail = text[tail_start:]
+        if tail.strip():
+            return "".join(self._rendered) + render_block(tail)
+        return "".join(self._rendered)
+
+
+class RenderCache:
+    """
+    Process-wide LRU cache of rendered message HTML.
+
+    Entries are keyed by the message text, or by ``cache_key`` for content
+    such as compressed text, so a hit never needs the text itself. Text is
+    rendered as Markdown unless another ``formatter`` is given; the
+    formatter is part of the key.
+    """
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def render(self, content, formatter=None):
+        formatter = formatter or render_markdown
+        key = (formatter, getattr(content, "cache_key", content))
+        with self._lock:
+            rendered = self._entries.get(key)
+            if rendered is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return rendered
+            self._misses += 1
+
+        rendered = formatter(str(content))
+        with self._lock:
+            self._entries[key] = rendered
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return rendered
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "html_bytes": sum(len(entry) for entry in self._entries.values()),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+
+def _starts_block(lines, index):
+    line = lines[index]
+    if not line.strip():
+        return True
+    if HEADING.match(line) or RULE.match(line) or LIST_ITEM.match(line):
+        return True
+    if QUOTE.match(line):
+        return True
+    return (
+        "|" in line
+        and index + 1 < len(lines)
+        and TABLE_SEPARATOR.match(lines[index + 1]) is not None
+    )
+
+
+def _render_code(lines, match):
+    fence, language = match.group(1), match.group(2)
+    body = lines[1:]
+    if body and body[-1].strip().startswith(fence):
+        body = body[:-1]
+    css_class = f' class="language-{html.escape(language)}"' if language else ""
+    # st.markdown dedents and re-parses the HTML, where a raw blank line would
+    # end the HTML block, so line breaks are kept as character references
+    code = "&#10;".join(html.escape(line) for line in body)
+    return f"<pre><code{css_class}>{code}</code></pre>"
+
+
+def _render_list(lines, index, parts):
+    first = LIST_ITEM.match(lines[index])
+    ordered = first.group(2) is not None
+    items = []
+    while index < len(lines):
+        item = LIST_ITEM.match(lines[index])
+        if item is not None and (item.group(2) is not None) == ordered:
+            items.append([item.group(3)])
+        elif item is None and lines[index][:1].isspace() and lines[index].strip():
+            # Indented continuation of the previous item
+            items[-1].append(lines[index].strip())
+        else:
+            break
+        index += 1
+
+    body = "".join(
+        f"<li>{'<br>'.join(render_inline(line) for line in item)}</li>"
+        for item in items
+    )
+    if not ordered:
+        parts.append(f"<ul>{body}</ul>")
+    elif first.group(2) == "1":
+        parts.append(f"<ol>{body}</ol>")
+    else:
+        parts.append(f'<ol start="{int(first.group(2))}">{body}</ol>')
+    return index
+
+
+def _render_table(lines, index, parts):
+    def cells(line):
+        line = line.strip()
+        if line.startswith("|"):
+            line = line[1:]
+        if line.endswith("|"):
+            line = line[:-1]
+        return [cell.strip() for cell in line.split("|")]
+
+    header = cells(lines[index])
+    alignments = []
+    for cell in cells(lines[index + 1]):
+        if cell.startswith(":") and cell.endswith(":"):
+            alignments.append(' style="text-align: center"')
+        elif cell.endswith(":"):
+            alignments.append(' style="text-align: right"')
+        else:
+            alignments.append("")
+    index += 2
+
+    def row(values, tag):
+        return (
+            "<tr>"
+            + "".join(
+                f"<{tag}{alignments[i] if i < len(alignments) else ''}>"
+                f"{render_inline(value)}</{tag}>"
+                for i, value in enumerate(values)
+            )
+            + "</tr>"
+        )
+
+    rows = [row(header, "th")]
+    while index < len(lines) and "|" in lines[index]:
+        rows.append(row(cells(lines[index]), "td"))
+        index += 1
+    parts.append(f"<table>{''.join(rows)}</table>")
+    return index
@@ -1,15 +1,189 @@
+import html
+import uuid
+
 import streamlit as st
 
+from services.history_store import HIGHLIGHT_END, HIGHLIGHT_START
+
+MODEL_STATUS_ICONS = {"warm": "🟢", "warming": "🟡", "cold": "⚪"}
+
 
-def render_sidebar():
+def render_sidebar(compare_available=False, model_statuses=None, memory_stats=None):
     """Render sidebar with chat controls"""
+    service = st.session_state.conversation_service
+    is_ai_thinking = st.session_state.get("ai_thinking", False)
+
     with st.sidebar:
         if st.button(
             " New Chat",
-            help="Clear history and start a new chat",
+            help="Start a new chat; previous chats stay in the list below",
             key="new_chat_btn",
             use_container_width=True,
+            disabled=is_ai_thinking,
         ):
-            st.session_state.messages.clear()
-            if "ai_thinking" in st.session_state:
-                del st.session_state.ai_thinking
+            open_conversation(uuid.uuid4().hex)
+
+        if compare_available:
+            st.toggle(
+                "Compare models",
+                key="compare_mode",
+                help="Send each prompt to all configured models side by side",
+                disabled=is_ai_thinking,
+            )
+
+        query = st.text_input(
+            "Search",
+            key="search_query",
+            placeholder="Search conversations",
+            label_visibility="collapsed",
+        ).strip()
+        if query:
+            render_search_results(service.search_messages(query), is_ai_thinking)
+        else:
+            render_conversation_list(service.list_conversations(), is_ai_thinking)
+
+        exporter = service.archive_exporter()
+        if exporter is not None:
+            render_export(exporter)
+
+        if model_statuses:
+            render_model_statuses(model_statuses)
+
+        if memory_stats:
+            render_memory_stats(memory_stats)
+
+
+def render_export(exporter):
+    """Build the history archive on request, then offer it for download
+
+    download_button needs the data up front, so the archive is only built
+    when asked for and dropped once it has been downloaded.
+    """
+    archive = st.session_state.get("history_export")
+    if archive is None:
+        if st.button(
+            "Export history",
+            help="Prepare all your conversations as gzipped JSONL",
+            key="export_history_btn",
+            use_container_width=True,
+        ):
+            with st.spinner("Preparing export..."):
+                st.session_state.history_export = exporter()
+            st.rerun()
+        return
+
+    st.download_button(
+        "Download history",
+        data=archive,
+        file_name="history.jsonl.gz",
+        mime="application/gzip",
+        key="download_history_btn",
+        on_click=lambda: st.session_state.pop("history_export", None),
+        use_container_width=True,
+    )
+
+
+def render_conversation_list(conversations, disabled):
+    """Render the user's conversations as buttons that switch threads"""
+    if not conversations:
+        return
+
+    st.caption("Conversations")
+    current_id = st.session_state.get("conversation_id")
+    for conversation in conversations:
+        if st.button(
+            conversation["title"] or "Untitled",
+            key=f"conversation_btn_{conversation['id']}",
+            type="primary" if conversation["id"] == current_id else "secondary",
+            use_container_width=True,
+            disabled=disabled,
+        ):
+            open_conversation(conversation["id"])
+
+
+def render_model_statuses(model_statuses):
+    """Render whether each model is loaded on the server"""
+    st.caption("Models")
+    for model, status in model_statuses.items():
+        st.caption(f"{MODEL_STATUS_ICONS.get(status, '⚪')} {model} — {status}")
+
+
+def render_memory_stats(memory_stats):
+    """Render how much memory message compression and the HTML cache use"""
+    storage = memory_stats["cold_storage"]
+    html_cache = memory_stats["html_cache"]
+    process = memory_stats["process"]
+    with st.expander("Memory"):
+        st.caption(
+            f"This session: {format_bytes(memory_stats['session_bytes'])} · "
+            f"all {process['sessions']} sessions: "
+            f"{format_bytes(process['total_bytes'])} of "
+            f"{format_bytes(process['high_water_bytes'])}"
+        )
+        if storage["compressed_messages"]:
+            st.caption(
+                f"{storage['compressed_messages']} compressed messages: "
+                f"{format_bytes(storage['raw_bytes'])} → "
+                f"{format_bytes(storage['stored_bytes'])} "
+                f"({storage['ratio']:.1f}x, {format_bytes(storage['saved_bytes'])} saved)"
+            )
+        else:
+            st.caption("No compressed messages")
+        lookups = html_cache["hits"] + html_cache["misses"]
+        hit_rate = html_cache["hits"] / lookups if lookups else 0
+        st.caption(
+            f"HTML cache: {html_cache['entries']} entries, "
+            f"{format_bytes(html_cache['html_bytes'])}, {hit_rate:.0%} hits"
+        )
+
+
+def format_bytes(size):
+    """Format a byte count for display"""
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:,.1f} KiB"
+    return f"{size / (1024 * 1024):,.1f} MiB"
+
+
+def render_search_results(results, disabled):
+    """Render ranked search hits with highlighted snippets"""
+    if not results:
+        st.caption("No matches")
+        return
+
+    for result in results:
+        st.markdown(
+            f"""
+            <div style="font-size: 0.85em; margin-top: 8px;">
+                <div style="color: #888;">{html.escape(result["title"])}</div>
+                <div>{highlight_snippet(result["snippet"])}</div>
+            </div>
+            """,
+            unsafe_allow_html=True,
+        )
+        if st.button(
+            "Open",
+            key=f"search_result_btn_{result['id']}",
+            disabled=disabled,
+        ):
+            open_conversation(result["conversation_id"])
+
+
+def highlight_snippet(snippet):
+    """Escape a search snippet and turn its match markers into <mark> tags"""
+    return (
+        html.escape(snippet)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+        .replace(chr(10), " ")
+    )
+
+
+def open_conversation(conversation_id):
+    """Switch the session to another conversation and keep the URL in sync"""
+    st.query_params["conversation"] = conversation_id
+    st.session_state.conversation_service.switch_conversation(conversation_id)
+    if "ai_thinking" in st.session_state:
+        del st.session_state.ai_thinking
+    st.rerun()
@@ -0,0 +1,165 @@
+import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Optional
+
+TRUE_VALUES = ("true", "1", "yes", "on")
+# Numeric settings for which 0 means unlimited or disabled; others must be positive
+ZERO_ALLOWED = frozenset(
+    {
+        "ollama_max_output_chars",
+        "ollama_max_output_tokens",
+        "warmup_refresh_interval",
+        "warmup_connections",
+        "max_queued_generations",
+        "conversation_cache_size",
+        "log_chunk_sample_rate",
+    }
+)
+
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Typed application configuration, loaded and validated once per process.
+
+    Every tunable knob lives here so hot paths never touch the environment.
+    Each field maps to the upper-cased environment variable of the same name.
+    """
+
+    # Upstream
+    ollama_api_endpoint: Optional[str] = None
+    ollama_model: Optional[str] = None
+    ollama_compare_models: tuple = ()
+    ollama_connect_timeout: float = 10.0
+    ollama_read_timeout: float = 120.0
+    ollama_pool_size: int = 10
+    ollama_keep_alive: float = 600.0
+    ollama_stop: tuple = ()
+    ollama_max_output_chars: int = 0  # 0 means unlimited
+    ollama_max_output_tokens: int = 0  # 0 means unlimited
+
+    # Warm-up
+    warmup_enabled: bool = False
+    warmup_models: tuple = ()
+    warmup_refresh_interval: float = 240.0  # 0 disables refreshing
+    warmup_connections: int = 2  # 0 disables prewarming
+
+    # Admission control
+    max_concurrent_generations: int = 2
+    max_queued_generations: int = 16  # 0 sheds instead of queueing
+    session_rate_limit: int = 6
+    session_rate_window: float = 60.0
+
+    # Streaming
+    stream_frame_interval_ms: int = 50
+    stream_journal_dir: str = ".data/journal"
+    stream_checkpoint_chunks: int = 16
+    stream_checkpoint_ms: int = 250
+
+    # Retention and context
+    max_messages: int = 10
+    history_page_size: int = 10
+    context_recent_messages: int = 6
+    summary_enabled: bool = False
+    summary_batch: int = 2
+    context_reuse: bool = True
+    context_max_tokens: int = 4096
+
+    # Storage and caches
+    history_db_path: str = ".data/history.sqlite3"
+    conversation_cache_size: int = 3  # 0 spills every parked conversation
+    conversation_spill_dir: str = ".data/spill"
+    summary_cache_size: int = 256
+    cold_storage_threshold: int = 4096
+    html_cache_size: int = 256
+    memory_high_water_mb: int = 1024
+
+    # Logging
+    log_level: str = "INFO"
+    log_json: bool = False
+    log_chunk_sample_rate: int = 50  # 0 disables chunk logs
+    otlp_log_file: Optional[str] = None
+
+    debug: bool = False
+
+    @property
+    def stream_frame_interval(self):
+        return self.stream_frame_interval_ms / 1000
+
+    @property
+    def stream_checkpoint_interval(self):
+        return self.stream_checkpoint_ms / 1000
+
+    @property
+    def models_to_warm(self):
+        """
+        Explicit warm-up models, or the default and compare models.
+        """
+        models = self.warmup_models or (self.ollama_model, *self.ollama_compare_models)
+        return tuple(model for model in dict.fromkeys(models) if model)
+
+
+def _parse(field, raw):
+    if field.type is bool:
+        return raw.strip().lower() in TRUE_VALUES
+    if field.type is int:
+        return int(raw)
+    if field.type is float:
+        return float(raw)
+    if field.type is tuple:
+        return tuple(item.strip() for item in raw.split(",") if item.strip())
+    return raw.strip() or None
+
+
+def load_settings(environ=None, secrets=None):
+    """
+    Build settings from environment variables, falling back to Streamlit secrets.
+
+    Raises:
+        ValueError: If any value cannot be parsed or is out of range.
+    """
+    environ = os.environ if environ is None else environ
+    values = {}
+    errors = []
+    for field in fields(Settings):
+        name = field.name.upper()
+        raw = environ.get(name)
+        if raw is None and secrets is not None:
+            raw = secrets.get(name)
+        if raw is None or raw == "":
+            continue
+        try:
+            value = _parse(field, str(raw))
+        except ValueError:
+            errors.append(f"{name}={raw!r} is not a valid {field.type.__name__}")
+            continue
+        if field.type in (int, float):
+            if field.name in ZERO_ALLOWED and value < 0:
+                errors.append(f"{name} must not be negative")
+                continue
+            if field.name not in ZERO_ALLOWED and value <= 0:
+                errors.append(f"{name} must be positive")
+                continue
+        values[field.name] = value
+
+    if errors:
+        raise ValueError("Invalid configuration: " + "; ".join(errors))
+    return Settings(**values)
+
+
+def _streamlit_secrets():
+    try:
+        import streamlit as st
+
+        return dict(st.secrets)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_settings():
+    """
+    Return the process-wide settings, loading them on first use.
+    """
+    return load_settings(secrets=_streamlit_secrets())
@@ -0,0 +1,122 @@
+"""
+Export or import the conversation history as a JSONL archive.
+
+Usage:
+    python src/history_archive.py export history.jsonl.gz [--user USER_ID]
+    python src/history_archive.py import history.jsonl.gz [--user USER_ID]
+
+Archives are gzipped when the file name ends in ``.gz`` (or with ``--gzip``);
+imports detect compression by themselves. Use ``-`` for stdout or stdin.
+Both directions stream, so memory stays flat however large the archive is.
+Imports can run while the app is up: message ids are claimed from the
+database, so they never collide with ids assigned by running processes.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def count_records(records, stats):
+    """
+    Pass records through, counting them by type into ``stats``.
+    """
+    for record in records:
+        kind = record.get("type")
+        if kind in ("conversation", "message"):
+            stats[kind + "s"] += 1
+        yield record
+
+
+def open_archive(path, mode):
+    """
+    Open an archive file, with ``-`` standing for stdin or stdout.
+    """
+    if path == "-":
+        stream = sys.stdin.buffer if "r" in mode else sys.stdout.buffer
+        return contextlib.nullcontext(stream)
+    return open(path, mode)
+
+
+def finish_stats(stats, started):
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["messages_per_s"] = round(stats["messages"] / elapsed, 1) if elapsed else 0.0
+    if "bytes" in stats:
+        stats["mb_per_s"] = round(stats["bytes"] / 1e6 / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export or import the conversation history as JSONL."
+    )
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Archive file, or - for stdout/stdin")
+    parser.add_argument(
+        "--user",
+        default=None,
+        help="Export only this user's conversations, or import them as this user",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="Compress the export (implied by a .gz file name)",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--db", default=None, help="Defaults to HISTORY_DB_PATH")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    from config import get_settings
+    from services.archive import (
+        ArchiveError,
+        encode_archive,
+        export_records,
+        import_records,
+        read_archive,
+    )
+    from services.history_store import HistoryStore
+
+    history = HistoryStore(args.db or get_settings().history_db_path)
+    started = time.perf_counter()
+    try:
+        if args.command == "export":
+            stats = {"conversations": 0, "messages": 0, "bytes": 0}
+            records = count_records(export_records(history, args.user), stats)
+            chunks = encode_archive(
+                records, compress=args.gzip or args.path.endswith(".gz")
+            )
+            with open_archive(args.path, "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    stats["bytes"] += len(chunk)
+        else:
+            with open_archive(args.path, "rb") as source:
+                stats = import_records(
+                    history,
+                    read_archive(source),
+                    user_id=args.user,
+                    batch_size=args.batch_size,
+                )
+    except ArchiveError as e:
+        logger.error("%s: %s", args.path, e)
+        return 1
+    finally:
+        history.close()
+
+    print(json.dumps(finish_stats(stats, started)), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,51 +1,352 @@
 import os
+import sys
+import time
+import uuid
 
 import streamlit as st
 
-from clients.ollama_api_client import OllamaApiClient
-from components.chat_ui import render_chat_messages, render_thinking_bubble
+from components.chat_ui import (
+    render_chat_messages,
+    render_thinking_bubble,
+    render_user_message,
+)
+from components.markdown import IncrementalMarkdown, RenderCache
 from components.sidebar import render_sidebar
+from config import get_settings
+from services.admission import AdmissionController, AdmissionRejected
+from services.background_loop import BackgroundLoop
+from services.cold_storage import ColdStorage
+from services.conversation_cache import ConversationCache
 from services.conversation_service import ConversationService
+from services.history_store import HistoryStore
+from services.memory_guard import MemoryGuard
+from services.stream_journal import StreamJournal
+from services.summarizer import ConversationSummarizer
+from services.telemetry import configure_logging
 
 
 def main():
+    get_log_listener()
     st.title("Bubble Chat UI")
     initialize_session()
+    st.session_state.conversation_service.report_memory()
     draw_sidebar()
+    if st.session_state.get("compare_mode", False):
+        draw_comparison()
+        return
     handle_user_input()
     draw_chat_messages()
     handle_ai_response()
     check_start_ai_thinking()
 
 
-def initialize_session():
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-    if "ollama_client" not in st.session_state:
-        is_debug = os.getenv("DEBUG", "false").lower() in ("true", "1", "yes", "on")
-        if is_debug:
-            import sys
+@st.cache_resource
+def get_log_listener():
+    settings = get_settings()
+    return configure_logging(
+        settings.log_level,
+        json_format=settings.log_json,
+        otlp_path=settings.otlp_log_file,
+    )
+
+
+@st.cache_resource
+def get_background_loop():
+    return BackgroundLoop()
+
+
+# Heavy or optional modules (httpx, warm-up, compare mode, dev mocks) are
+# imported on first use so they stay off the cold-start import path.
+
+
+@st.cache_resource
+def get_ollama_client():
+    from clients.ollama_api_client import OllamaApiClient
+
+    client = OllamaApiClient.from_settings(get_settings())
+    # Bind the connection pool to the loop that generations run on
+    get_background_loop().run(client.open_pool())
+    return client
+
+
+@st.cache_resource
+def get_model_warmer():
+    settings = get_settings()
+    if not settings.warmup_enabled:
+        return None
+    from services.model_warmer import ModelWarmer
+
+    warmer = ModelWarmer(
+        get_ollama_client(),
+        list(settings.models_to_warm),
+        get_background_loop(),
+        refresh_interval=settings.warmup_refresh_interval,
+        prewarm_connections=settings.warmup_connections,
+    )
+    warmer.start()
+    return warmer
+
+
+@st.cache_resource
+def get_admission_controller():
+    settings = get_settings()
+    return AdmissionController(
+        max_concurrent=settings.max_concurrent_generations,
+        max_queue=settings.max_queued_generations,
+        rate_limit=settings.session_rate_limit,
+        rate_window=settings.session_rate_window,
+    )
+
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore(get_settings().history_db_path)
+
+
+@st.cache_resource
+def get_stream_journal():
+    settings = get_settings()
+    return StreamJournal(
+        settings.stream_journal_dir,
+        checkpoint_chunks=settings.stream_checkpoint_chunks,
+        checkpoint_interval=settings.stream_checkpoint_interval,
+    )
+
+
+@st.cache_resource
+def get_cold_storage():
+    return ColdStorage(threshold=get_settings().cold_storage_threshold)
+
+
+@st.cache_resource
+def get_html_cache():
+    return RenderCache(capacity=get_settings().html_cache_size)
+
+
+@st.cache_resource
+def get_memory_guard():
+    return MemoryGuard(get_settings().memory_high_water_mb * 1024 * 1024)
+
+
+@st.cache_resource
+def get_summarizer():
+    settings = get_settings()
+    if not settings.summary_enabled:
+        return None
+    return ConversationSummarizer(
+        history=get_history_store(),
+        cache_size=settings.summary_cache_size,
+        loop=get_background_loop(),
+        admission=get_admission_controller(),
+    )
+
+
+def create_mock_client():
+    # Debug-only: dev/ lives outside src, so it is never imported in production
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    if project_root not in sys.path:
+        sys.path.append(project_root)
+    from dev.mocks.mock_ollama_client import MockOllamaApiClient
+
+    return MockOllamaApiClient()
 
-            sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-            from dev.mocks.mock_ollama_client import MockOllamaApiClient
 
-            st.session_state.ollama_client = MockOllamaApiClient()
+def url_id(name):
+    """Return the id kept in a URL parameter, or a new one if it is missing or malformed"""
+    try:
+        return uuid.UUID(hex=st.query_params.get(name)).hex
+    except (TypeError, ValueError):
+        return uuid.uuid4().hex
+
+
+def initialize_session():
+    settings = get_settings()
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if "user_id" not in st.session_state:
+        # Conversations are grouped by a user id kept in the URL
+        st.session_state.user_id = st.query_params.get("user") or uuid.uuid4().hex
+        st.query_params["user"] = st.session_state.user_id
+    if "ollama_client" not in st.session_state:
+        if settings.debug:
+            st.session_state.ollama_client = create_mock_client()
             st.sidebar.success("🚧 DEBUG MODE: Using Mock Client")
         else:
-            st.session_state.ollama_client = OllamaApiClient()
+            st.session_state.ollama_client = get_ollama_client()
+            st.session_state.model_warmer = get_model_warmer()
             st.sidebar.info("🌐 Using Real Ollama API")
     if "conversation_service" not in st.session_state:
         st.session_state.conversation_service = ConversationService(
-            st.session_state.ollama_client
+            st.session_state.ollama_client,
+            admission=get_admission_controller(),
+            session_id=st.session_state.session_id,
+            history=get_history_store(),
+            cache=ConversationCache(
+                os.path.join(
+                    settings.conversation_spill_dir, st.session_state.session_id
+                ),
+                capacity=settings.conversation_cache_size,
+            ),
+            journal=get_stream_journal(),
+            summarizer=get_summarizer(),
+            loop=get_background_loop(),
+            cold_storage=get_cold_storage(),
+            memory_guard=get_memory_guard(),
+            max_messages=settings.max_messages,
+            page_size=settings.history_page_size,
+            context_messages=settings.context_recent_messages,
+            summary_batch=settings.summary_batch,
+            reuse_context=settings.context_reuse,
+            context_max_tokens=settings.context_max_tokens,
+            frame_interval=settings.stream_frame_interval,
+            chunk_sample_rate=settings.log_chunk_sample_rate,
         )
+    if "messages" not in st.session_state:
+        # Reopen the conversation from the URL so reloads and restarts keep history
+        conversation_id = url_id("conversation")
+        st.query_params["conversation"] = conversation_id
+        st.session_state.conversation_service.load_conversation(conversation_id)
 
 
 def draw_sidebar():
-    render_sidebar()
+    warmer = st.session_state.get("model_warmer")
+    render_sidebar(
+        compare_available=len(get_settings().ollama_compare_models) > 1,
+        model_statuses=warmer.statuses() if warmer is not None else None,
+        memory_stats={
+            "cold_storage": get_cold_storage().stats(st.session_state.messages),
+            "html_cache": get_html_cache().stats(),
+            "session_bytes": get_memory_guard().session_bytes(
+                st.session_state.session_id
+            ),
+            "process": get_memory_guard().stats(),
+        },
+    )
+
+
+def draw_comparison():
+    from components.compare_view import (
+        create_comparison_placeholders,
+        render_comparison,
+    )
+    from services.model_comparison import ModelComparison, ModelRun
+
+    settings = get_settings()
+    if "model_comparison" not in st.session_state:
+        st.session_state.model_comparison = ModelComparison(
+            st.session_state.ollama_client,
+            admission=get_admission_controller(),
+            session_id=st.session_state.session_id,
+        )
+    models = list(settings.ollama_compare_models)
+    repaint_interval = settings.stream_frame_interval
+    prompt = st.chat_input("Send a prompt to all models")
+    prompt = prompt.strip() if prompt else None
+
+    if not prompt:
+        comparison = st.session_state.get("comparison")
+        if comparison:
+            st.markdown(
+                render_user_message(comparison["prompt"]), unsafe_allow_html=True
+            )
+            placeholders = create_comparison_placeholders(
+                [run.model for run in comparison["runs"]]
+            )
+            render_comparison(placeholders, comparison["runs"])
+        return
+
+    st.markdown(render_user_message(prompt), unsafe_allow_html=True)
+    placeholders = create_comparison_placeholders(models)
+    render_comparison(placeholders, [ModelRun(model=model) for model in models])
+    renderers = {model: IncrementalMarkdown() for model in models}
+    last_paint = {}
+
+    def on_update(run):
+        # Columns repaint independently, throttled to keep frames cheap
+        now = time.monotonic()
+        if run.done or now - last_paint.get(run.model, 0) >= repaint_interval:
+            last_paint[run.model] = now
+            render_comparison(placeholders, [run], renderers)
+
+    def on_queued(position):
+        for placeholder in placeholders.values():
+            placeholder.markdown(
+                render_thinking_bubble(position), unsafe_allow_html=True
+            )
+
+    try:
+        runs = st.session_state.model_comparison.run(
+            prompt, models, on_update=on_update, on_queued=on_queued
+        )
+    except AdmissionRejected as e:
+        st.warning(str(e))
+        return
+    st.session_state.comparison = {"prompt": prompt, "runs": runs}
 
 
 def draw_chat_messages():
-    render_chat_messages(st.session_state.messages)
+    if st.session_state.get("has_older_messages", False):
+        if st.button("Load earlier messages", key="load_older_btn"):
+            st.session_state.conversation_service.load_older_messages()
+            st.rerun()
+    if st.session_state.get("streaming_active", False):
+        # Completed Markdown blocks of the streaming reply are parsed only once
+        renderer = st.session_state.setdefault("stream_renderer", IncrementalMarkdown())
+    else:
+        st.session_state.pop("stream_renderer", None)
+        renderer = None
+    render_chat_messages(
+        st.session_state.messages,
+        stream_renderer=renderer,
+        html_cache=get_html_cache(),
+        message_actions=draw_message_actions,
+    )
+    messages = st.session_state.messages
+    if messages and messages[-1].get("interrupted"):
+        st.caption("This reply was interrupted before it finished.")
+        if st.button("Regenerate", key="regenerate_btn"):
+            st.session_state.conversation_service.regenerate_interrupted()
+            st.rerun()
+
+
+def draw_message_actions(index, message):
+    if st.session_state.get("ai_thinking", False) or message.get("error"):
+        return
+    service = st.session_state.conversation_service
+    if st.session_state.get("editing") == index:
+        content = st.text_area(
+            "Edit message", value=str(message["content"]), key=f"edit_text_{index}"
+        )
+        save, cancel = st.columns(2)
+        if save.button("Send", key=f"edit_send_{index}") and content.strip():
+            st.session_state.editing = None
+            service.edit_message(message, content.strip())
+            st.rerun()
+        if cancel.button("Cancel", key=f"edit_cancel_{index}"):
+            st.session_state.editing = None
+            st.rerun()
+        return
+
+    position, count = service.branch_position(message)
+    previous, label, following, action = st.columns([1, 2, 1, 8])
+    if count > 1:
+        if previous.button("◀", key=f"branch_prev_{index}", disabled=position == 1):
+            service.switch_branch(message, -1)
+            st.rerun()
+        label.caption(f"{position} / {count}")
+        if following.button(
+            "▶", key=f"branch_next_{index}", disabled=position == count
+        ):
+            service.switch_branch(message, 1)
+            st.rerun()
+    if message["role"] == "user":
+        if action.button("✏️", key=f"edit_{index}", help="Edit and resend"):
+            st.session_state.editing = index
+            st.rerun()
+    elif not message.get("interrupted") and index > 0:
+        if action.button("🔄", key=f"regenerate_{index}", help="Regenerate"):
+            service.regenerate(message)
+            st.rerun()
 
 
 def handle_user_input():
@@ -59,7 +360,7 @@ def handle_user_input():
     if user_input is not None:
         user_input = user_input.strip()
         if user_input:
-            st.session_state.messages.append({"role": "user", "content": user_input})
+            st.session_state.conversation_service.add_user_message(user_input)
             st.rerun()
 
 
@@ -67,7 +368,10 @@ def handle_ai_response():
     if st.session_state.get("ai_thinking", False):
         # Show thinking bubble only before streaming starts
         if not st.session_state.get("streaming_active", False):
-            st.markdown(render_thinking_bubble(), unsafe_allow_html=True)
+            st.markdown(
+                render_thinking_bubble(st.session_state.get("queue_position")),
+                unsafe_allow_html=True,
+            )
 
         st.session_state.conversation_service.handle_ai_thinking()
 
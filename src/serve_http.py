@@ -0,0 +1,336 @@
+"""
+Serve the chat engine over a local HTTP API with Server-Sent Events.
+
+Usage:
+    python src/serve_http.py --host 127.0.0.1 --port 8765
+
+Endpoints:
+    POST /v1/conversations/<id>/messages[?user=<id>]
+        with a JSON body ``{"content": "..."}``
+        streams the reply as SSE: ``token`` events carrying ``{"text": ...}``,
+        then a single ``done`` event with the stored reply, or an ``error``.
+    GET /v1/conversations/<id>/messages
+        returns the conversation's in-memory messages as JSON.
+    GET /v1/export[?user=<id>][&gzip=1]
+        streams the history store as a JSONL archive, gzipped on request.
+
+A conversation created over HTTP belongs to the ``user`` given when it is
+first used, or to the ``api`` user, and is listed, searched and exported
+with that user's history.
+
+Conversations share the history store with the Streamlit app, so the same
+conversation can be continued from either, one at a time. Message ids are
+claimed from the database, so both processes can write to it at once.
+"""
+
+import argparse
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_PATH = re.compile(r"^/v1/conversations/([\w-]{1,64})/messages$")
+EXPORT_PATH = "/v1/export"
+API_USER = "api"  # Owner of conversations created without a user
+MAX_CONVERSATIONS = 256  # Conversation states kept in memory
+
+
+def message_json(message):
+    """
+    Return the client-facing fields of a message.
+    """
+    entry = {"role": message["role"], "content": str(message["content"])}
+    for key in ("id", "error", "interrupted"):
+        if message.get(key) is not None:
+            entry[key] = message[key]
+    return entry
+
+
+def format_event(event):
+    """
+    Encode an engine event as one Server-Sent Events message.
+    """
+    if event.kind == "token":
+        data = {"text": event.text}
+    elif event.kind == "done":
+        data = {
+            "message": message_json(event.message),
+            "done_reason": event.done_reason,
+            "timings": event.timings,
+        }
+    else:
+        data = {"error": event.error}
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event.kind}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class ChatServer(ThreadingHTTPServer):
+    """
+    HTTP server sharing one engine across requests.
+
+    Handlers run on their own threads and replies stream on the background
+    loop, with the engine's history store calls on worker threads so one
+    slow write does not stall every other stream. A conversation serves one
+    reply at a time, so its state is only used by one call at a time.
+
+    Only the ``max_conversations`` most recently used conversations stay in
+    memory; the others are reloaded from the history store when used again.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        engine,
+        loop,
+        export_archive=None,
+        max_conversations=MAX_CONVERSATIONS,
+    ):
+        super().__init__(address, ChatRequestHandler)
+        self.engine = engine
+        self.loop = loop
+        # Called with a user id (or None) and a compress flag, returning chunks
+        self.export_archive = export_archive
+        self.max_conversations = max_conversations
+        self._lock = threading.Lock()
+        self._conversations = OrderedDict()
+
+    def conversation(self, conversation_id, user_id=None):
+        """
+        Return a conversation's state and its lock, loading it on first use.
+
+        ``user_id`` owns the conversation if it is loaded by this call.
+        Loading reads the history store on the handler's thread, outside the
+        server-wide lock, so other conversations are not held up meanwhile.
+        """
+        with self._lock:
+            entry = self._conversations.get(conversation_id)
+            if entry is not None:
+                self._conversations.move_to_end(conversation_id)
+                return entry
+
+        state = self.engine.new_state(conversation_id, user_id=user_id or API_USER)
+        with self._lock:
+            # A concurrent request may have loaded it first
+            entry = self._conversations.setdefault(
+                conversation_id, (state, threading.Lock())
+            )
+            self._conversations.move_to_end(conversation_id)
+            self._evict()
+            return entry
+
+    def _evict(self):
+        """
+        Drop the least recently used conversations above ``max_conversations``.
+
+        A conversation that is replying, or was just returned, is kept, so it
+        never has two states at once.
+        """
+        excess = len(self._conversations) - self.max_conversations
+        for conversation_id, (_, lock) in list(self._conversations.items())[:-1]:
+            if excess <= 0:
+                break
+            if not lock.locked():
+                del self._conversations[conversation_id]
+                excess -= 1
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    server_version = "BubbleChat/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if url.path == EXPORT_PATH and self.server.export_archive is not None:
+            self._stream_export(
+                query.get("user", [None])[0], query.get("gzip", ["0"])[0] == "1"
+            )
+            return
+        match = MESSAGES_PATH.match(url.path)
+        if match is None:
+            self._send_json(404, {"error": "Not found"})
+            return
+        state, _ = self.server.conversation(
+            match.group(1), query.get("user", [None])[0]
+        )
+        messages = list(state["messages"])
+        self._send_json(200, {"messages": [message_json(m) for m in messages]})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        match = MESSAGES_PATH.match(url.path)
+        if match is None:
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            content = json.loads(self.rfile.read(length))["content"].strip()
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self._send_json(400, {"error": 'Expected a JSON body {"content": "..."}'})
+            return
+        if not content:
+            self._send_json(400, {"error": "Message is empty"})
+            return
+
+        state, lock = self.server.conversation(
+            match.group(1), parse_qs(url.query).get("user", [None])[0]
+        )
+        if not lock.acquire(blocking=False):
+            self._send_json(409, {"error": "A reply is already being generated"})
+            return
+        try:
+            self._stream_reply(state, content)
+        finally:
+            lock.release()
+
+    def _stream_reply(self, state, content):
+        """
+        Relay engine events to the client as they are produced on the loop.
+        """
+        events = queue.SimpleQueue()
+
+        async def pump():
+            try:
+                async for event in self.server.engine.send(state, content):
+                    events.put(event)
+            finally:
+                events.put(None)
+
+        future = self.server.loop.submit(pump())
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                self.wfile.write(format_event(event))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Stops the generation, which closes the upstream stream
+            future.cancel()
+        finally:
+            self.close_connection = True
+
+    def _stream_export(self, user_id, compress):
+        """
+        Write the archive as it is encoded, without a Content-Length.
+        """
+        name = "history.jsonl.gz" if compress else "history.jsonl"
+        self.send_response(200)
+        self.send_header(
+            "Content-Type", "application/gzip" if compress else "application/x-ndjson"
+        )
+        self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+        self.end_headers()
+        try:
+            for chunk in self.server.export_archive(user_id, compress):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.close_connection = True
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve the chat engine over HTTP with Server-Sent Events."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--max-conversations",
+        type=int,
+        default=MAX_CONVERSATIONS,
+        help="conversation states kept in memory",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from clients.ollama_api_client import OllamaApiClient
+    from config import get_settings
+    from services.archive import encode_archive, export_records
+    from services.background_loop import BackgroundLoop
+    from services.chat_engine import ChatEngine
+    from services.cold_storage import ColdStorage
+    from services.history_store import HistoryStore
+    from services.summarizer import ConversationSummarizer
+    from services.telemetry import configure_logging
+
+    settings = get_settings()
+    configure_logging(
+        settings.log_level,
+        json_format=settings.log_json,
+        otlp_path=settings.otlp_log_file,
+    )
+    loop = BackgroundLoop()
+    client = OllamaApiClient.from_settings(settings)
+    loop.run(client.open_pool())
+    history = HistoryStore(settings.history_db_path)
+    summarizer = None
+    if settings.summary_enabled:
+        summarizer = ConversationSummarizer(
+            history=history, cache_size=settings.summary_cache_size, loop=loop
+        )
+    engine = ChatEngine(
+        client,
+        history=history,
+        summarizer=summarizer,
+        cold_storage=ColdStorage(threshold=settings.cold_storage_threshold),
+        max_messages=settings.max_messages,
+        page_size=settings.history_page_size,
+        context_messages=settings.context_recent_messages,
+        summary_batch=settings.summary_batch,
+        reuse_context=settings.context_reuse,
+        context_max_tokens=settings.context_max_tokens,
+    )
+
+    def export_archive(user_id, compress):
+        return encode_archive(export_records(history, user_id), compress=compress)
+
+    server = ChatServer(
+        (args.host, args.port),
+        engine,
+        loop,
+        export_archive,
+        max_conversations=args.max_conversations,
+    )
+    logger.info("Serving on http://%s:%d", *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        loop.run(client.close_pool())
+        history.close()
+        loop.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+QUEUE_POLL_INTERVAL = 0.5  # Seconds between admission checks while queued
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a generation request is shed instead of being queued.
+    """
+
+
+@dataclass(eq=False)
+class Ticket:
+    session_id: str
+    enqueued_at: float
+    last_seen: float
+    admitted: bool = False
+    weight: int = 1
+
+
+class AdmissionController:
+    """
+    Process-wide concurrency limiter placed in front of the upstream client.
+
+    Requests wait in a FIFO queue until one of ``max_concurrent`` slots frees up.
+    A ticket for several concurrent generations holds one slot per
+    generation. Each session holds at most one ticket, so a single busy
+    session cannot starve the others. Sessions are also rate limited, and requests are shed
+    once the queue is full so latency under overload stays bounded.
+    """
+
+    def __init__(
+        self,
+        max_concurrent=2,
+        max_queue=16,
+        rate_limit=6,
+        rate_window=60.0,
+        stale_after=30.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._active = set()
+        self._tickets = {}
+        self._history = {}
+
+    def enqueue(self, session_id, weight=1):
+        """
+        Enqueue a generation request for a session.
+
+        Args:
+            weight: Slots the request needs, one per concurrent generation.
+                Capped at ``max_concurrent`` so it can always be admitted.
+
+        Returns:
+            The session's ticket, already admitted if a slot was free. An
+            existing ticket is returned unchanged.
+
+        Raises:
+            AdmissionRejected: If the session is rate limited, or no slot is
+                free and the queue is full.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire_stale(now)
+
+            ticket = self._tickets.get(session_id)
+            if ticket is not None:
+                ticket.last_seen = now
+                return ticket
+
+            history = self._history.setdefault(session_id, deque())
+            while history and now - history[0] > self.rate_window:
+                history.popleft()
+            if len(history) >= self.rate_limit:
+                retry_after = int(self.rate_window - (now - history[0])) + 1
+                raise AdmissionRejected(
+                    f"You are sending messages too quickly. Please wait {retry_after} seconds and try again."
+                )
+
+            weight = max(1, min(weight, self.max_concurrent))
+            # Nobody is waiting and the slots are free, so skip the queue
+            admit_now = (
+                not self._queue and weight <= self.max_concurrent - self._active_slots()
+            )
+            if not admit_now and len(self._queue) >= self.max_queue:
+                raise AdmissionRejected(
+                    "The server is busy right now. Please try again in a moment."
+                )
+
+            history.append(now)
+            ticket = Ticket(
+                session_id=session_id,
+                enqueued_at=now,
+                last_seen=now,
+                weight=weight,
+            )
+            self._tickets[session_id] = ticket
+            if admit_now:
+                self._active.add(ticket)
+                ticket.admitted = True
+            else:
+                self._queue.append(ticket)
+            return ticket
+
+    def try_admit(self, ticket):
+        """
+        Try to move a queued ticket into an active slot.
+
+        Returns:
+            True if the ticket holds a slot, False if it must keep waiting.
+        """
+        now = time.monotonic()
+        with self._lock:
+            ticket.last_seen = now
+            if ticket.admitted:
+                return True
+
+            self._expire_stale(now)
+            if ticket not in self._queue:
+                # The ticket expired while its session was not polling
+                self._tickets[ticket.session_id] = ticket
+                self._queue.append(ticket)
+
+            # Tickets ahead in the queue are admitted first
+            needed = ticket.weight
+            for queued in self._queue:
+                if queued is ticket:
+                    break
+                needed += queued.weight
+            if needed <= self.max_concurrent - self._active_slots():
+                self._queue.remove(ticket)
+                self._active.add(ticket)
+                ticket.admitted = True
+                return True
+            return False
+
+    def position(self, ticket):
+        """
+        Return the 1-based queue position of a ticket, or 0 once admitted.
+        """
+        with self._lock:
+            if ticket.admitted:
+                return 0
+            try:
+                return self._queue.index(ticket) + 1
+            except ValueError:
+                return len(self._queue) + 1
+
+    def release(self, ticket):
+        """
+        Release a ticket's slot or remove it from the queue.
+        """
+        with self._lock:
+            if ticket.admitted:
+                self._active.discard(ticket)
+                ticket.admitted = False
+            elif ticket in self._queue:
+                self._queue.remove(ticket)
+            if self._tickets.get(ticket.session_id) is ticket:
+                del self._tickets[ticket.session_id]
+
+    def stats(self):
+        """
+        Return a snapshot of the current load.
+        """
+        with self._lock:
+            return {
+                "active": self._active_slots(),
+                "queued": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            }
+
+    def _active_slots(self):
+        return sum(ticket.weight for ticket in self._active)
+
+    def _expire_stale(self, now):
+        """
+        Drop queued tickets whose sessions stopped polling.
+        """
+        for ticket in [t for t in self._queue if now - t.last_seen > self.stale_after]:
+            self._queue.remove(ticket)
+            if self._tickets.get(ticket.session_id) is ticket:
+                del self._tickets[ticket.session_id]
@@ -0,0 +1,218 @@
+import gzip
+import io
+import json
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 1000  # Rows per import transaction
+CHUNK_SIZE = 256 * 1024  # Bytes of JSONL encoded per yielded chunk
+COMPRESS_LEVEL = 1  # About 4x the throughput of level 6 for a ~35% larger archive
+GZIP_MAGIC = b"\x1f\x8b"
+
+_encoder = json.JSONEncoder(ensure_ascii=False)
+
+
+class ArchiveError(ValueError):
+    """
+    Raised when an input is not a history archive this version can read.
+    """
+
+
+def export_records(history, user_id=None):
+    """
+    Yield the archive records of the history store, optionally only a user's.
+
+    The first record is a header; each conversation record is followed by
+    its messages, so an importer only needs to remember the current
+    conversation. Message ids are only meaningful within the archive, where
+    they link replies to the message they follow. Summaries are not
+    exported: they are rebuilt on demand.
+    """
+    yield {"type": "archive", "version": FORMAT_VERSION, "exported_at": time.time()}
+    for conversation in history.iter_conversations(user_id):
+        yield {"type": "conversation", **conversation}
+        for message in history.iter_messages(conversation["id"]):
+            yield {
+                "type": "message",
+                "conversation_id": conversation["id"],
+                "id": message["id"],
+                "parent_id": message["parent_id"],
+                "role": message["role"],
+                "content": message["content"],
+                "created_at": message["created_at"],
+            }
+
+
+def encode_archive(records, compress=False, chunk_size=CHUNK_SIZE):
+    """
+    Encode records as JSONL, yielding byte chunks of about ``chunk_size``.
+
+    With ``compress`` the chunks form a single gzip member, produced
+    incrementally, so memory stays bounded by one chunk either way.
+    """
+    compressor = (
+        zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        if compress
+        else None
+    )
+    lines = []
+    size = 0
+    for record in records:
+        line = (_encoder.encode(record) + "\n").encode("utf-8")
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            data = b"".join(lines)
+            lines = []
+            size = 0
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+    data = b"".join(lines)
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def read_archive(fileobj):
+    """
+    Yield the records of a plain or gzipped archive read from a binary file.
+
+    Compression is detected from the first bytes. The input is decoded one
+    line at a time, so memory does not grow with the archive.
+
+    Raises:
+        ArchiveError: If the input does not start with an archive header.
+    """
+    buffered = None if hasattr(fileobj, "peek") else io.BufferedReader(fileobj)
+    stream = fileobj if buffered is None else buffered
+    if stream.peek(len(GZIP_MAGIC))[: len(GZIP_MAGIC)] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    text = io.TextIOWrapper(stream, encoding="utf-8")
+    try:
+        header = None
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if header is None:
+                    raise ArchiveError("Not a history archive") from None
+                # A torn last line from an interrupted export
+                logger.warning("Skipping invalid JSON on line %d", line_number)
+                continue
+            if header is None:
+                if not isinstance(record, dict) or record.get("type") != "archive":
+                    raise ArchiveError("Not a history archive")
+                if record.get("version") != FORMAT_VERSION:
+                    raise ArchiveError(
+                        f"Unsupported archive version {record.get('version')!r}"
+                    )
+                header = record
+            elif isinstance(record, dict):
+                yield record
+    finally:
+        # Leave the caller's file open
+        text.detach()
+        if buffered is not None:
+            buffered.detach()
+
+
+def import_records(history, records, user_id=None, batch_size=BATCH_SIZE):
+    """
+    Write archive records into the history store in batched transactions.
+
+    Conversations that already exist are skipped with their messages, so
+    importing the same archive twice does not duplicate anything. Messages
+    get fresh ids; links between them are mapped within the current
+    conversation, and messages without links follow the previous one. Only
+    the current batch and conversation's id map are held in memory.
+
+    Args:
+        user_id: Assign imported conversations to this user instead of the
+            user recorded in the archive.
+
+    Returns:
+        A dict with the number of conversations and messages imported and
+        of conversations skipped.
+    """
+    stats = {"conversations": 0, "messages": 0, "skipped": 0}
+    conversations = []
+    messages = []
+    current_id = None
+    new_ids = {}
+    previous_id = None
+    # Ids are reserved a batch at a time rather than per message
+    next_id = id_limit = 0
+
+    def write_batch():
+        history.import_batch(conversations, messages)
+        stats["conversations"] += len(conversations)
+        stats["messages"] += len(messages)
+        conversations.clear()
+        messages.clear()
+
+    for record in records:
+        kind = record.get("type")
+        try:
+            if kind == "conversation":
+                current_id = str(record["id"])
+                new_ids.clear()
+                previous_id = None
+                if history.has_conversation(current_id):
+                    stats["skipped"] += 1
+                    current_id = None
+                    continue
+                conversations.append(
+                    (
+                        current_id,
+                        user_id or str(record["user_id"]),
+                        str(record["title"]),
+                        float(record["updated_at"]),
+                    )
+                )
+            elif kind == "message":
+                if current_id is None or record["conversation_id"] != current_id:
+                    continue
+                if next_id == id_limit:
+                    next_id = history.reserve_ids(batch_size)
+                    id_limit = next_id + batch_size
+                message_id = next_id
+                next_id += 1
+                parent_id = previous_id
+                if "parent_id" in record:
+                    parent = record["parent_id"]
+                    parent_id = (
+                        None if parent is None else new_ids.get(parent, parent_id)
+                    )
+                if "id" in record:
+                    new_ids[record["id"]] = message_id
+                messages.append(
+                    (
+                        message_id,
+                        current_id,
+                        str(record["role"]),
+                        str(record["content"]),
+                        float(record.get("created_at") or time.time()),
+                        parent_id,
+                    )
+                )
+                previous_id = message_id
+            else:
+                continue
+        except (KeyError, TypeError, ValueError) as e:
+            raise ArchiveError(f"Invalid {kind} record: {e!r}") from None
+        if len(conversations) + len(messages) >= batch_size:
+            write_batch()
+
+    if conversations or messages:
+        write_batch()
+    return stats
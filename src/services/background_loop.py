@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """
+    A process-wide asyncio event loop running on a daemon thread.
+
+    Streamlit script threads submit coroutines here instead of creating a
+    fresh loop per request, so loop-bound resources such as pooled HTTP
+    connections survive between requests and sessions.
+    """
+
+    def __init__(self, name="background-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """
+        Run a coroutine on the loop and block until it completes.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine on the loop without waiting for it.
+
+        Returns:
+            A concurrent.futures.Future for the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
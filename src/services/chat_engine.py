@@ -0,0 +1,633 @@
+import asyncio
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import ClassVar, Optional
+
+from .cold_storage import message_text
+from .conversation_tree import CONTEXT_CACHE_SIZE, ConversationTree
+from .summarizer import TRANSCRIPT_STOP, format_transcript
+
+MAX_MESSAGES = 10  # Messages kept in memory per conversation
+HISTORY_PAGE_SIZE = 10  # Messages loaded per lazy-loading page
+TITLE_LENGTH = 40  # Characters of the first message used as a conversation title
+CONTEXT_RECENT_MESSAGES = 6  # Earlier messages sent verbatim with each prompt
+SUMMARY_BATCH = 2  # Aged-out messages that trigger a summary refresh
+CONTEXT_MAX_TOKENS = 4096  # Largest upstream context kept for reuse
+
+
+@dataclass(frozen=True)
+class TokenEvent:
+    kind: ClassVar[str] = "token"
+    text: str
+
+
+@dataclass(frozen=True)
+class DoneEvent:
+    kind: ClassVar[str] = "done"
+    message: dict
+    done_reason: Optional[str] = None
+    timings: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class ErrorEvent:
+    kind: ClassVar[str] = "error"
+    error: str
+    message: Optional[dict] = None
+
+
+@dataclass
+class Turn:
+    """
+    A reply being generated: its prompt, the placeholder message it fills
+    and the final fields reported by the client once it is done.
+    """
+
+    prompt: str
+    context: Optional[array]
+    message: dict
+    done: dict = field(default_factory=dict)
+
+
+class ChatEngine:
+    """
+    UI-independent conversation logic: history, context building, streaming
+    and retention.
+
+    The engine holds no per-session data. Every call takes the session's
+    ``state``, a mutable mapping with keys such as ``conversation_id`` and
+    ``messages``. A plain dict works, and so does Streamlit's session state,
+    so one process-wide engine can serve any number of sessions.
+
+    ``messages`` is the current branch of the conversation. The branches
+    themselves live in a ConversationTree under ``tree``, which also caches
+    the upstream context of recent replies for every branch that continues
+    from them.
+
+    The async methods run their history store calls on worker threads, so
+    a slow SQLite read or write does not hold up other replies streaming on
+    the same event loop. A state must still only be used by one call at a
+    time.
+    """
+
+    def __init__(
+        self,
+        client,
+        history=None,
+        summarizer=None,
+        cold_storage=None,
+        max_messages=MAX_MESSAGES,
+        page_size=HISTORY_PAGE_SIZE,
+        context_messages=CONTEXT_RECENT_MESSAGES,
+        summary_batch=SUMMARY_BATCH,
+        reuse_context=True,
+        context_max_tokens=CONTEXT_MAX_TOKENS,
+        context_cache_size=CONTEXT_CACHE_SIZE,
+    ):
+        self.client = client
+        self.history = history
+        self.summarizer = summarizer
+        self.cold_storage = cold_storage
+        self.max_messages = max_messages
+        self.page_size = page_size
+        self.context_messages = context_messages
+        self.summary_batch = summary_batch
+        self.reuse_context = reuse_context
+        self.context_max_tokens = context_max_tokens
+        self.context_cache_size = context_cache_size
+
+    def new_state(self, conversation_id, user_id=None):
+        """
+        Create the state of a session outside Streamlit and load a conversation into it.
+        """
+        state = {"user_id": user_id}
+        self.load_conversation(state, conversation_id)
+        return state
+
+    async def send(self, state, content):
+        """
+        Add a user message and stream the reply to it.
+
+        Yields:
+            TokenEvent for each chunk, then one DoneEvent or ErrorEvent.
+        """
+        await asyncio.to_thread(self.add_user_message, state, content)
+        async for event in self.reply(state):
+            yield event
+
+    async def reply(self, state):
+        """
+        Stream a reply to the latest user message.
+
+        Yields:
+            TokenEvent for each chunk, then one DoneEvent or ErrorEvent.
+        """
+        turn = await asyncio.to_thread(self.start_reply, state)
+        parts = []
+        try:
+            async for event in self.stream(turn):
+                parts.append(event.text)
+                yield event
+        except (asyncio.CancelledError, GeneratorExit):
+            # The consumer went away; leave the conversation consistent.
+            # Nothing can be awaited while the generator is being closed.
+            self._fail_reply(state, turn, "".join(parts), "Cancelled")
+            raise
+        except Exception as e:
+            await asyncio.to_thread(
+                self._fail_reply, state, turn, "".join(parts), str(e)
+            )
+            yield ErrorEvent(str(e), turn.message)
+            return
+
+        if not parts and not turn.done:
+            # The client logs and swallows upstream failures
+            error = "No response from the model"
+            await asyncio.to_thread(self._fail_reply, state, turn, "", error)
+            yield ErrorEvent(error, turn.message)
+            return
+
+        turn.message["content"] = "".join(parts)
+        await asyncio.to_thread(self.finish_reply, state, turn.done)
+        yield DoneEvent(
+            turn.message,
+            turn.done.get("done_reason"),
+            {k: v for k, v in turn.done.items() if k not in ("context", "done_reason")},
+        )
+
+    async def regenerate(self, state, message):
+        """
+        Stream another reply to the user message that ``message`` answered.
+
+        The previous reply stays available as a sibling branch.
+
+        Yields:
+            TokenEvent for each chunk, then one DoneEvent or ErrorEvent.
+        """
+        if message["role"] == "ai" and await asyncio.to_thread(
+            self.rewind, state, message
+        ):
+            async for event in self.reply(state):
+                yield event
+
+    async def edit(self, state, message, content):
+        """
+        Send ``content`` in place of an earlier user message and stream the reply.
+
+        The original message and everything after it stay available as a
+        sibling branch.
+
+        Yields:
+            TokenEvent for each chunk, then one DoneEvent or ErrorEvent.
+        """
+        if message["role"] == "user" and await asyncio.to_thread(
+            self.rewind, state, message
+        ):
+            async for event in self.send(state, content):
+                yield event
+
+    def start_reply(self, state):
+        """
+        Build the prompt for the latest user message and add an empty reply for it.
+        """
+        history = self.prompt_history(state)
+        context = self.reusable_context(state, history)
+        if context is not None:
+            # The upstream context already covers every earlier turn
+            prompt = message_text(history[-1])
+        else:
+            prompt = self.build_prompt(state)
+        message = {"role": "ai", "content": ""}
+        state["messages"].append(message)
+        return Turn(prompt, context, message)
+
+    async def stream(self, turn):
+        """
+        Stream the upstream reply for a turn without touching session state.
+
+        Safe to run on another thread or event loop than the one owning the
+        state; the final context and timings are collected in ``turn.done``.
+        """
+        async for chunk in self.client.generate(
+            turn.prompt,
+            context=turn.context,
+            on_done=turn.done.update,
+            stop=TRANSCRIPT_STOP,
+        ):
+            yield TokenEvent(chunk)
+
+    def finish_reply(self, state, done=None):
+        """
+        Commit the finished reply, then apply compaction and retention.
+
+        Returns:
+            The committed reply, or None if the conversation does not end with one.
+        """
+        messages = state["messages"]
+        message = None
+        if messages and messages[-1]["role"] == "ai":
+            message = messages[-1]
+            self.persist(state, message)
+            self.commit_context(state, message, done)
+        self.schedule_compaction(state)
+        self.limit_messages(state)
+        return message
+
+    def _fail_reply(self, state, turn, text, error):
+        if text:
+            # Keep what arrived so the reply can be regenerated
+            turn.message.update(content=text, interrupted=True)
+            self.persist(state, turn.message)
+        else:
+            turn.message.update(content=error, error=True)
+
+    def load_conversation(self, state, conversation_id):
+        """
+        Make a conversation current, loading its latest page from the history store.
+        """
+        state["conversation_id"] = conversation_id
+        state["messages"] = []
+        if self.history is not None:
+            state["messages"] = self.history.load_page(
+                conversation_id, limit=self.page_size
+            )
+            self.freeze(state["messages"])
+        state["tree"] = ConversationTree(
+            state["messages"], max_contexts=self.context_cache_size
+        )
+        self.load_siblings(state, state["messages"])
+        self.update_has_older(state)
+
+    def regenerate_interrupted(self, state):
+        """
+        Drop an interrupted reply so it is generated again for the same user message.
+        """
+        messages = state["messages"]
+        if not messages or not messages[-1].get("interrupted"):
+            return
+        message = messages[-1]
+        tree = self.tree(state)
+        tree.remove(message)
+        state["messages"] = tree.path()
+        if self.history is not None and message.get("id") is not None:
+            self.history.delete_message(message["id"])
+
+    def tree(self, state):
+        """
+        Return the conversation's tree, synced with the current branch.
+        """
+        tree = state.get("tree")
+        if tree is None:
+            tree = ConversationTree(max_contexts=self.context_cache_size)
+            state["tree"] = tree
+        tree.sync(state["messages"])
+        return tree
+
+    def rewind(self, state, message):
+        """
+        Continue the conversation from just before ``message``.
+
+        The next message added becomes a sibling of ``message``, so a
+        regenerated reply or an edited prompt starts a new branch while the
+        original one is kept. Failed replies are dropped instead.
+
+        Returns:
+            False if the message is not on the current branch.
+        """
+        tree = self.tree(state)
+        node = tree.node(message)
+        if node is None or node.parent is tree.root and message["role"] == "ai":
+            return False
+        parent = node.parent
+        if message.get("error"):
+            tree.remove(message)
+        state["messages"] = tree.rewind(parent)
+        return True
+
+    def switch_branch(self, state, message, offset):
+        """
+        Show the branch of a sibling of ``message``, ``offset`` positions away.
+
+        The walk follows the branch as it was last visited, so it costs
+        O(depth); a branch only known from the history store is loaded
+        along its latest replies.
+
+        Returns:
+            False if there is no sibling at that offset.
+        """
+        tree = self.tree(state)
+        target = tree.switch(message, offset)
+        if target is None:
+            return False
+        loaded = []
+        if not target.loaded:
+            loaded = self.history.load_branch(
+                state["conversation_id"], target.message["id"]
+            )[1:]
+            self.freeze(loaded)
+            parent = target
+            for row in loaded:
+                parent = tree.append(row, parent)
+            target.loaded = True
+        state["messages"] = tree.path()
+        self.load_siblings(state, loaded)
+        return True
+
+    def branch_position(self, state, message):
+        """
+        Return the 1-based position of a message among its alternatives and their count.
+        """
+        return self.tree(state).position(message)
+
+    def load_siblings(self, state, messages):
+        """
+        Add the stored alternatives to loaded messages as branches to load on demand.
+        """
+        ids = [m["id"] for m in messages if m.get("id") is not None]
+        if self.history is None or not ids:
+            return
+        tree = self.tree(state)
+        parents = {
+            m.get("parent_id"): tree.node(m).parent
+            for m in messages
+            if m.get("id") is not None and tree.node(m) is not None
+        }
+        for sibling in self.history.load_siblings(state["conversation_id"], ids):
+            parent = parents.get(sibling["parent_id"])
+            if parent is not None:
+                self.freeze([sibling])
+                tree.append(sibling, parent, loaded=False, select=False)
+
+    def invalidate_context(self, state):
+        """
+        Forget the cached upstream contexts, so the next prompt is built from history.
+        """
+        tree = state.get("tree")
+        if tree is not None:
+            tree.clear_contexts()
+
+    def reusable_context(self, state, history):
+        """
+        Return the upstream context if it covers everything before the latest message.
+
+        Contexts are cached on the reply they ended with. One applies while
+        that reply is the message right before the new user turn, which
+        holds for every branch that continues from it: a regenerated reply
+        or an edited prompt reuses the context of the turn before it. An
+        interrupted or failed turn falls back to a prompt built from history.
+        """
+        if not self.reuse_context or len(history) < 2:
+            return None
+        return self.tree(state).context(history[-2])
+
+    def commit_context(self, state, message, done=None):
+        """
+        Cache the context reported for a finished reply for the turns after it.
+        """
+        done = done or {}
+        context = done.get("context")
+        if (
+            not self.reuse_context
+            or not context
+            or len(context) > self.context_max_tokens
+        ):
+            # Too long to keep: the next prompt is rebuilt from summary and recent turns
+            return
+        self.tree(state).remember_context(message, array("i", context))
+
+    def list_conversations(self, state):
+        """
+        Return the user's conversations, most recently active first.
+        """
+        if self.history is None or state.get("user_id") is None:
+            return []
+        if state.get("conversation_list") is None:
+            state["conversation_list"] = self.history.list_conversations(
+                state["user_id"]
+            )
+        return state["conversation_list"]
+
+    def search_messages(self, state, query, limit=20):
+        """
+        Search the user's history, caching results for the last query.
+        """
+        if self.history is None or state.get("user_id") is None:
+            return []
+        cached = state.get("search_cache")
+        if cached is not None and cached[0] == query:
+            return cached[1]
+        results = self.history.search(state["user_id"], query, limit=limit)
+        state["search_cache"] = (query, results)
+        return results
+
+    def load_older_messages(self, state):
+        """
+        Prepend the next page of older messages from the history store.
+        """
+        if self.history is None or not state["messages"]:
+            return
+        before_id = state["messages"][0].get("id")
+        if before_id is None:
+            return
+        page = self.history.load_page(
+            state["conversation_id"],
+            before_id=before_id,
+            limit=self.page_size,
+        )
+        self.freeze(page)
+        state["messages"] = page + state["messages"]
+        self.load_siblings(state, page)
+        self.update_has_older(state)
+
+    def add_user_message(self, state, content):
+        """
+        Append a user message to the conversation and persist it.
+        """
+        message = {"role": "user", "content": content}
+        state["messages"].append(message)
+        self.persist(state, message)
+        self.touch_conversation(state, content)
+        return message
+
+    def touch_conversation(self, state, first_message):
+        """
+        Record activity on the current conversation and move it to the top of the list.
+        """
+        conversation_id = state.get("conversation_id")
+        user_id = state.get("user_id")
+        if self.history is None or conversation_id is None or user_id is None:
+            return
+
+        title = first_message.splitlines()[0][:TITLE_LENGTH]
+        self.history.touch_conversation(conversation_id, user_id, title)
+
+        # Update the cached listing in place instead of re-reading it from disk
+        listing = state.get("conversation_list")
+        if listing is not None:
+            entry = next((c for c in listing if c["id"] == conversation_id), None)
+            if entry is None:
+                entry = {"id": conversation_id, "title": title}
+            entry["updated_at"] = time.time()
+            state["conversation_list"] = [entry] + [
+                c for c in listing if c["id"] != conversation_id
+            ]
+
+    def persist(self, state, message):
+        """
+        Queue a finished message for write-behind persistence.
+        """
+        conversation_id = state.get("conversation_id")
+        if (
+            self.history is not None
+            and not message.get("error")
+            and conversation_id is not None
+        ):
+            parent_id = self.parent_id(state, message)
+            message["parent_id"] = parent_id
+            message["id"] = self.history.append(
+                conversation_id, message["role"], message["content"], parent_id
+            )
+            if "search_cache" in state:
+                del state["search_cache"]
+        self.freeze([message])
+
+    def parent_id(self, state, message):
+        """
+        Return the id of the stored message that ``message`` follows, or None.
+        """
+        tree = self.tree(state)
+        node = tree.node(message)
+        node = node.parent if node is not None else tree.leaf
+        while node is not tree.root:
+            if node.message.get("id") is not None:
+                return node.message["id"]
+            node = node.parent
+        # The branch starts above the loaded messages, where their siblings start
+        return next(
+            (
+                child.message["parent_id"]
+                for child in tree.root.children
+                if "parent_id" in child.message
+            ),
+            None,
+        )
+
+    def freeze(self, messages):
+        """
+        Compress the text of large finished messages, if cold storage is enabled.
+        """
+        if self.cold_storage is not None:
+            self.cold_storage.freeze(messages)
+
+    def update_has_older(self, state):
+        """
+        Record whether older messages exist beyond the in-memory window.
+        """
+        has_older = False
+        if self.history is not None and state["messages"]:
+            has_older = self.history.has_older(
+                state["conversation_id"], state["messages"][0].get("id")
+            )
+        state["has_older_messages"] = has_older
+
+    def prompt_history(self, state):
+        """
+        Return the messages that make up the conversation as the model sees it.
+        """
+        return [
+            m
+            for m in state["messages"]
+            if not m.get("error") and not m.get("interrupted")
+        ]
+
+    def build_prompt(self, state):
+        """
+        Build the upstream prompt for the latest user message.
+
+        Recent turns are sent verbatim; anything older is represented by the
+        conversation's rolling summary, so the prompt stays short as the
+        conversation grows.
+        """
+        history = self.prompt_history(state)
+        latest = history[-1]
+        earlier = history[:-1][-self.context_messages :]
+
+        summary = self.current_summary(state)
+        if summary is not None:
+            earlier = [
+                m
+                for m in earlier
+                if m.get("id") is None or m["id"] > summary["through_id"]
+            ]
+
+        if not earlier and summary is None:
+            return message_text(latest)
+
+        parts = []
+        if summary is not None:
+            parts.append(f"Summary of the earlier conversation:\n{summary['text']}")
+        parts.append(format_transcript(earlier + [latest]) + "\nAssistant:")
+        return "\n\n".join(parts)
+
+    def current_summary(self, state):
+        """
+        Return the conversation's summary if it was folded from the current branch.
+        """
+        conversation_id = state.get("conversation_id")
+        if self.summarizer is None or conversation_id is None:
+            return None
+        summary = self.summarizer.get(conversation_id)
+        if summary is not None and not self.on_branch(state, summary["through_id"]):
+            # Rebuilt from this branch by the next compaction
+            self.summarizer.forget(conversation_id)
+            return None
+        return summary
+
+    def on_branch(self, state, message_id):
+        """
+        Return True if a stored message is on the current branch.
+        """
+        ids = [m["id"] for m in state["messages"] if m.get("id") is not None]
+        if not ids or message_id in ids:
+            return True
+        if message_id > ids[0] or self.history is None:
+            return message_id < ids[0]
+        return self.history.is_ancestor(message_id, ids[0])
+
+    def schedule_compaction(self, state):
+        """
+        Fold messages that aged out of the verbatim context window into the summary.
+        """
+        conversation_id = state.get("conversation_id")
+        if self.summarizer is None or conversation_id is None:
+            return
+
+        persisted = [
+            m
+            for m in state["messages"]
+            if m.get("id") is not None and not m.get("interrupted")
+        ]
+        older = persisted[: -self.context_messages]
+        summary = self.current_summary(state)
+        through_id = summary["through_id"] if summary is not None else 0
+        pending = [m for m in older if m["id"] > through_id]
+        if len(pending) >= self.summary_batch:
+            self.summarizer.schedule(self.client, conversation_id, pending)
+
+    def limit_messages(self, state, max_messages=None):
+        """
+        Limit the number of messages kept in memory.
+
+        Trimmed messages remain in the history store and can be lazy-loaded
+        again. Runs after every reply, so it never waits for the store.
+        """
+        if max_messages is None:
+            max_messages = self.max_messages
+        if len(state["messages"]) > max_messages:
+            state["messages"] = state["messages"][-max_messages:]
+            # Release the branches above the kept messages
+            self.tree(state)
+            if self.history is not None:
+                # The trimmed messages themselves are older
+                state["has_older_messages"] = True
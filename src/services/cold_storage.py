@@ -0,0 +1,82 @@
+import zlib
+
+COMPRESS_THRESHOLD = 4096  # Characters above which a finished message is compressed
+
+
+class CompressedText:
+    """
+    The zlib-compressed text of a finished message.
+
+    Stands in for the ``content`` string of a message dict. ``str()`` returns
+    the original text, so f-strings and ``message_text`` keep working, and
+    ``cache_key`` lets renderers cache output without decompressing.
+    """
+
+    __slots__ = ("data", "size")
+
+    def __init__(self, text, level=6):
+        raw = text.encode("utf-8")
+        self.data = zlib.compress(raw, level)
+        self.size = len(raw)
+
+    @property
+    def cache_key(self):
+        return self.data
+
+    def __str__(self):
+        return zlib.decompress(self.data).decode("utf-8")
+
+    def __repr__(self):
+        return f"CompressedText({self.size} -> {len(self.data)} bytes)"
+
+
+def message_text(message):
+    """
+    Return a message's content as a string, decompressing it if needed.
+    """
+    return str(message["content"])
+
+
+class ColdStorage:
+    """
+    Moves the text of large finished messages into compressed form.
+
+    Long answers dominate session memory but are rarely read again except
+    to be rendered, which renderers serve from their own HTML cache. The
+    text is only decompressed when needed, e.g. to build context or export.
+    """
+
+    def __init__(self, threshold=COMPRESS_THRESHOLD, level=6):
+        self.threshold = threshold
+        self.level = level
+
+    def freeze(self, messages):
+        """
+        Compress the content of every message above the threshold in place.
+        """
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, str) or len(content) < self.threshold:
+                continue
+            compressed = CompressedText(content, self.level)
+            if len(compressed.data) < compressed.size:
+                message["content"] = compressed
+
+    def stats(self, messages):
+        """
+        Summarize how much memory compression saves for a list of messages.
+        """
+        count = raw = stored = 0
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, CompressedText):
+                count += 1
+                raw += content.size
+                stored += len(content.data)
+        return {
+            "compressed_messages": count,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "saved_bytes": raw - stored,
+            "ratio": raw / stored if stored else None,
+        }
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+
+from .memory_guard import messages_size
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationCache:
+    """
+    Keeps the most recently used inactive conversations of a session in memory.
+
+    Conversations pushed out of the LRU window are serialized to a compressed
+    file in ``spill_dir`` and read back the next time they are requested, so a
+    session's memory stays bounded no matter how many threads it opens.
+    ``spill_dir`` belongs to the cache and is removed with it, when the
+    session is garbage collected or the process exits.
+    """
+
+    def __init__(self, spill_dir, capacity=3):
+        self.spill_dir = spill_dir
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._sizes = {}
+        weakref.finalize(self, shutil.rmtree, spill_dir, ignore_errors=True)
+
+    def pop(self, conversation_id):
+        """
+        Remove and return the state of a conversation, reloading it if spilled.
+
+        Returns:
+            The conversation state, or None if it is neither in memory nor on disk.
+        """
+        with self._lock:
+            state = self._entries.pop(conversation_id, None)
+            self._sizes.pop(conversation_id, None)
+            if state is None:
+                state = self._load_spilled(conversation_id)
+        return state
+
+    def put(self, conversation_id, state):
+        """
+        Park a conversation as the most recently used entry, spilling the oldest.
+        """
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+            self._entries[conversation_id] = state
+            self._sizes[conversation_id] = messages_size(state["messages"])
+            while len(self._entries) > self.capacity:
+                evicted_id, evicted_state = self._entries.popitem(last=False)
+                del self._sizes[evicted_id]
+                self._spill(evicted_id, evicted_state)
+
+    def spill_all(self):
+        """
+        Spill every conversation held in memory, e.g. under memory pressure.
+        """
+        with self._lock:
+            while self._entries:
+                evicted_id, evicted_state = self._entries.popitem(last=False)
+                del self._sizes[evicted_id]
+                self._spill(evicted_id, evicted_state)
+
+    def memory_size(self):
+        """
+        Approximate bytes held by the conversations parked in memory.
+        """
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def discard(self, conversation_id):
+        """
+        Forget a conversation both in memory and on disk.
+        """
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+            self._sizes.pop(conversation_id, None)
+        try:
+            os.remove(self._spill_path(conversation_id))
+        except FileNotFoundError:
+            pass
+
+    def in_memory(self):
+        """
+        Return the ids of conversations currently held in memory, least recent first.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def _spill_path(self, conversation_id):
+        # Conversation ids come from URLs, so they never become part of a path
+        name = hashlib.sha256(conversation_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, f"{name}.json.z")
+
+    def _spill(self, conversation_id, state):
+        """
+        Serialize an evicted conversation to compact compressed JSON.
+        """
+        # Compressed message text is written out as plain text (default=str)
+        payload = json.dumps(state, separators=(",", ":"), default=str).encode("utf-8")
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self._spill_path(conversation_id), "wb") as f:
+                f.write(zlib.compress(payload))
+        except OSError:
+            # The history store still has the messages; only the window is lost
+            logger.exception("Failed to spill conversation %s", conversation_id)
+
+    def _load_spilled(self, conversation_id):
+        path = self._spill_path(conversation_id)
+        try:
+            with open(path, "rb") as f:
+                payload = zlib.decompress(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, zlib.error):
+            logger.exception("Failed to reload conversation %s", conversation_id)
+            return None
+        os.remove(path)
+        return json.loads(payload)
@@ -1,12 +1,274 @@
 import asyncio
+import logging
 import time
 
 import streamlit as st
 
+from .admission import QUEUE_POLL_INTERVAL, AdmissionRejected
+from .archive import encode_archive, export_records
+from .chat_engine import (
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_RECENT_MESSAGES,
+    HISTORY_PAGE_SIZE,
+    MAX_MESSAGES,
+    SUMMARY_BATCH,
+    ChatEngine,
+)
+from .memory_guard import messages_size
+from .stream_buffer import StreamBuffer
+from .telemetry import CHUNK_SAMPLE_RATE, RequestTrace, current_request
+
+FRAME_INTERVAL = 0.05  # Seconds between streamed frames
+REVEAL_RATE = 200  # Chunks revealed per second while painting a reply
+MAX_REVEAL_SECONDS = 5  # Longer replies are revealed faster to finish in time
+
 
 class ConversationService:
-    def __init__(self, client):
+    """
+    Streamlit adapter over ChatEngine.
+
+    The engine owns the conversation logic and keeps its state in
+    ``st.session_state``. This class adds what only a Streamlit session
+    needs: admission control, journaling, tracing, memory reporting, and
+    revealing a buffered reply across script reruns.
+    """
+
+    def __init__(
+        self,
+        client,
+        admission=None,
+        session_id=None,
+        history=None,
+        cache=None,
+        journal=None,
+        summarizer=None,
+        loop=None,
+        cold_storage=None,
+        memory_guard=None,
+        max_messages=MAX_MESSAGES,
+        page_size=HISTORY_PAGE_SIZE,
+        context_messages=CONTEXT_RECENT_MESSAGES,
+        summary_batch=SUMMARY_BATCH,
+        reuse_context=True,
+        context_max_tokens=CONTEXT_MAX_TOKENS,
+        frame_interval=FRAME_INTERVAL,
+        chunk_sample_rate=CHUNK_SAMPLE_RATE,
+    ):
         self.client = client
+        self.admission = admission
+        self.session_id = session_id
+        self.cache = cache
+        self.journal = journal
+        self.loop = loop
+        self.memory_guard = memory_guard
+        self.frame_interval = frame_interval
+        self.chunk_sample_rate = chunk_sample_rate
+        self.engine = ChatEngine(
+            client,
+            history=history,
+            summarizer=summarizer,
+            cold_storage=cold_storage,
+            max_messages=max_messages,
+            page_size=page_size,
+            context_messages=context_messages,
+            summary_batch=summary_batch,
+            reuse_context=reuse_context,
+            context_max_tokens=context_max_tokens,
+        )
+
+    def load_conversation(self, conversation_id):
+        """
+        Make a conversation current, loading its latest page from the history store.
+        """
+        self.engine.load_conversation(st.session_state, conversation_id)
+        self._recover_orphaned_reply(conversation_id)
+
+    def regenerate_interrupted(self):
+        """
+        Drop an interrupted reply so it is generated again for the same user message.
+        """
+        self.engine.regenerate_interrupted(st.session_state)
+
+    def regenerate(self, message):
+        """
+        Ask for another reply in place of ``message``, keeping it as a branch.
+
+        The reply starts on the next run like any other turn.
+        """
+        if message["role"] == "ai":
+            self.engine.rewind(st.session_state, message)
+
+    def edit_message(self, message, content):
+        """
+        Send ``content`` in place of an earlier user message, keeping the original branch.
+        """
+        if message["role"] == "user" and self.engine.rewind(st.session_state, message):
+            self.add_user_message(content)
+
+    def switch_branch(self, message, offset):
+        """
+        Show the branch of a sibling of ``message``, ``offset`` positions away.
+        """
+        return self.engine.switch_branch(st.session_state, message, offset)
+
+    def branch_position(self, message):
+        """
+        Return the 1-based position of a message among its alternatives and their count.
+        """
+        return self.engine.branch_position(st.session_state, message)
+
+    def invalidate_context(self):
+        """
+        Forget the upstream context, so the next prompt is built from history.
+        """
+        self.engine.invalidate_context(st.session_state)
+
+    def _recover_orphaned_reply(self, conversation_id):
+        """
+        Restore a reply whose stream was cut off by a server restart.
+
+        A fully received reply is committed as if streaming had finished;
+        a partial one is kept and marked interrupted so it can be regenerated.
+        """
+        if self.journal is None:
+            return
+        recovered = self.journal.recover(conversation_id)
+        if recovered is None:
+            return
+        text, complete = recovered
+        messages = st.session_state.messages
+        if messages and messages[-1]["role"] == "user":
+            message = {"role": "ai", "content": text}
+            if not complete:
+                message["interrupted"] = True
+            messages.append(message)
+            self.engine.persist(st.session_state, message)
+        self.journal.discard(conversation_id)
+
+    def switch_conversation(self, conversation_id):
+        """
+        Park the current conversation in the cache and make another one current.
+        """
+        current_id = st.session_state.get("conversation_id")
+        if current_id == conversation_id:
+            return
+
+        if self.cache is None:
+            self.load_conversation(conversation_id)
+            return
+
+        if current_id is not None and st.session_state.messages:
+            self.cache.put(
+                current_id,
+                {
+                    "messages": st.session_state.messages,
+                    "has_older_messages": st.session_state.get(
+                        "has_older_messages", False
+                    ),
+                },
+            )
+
+        state = self.cache.pop(conversation_id)
+        if state is None:
+            self.load_conversation(conversation_id)
+        else:
+            st.session_state.conversation_id = conversation_id
+            st.session_state.messages = state["messages"]
+            # Spilled conversations come back as plain text
+            self.engine.freeze(state["messages"])
+            self.engine.load_siblings(st.session_state, state["messages"])
+            st.session_state.has_older_messages = state["has_older_messages"]
+
+    def list_conversations(self):
+        """
+        Return the current user's conversations, most recently active first.
+        """
+        return self.engine.list_conversations(st.session_state)
+
+    def search_messages(self, query, limit=20):
+        """
+        Search the current user's history, caching results for the last query.
+        """
+        return self.engine.search_messages(st.session_state, query, limit=limit)
+
+    def archive_exporter(self):
+        """
+        Return a callable producing the current user's history as a gzipped archive.
+
+        The sidebar calls it when an export is requested. Records are encoded
+        and compressed as they are read; the compressed archive is then held
+        in memory until it is downloaded, so multi-GB exports belong to
+        ``src/history_archive.py``.
+        Returns None without a history store.
+        """
+        history = self.engine.history
+        user_id = st.session_state.get("user_id")
+        if history is None or user_id is None:
+            return None
+
+        def export():
+            return b"".join(
+                encode_archive(export_records(history, user_id), compress=True)
+            )
+
+        return export
+
+    def load_older_messages(self):
+        """
+        Prepend the next page of older messages from the history store.
+        """
+        self.engine.load_older_messages(st.session_state)
+
+    def add_user_message(self, content):
+        """
+        Append a user message to the conversation and persist it.
+        """
+        message = self.engine.add_user_message(st.session_state, content)
+        self._trace().event(
+            "request.start", user_message_id=message.get("id"), chars=len(content)
+        )
+
+    def _trace(self):
+        """
+        Return the trace of the request being served, starting one if needed.
+        """
+        trace = st.session_state.get("request_trace")
+        if trace is None:
+            trace = RequestTrace(
+                sample_rate=self.chunk_sample_rate,
+                session_id=self.session_id,
+                conversation_id=st.session_state.get("conversation_id"),
+            )
+            st.session_state.request_trace = trace
+        return trace
+
+    def report_memory(self):
+        """
+        Report this session's approximate memory to the process-wide guard.
+
+        Called once per script run. If the guard asked this session to shed
+        memory, the history is trimmed first, on the session's own thread.
+        """
+        if self.memory_guard is None or self.session_id is None:
+            return
+        if self.memory_guard.consume_trim_request(self.session_id):
+            self.engine.limit_messages(
+                st.session_state, self.memory_guard.keep_messages
+            )
+
+        buffer = st.session_state.get("stream_buffer")
+        # The visible part of a streaming reply is already counted in messages
+        pinned = buffer.size - len(buffer.text) if buffer is not None else 0
+        tree = st.session_state.get("tree")
+        if tree is not None:
+            # Other branches are only released when the history is trimmed above them
+            on_path = {id(message) for message in st.session_state.messages}
+            pinned += tree.context_bytes() + messages_size(
+                node.message for node in tree.nodes() if id(node.message) not in on_path
+            )
+        self.memory_guard.update(
+            self.session_id, self, st.session_state.messages, pinned=pinned
+        )
 
     def handle_ai_thinking(self):
         """
@@ -14,96 +276,225 @@ class ConversationService:
         """
         if st.session_state.get("ai_thinking", False):
             if not st.session_state.get("streaming_active", False):
-                # Initialize streaming
-                self._start_streaming()
+                # Initialize streaming once an upstream slot is available
+                if self._acquire_slot():
+                    self._start_streaming()
             elif st.session_state.get("streaming_active", False):
                 # Continue streaming
                 self._continue_streaming()
 
+    def _acquire_slot(self):
+        """
+        Acquire an admission slot, rerunning with the queue position until admitted.
+        """
+        if self.admission is None:
+            return True
+
+        ticket = st.session_state.get("admission_ticket")
+        try:
+            if ticket is None:
+                ticket = self.admission.enqueue(self.session_id)
+                st.session_state.admission_ticket = ticket
+        except AdmissionRejected as e:
+            self._reject_request(str(e))
+            return False
+
+        if self.admission.try_admit(ticket):
+            st.session_state.queue_position = 0
+            return True
+
+        st.session_state.queue_position = self.admission.position(ticket)
+        time.sleep(QUEUE_POLL_INTERVAL)
+        st.rerun()
+        return False
+
+    def _release_slot(self):
+        """
+        Release the admission slot held by this session, if any.
+        """
+        ticket = st.session_state.get("admission_ticket")
+        if ticket is not None and self.admission is not None:
+            self.admission.release(ticket)
+        for key in ["admission_ticket", "queue_position"]:
+            if key in st.session_state:
+                del st.session_state[key]
+
+    def _reject_request(self, reason):
+        """
+        Answer a shed request with an error bubble instead of generating.
+        """
+        self._trace().event("request.rejected", logging.WARNING, reason=reason)
+        st.session_state.messages.append(
+            {"role": "ai", "content": reason, "error": True}
+        )
+        self._cleanup_streaming()
+        st.rerun()
+
     def _start_streaming(self):
         """
         Start streaming response.
         """
         try:
-            user_message = st.session_state.messages[-1]["content"]
+            # Adds the empty AI message placeholder
+            turn = self.engine.start_reply(st.session_state)
+            trace = self._trace()
+            trace.mark("admitted")
+            trace.event(
+                "stream.start",
+                queue_wait_ms=trace.elapsed_ms(),
+                prompt_chars=len(turn.prompt),
+                context_tokens=len(turn.context) if turn.context is not None else 0,
+            )
 
             # Initialize streaming state
             st.session_state.streaming_active = True
-            st.session_state.streaming_response = ""
             st.session_state.streaming_complete = False
-
-            # Add empty AI message placeholder
-            st.session_state.messages.append({"role": "ai", "content": ""})
+            st.session_state.stream_turn = turn
 
             # Get streaming chunks
-            self._prepare_streaming_chunks(user_message)
+            self._prepare_streaming_chunks(turn)
 
         except Exception as e:
+            self._trace().event(
+                "request.error", logging.ERROR, stage="start", error=repr(e)
+            )
             st.error(f"Streaming initialization error: {str(e)}")
             self._cleanup_streaming()
 
-    def _prepare_streaming_chunks(self, user_message):
+    def _prepare_streaming_chunks(self, turn):
         """
         Prepare streaming chunks from client.
         """
         try:
 
+            writer = self._begin_journal()
+            trace = self._trace()
+
             async def get_chunks():
-                chunks = []
-                async for chunk in self.client.generate(user_message):
-                    chunks.append(chunk)
-                return chunks
+                # Upstream events logged on the loop are correlated with this request
+                current_request.set(trace)
+                buffer = StreamBuffer()
+                async for event in self.engine.stream(turn):
+                    if not buffer.size:
+                        trace.event(
+                            "stream.first_token",
+                            ttft_ms=trace.elapsed_ms("admitted"),
+                        )
+                    buffer.append(event.text)
+                    trace.chunk(event.text)
+                    if writer is not None:
+                        writer.append(event.text)
+                trace.event(
+                    "stream.received",
+                    chunks=buffer.pending,
+                    chars=buffer.size,
+                    upstream_ms=trace.elapsed_ms("admitted"),
+                    done_reason=turn.done.get("done_reason"),
+                )
+                return buffer
 
-            # Use a local event loop with a try/finally to ensure it's closed
-            loop = asyncio.new_event_loop()
             try:
-                st.session_state.stream_chunks = loop.run_until_complete(get_chunks())
-                st.session_state.chunk_index = 0
+                st.session_state.stream_buffer = self._run_async(get_chunks())
+                if writer is not None:
+                    writer.complete()
             finally:
-                loop.close()
+                if writer is not None:
+                    writer.close()
+                # Chunks are buffered locally, so the upstream slot can be freed
+                self._release_slot()
 
             # Start streaming
             self._continue_streaming()
 
         except Exception as e:
+            self._trace().event(
+                "request.error", logging.ERROR, stage="upstream", error=repr(e)
+            )
             st.error(f"Chunk preparation error: {str(e)}")
             self._cleanup_streaming()
 
+    def _begin_journal(self):
+        """
+        Start checkpointing the reply for the current conversation, if journaling is enabled.
+        """
+        conversation_id = st.session_state.get("conversation_id")
+        if self.journal is None or conversation_id is None:
+            return None
+        return self.journal.begin(conversation_id)
+
+    def _recover_stalled_stream(self):
+        """
+        Unstick a session whose script thread died before chunks were prepared.
+        """
+        conversation_id = st.session_state.get("conversation_id")
+        if self.journal is not None and conversation_id is not None:
+            if self.journal.is_active(conversation_id):
+                # Another run is still receiving this reply
+                return
+            recovered = self.journal.recover(conversation_id)
+        else:
+            recovered = None
+
+        messages = st.session_state.messages
+        if messages and messages[-1]["role"] == "ai":
+            message = messages[-1]
+            text, complete = recovered if recovered is not None else ("", False)
+            message["content"] = text
+            if not complete:
+                message["interrupted"] = True
+            self.engine.persist(st.session_state, message)
+        self._cleanup_streaming()
+        st.rerun()
+
+    def _run_async(self, coro):
+        """
+        Run a coroutine on the shared background loop, or a local one if none is set.
+        """
+        if self.loop is not None:
+            return self.loop.run(coro)
+
+        # Use a local event loop with a try/finally to ensure it's closed
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            loop.close()
+
     def _continue_streaming(self):
         """
-        Continue streaming next chunk.
+        Continue streaming with the chunks due for this frame.
         """
         try:
-            if (
-                "stream_chunks" in st.session_state
-                and "chunk_index" in st.session_state
-            ):
-
-                chunks = st.session_state.stream_chunks
-                index = st.session_state.chunk_index
-
-                if index < len(chunks):
-                    # Add next chunk
-                    st.session_state.streaming_response += chunks[index]
-                    st.session_state.chunk_index += 1
-
-                    # Update AI message
-                    if (
-                        st.session_state.messages
-                        and st.session_state.messages[-1]["role"] == "ai"
-                    ):
-                        st.session_state.messages[-1][
-                            "content"
-                        ] = st.session_state.streaming_response
-
-                    # Schedule next update
-                    time.sleep(0.05)  # Small delay for visual streaming effect
-                    st.rerun()
-
-                else:
-                    # Streaming complete
-                    self._finish_streaming()
+            buffer = st.session_state.get("stream_buffer")
+            if buffer is None:
+                self._recover_stalled_stream()
+                return
+
+            if buffer.pending:
+                # Reveal every chunk due since the last frame, however long the rerun took
+                chunks = buffer.revealed + buffer.pending
+                buffer.reveal_due(max(REVEAL_RATE, chunks / MAX_REVEAL_SECONDS))
+
+                # Update AI message
+                if (
+                    st.session_state.messages
+                    and st.session_state.messages[-1]["role"] == "ai"
+                ):
+                    st.session_state.messages[-1]["content"] = buffer.text
+
+                # Schedule next update
+                time.sleep(
+                    self.frame_interval
+                )  # Small delay for visual streaming effect
+                st.rerun()
+
+            else:
+                # Streaming complete
+                self._finish_streaming()
         except Exception as e:
+            self._trace().event(
+                "request.error", logging.ERROR, stage="render", error=repr(e)
+            )
             st.error(f"Streaming error: {str(e)}")
             self._cleanup_streaming()
 
@@ -112,8 +503,15 @@ class ConversationService:
         Finish streaming and cleanup.
         """
         st.session_state.streaming_complete = True
+        turn = st.session_state.get("stream_turn")
+        message = self.engine.finish_reply(
+            st.session_state, turn.done if turn is not None else None
+        )
+        trace = self._trace()
+        if message is not None:
+            trace.bind(message_id=message.get("id"))
+        trace.event("request.finish", total_ms=trace.elapsed_ms())
         self._cleanup_streaming()
-        self.limit_messages()
         st.rerun()
 
     def _cleanup_streaming(self):
@@ -122,12 +520,21 @@ class ConversationService:
         """
         st.session_state.ai_thinking = False
         st.session_state.streaming_active = False
+        self._release_slot()
+        conversation_id = st.session_state.get("conversation_id")
+        if self.journal is not None and conversation_id is not None:
+            if not self.journal.is_active(conversation_id):
+                self.journal.discard(conversation_id)
+
+        buffer = st.session_state.get("stream_buffer")
+        if buffer is not None:
+            buffer.release()
 
         # Clean up streaming variables
         for key in [
-            "stream_chunks",
-            "chunk_index",
-            "streaming_response",
+            "stream_buffer",
+            "stream_turn",
+            "request_trace",
             "streaming_complete",
         ]:
             if key in st.session_state:
@@ -143,9 +550,10 @@ class ConversationService:
             and not st.session_state.get("ai_thinking", False)
         )
 
-    def limit_messages(self, max_messages=10):
+    def limit_messages(self, max_messages=None):
         """
         Limit the number of messages in session state.
+
+        Trimmed messages remain in the history store and can be lazy-loaded again.
         """
-        if len(st.session_state.messages) > max_messages:
-            st.session_state.messages = st.session_state.messages[-max_messages:]
+        self.engine.limit_messages(st.session_state, max_messages)
@@ -0,0 +1,282 @@
+from collections import OrderedDict
+
+CONTEXT_CACHE_SIZE = 8  # Upstream contexts kept per conversation
+
+
+class Node:
+    """
+    One message of a conversation tree.
+
+    A node only points to its parent, so every branch shares the nodes of
+    its common prefix. ``selected`` is the child on the most recently
+    visited path below it, and ``loaded`` is False for a branch whose
+    replies are still in the history store.
+    """
+
+    __slots__ = ("message", "parent", "children", "selected", "context", "loaded")
+
+    def __init__(self, message, parent, loaded=True):
+        self.message = message
+        self.parent = parent
+        self.children = []
+        self.selected = None
+        self.context = None
+        self.loaded = loaded
+
+
+class ConversationTree:
+    """
+    The branches of a conversation, sharing their common prefix.
+
+    Regenerating a reply or editing a message adds a sibling next to the
+    original instead of copying the history before it. The messages of the
+    current branch are exposed as a flat list (``path``), which is what the
+    rest of the app renders and builds prompts from; ``sync`` folds direct
+    changes to that list back into the tree.
+
+    Switching branches walks from the branch point down its last visited
+    path, so it costs O(depth). Upstream contexts are cached on the nodes
+    they end with, so sibling branches resume from their shared prefix
+    without prefilling it again.
+    """
+
+    def __init__(self, messages=(), max_contexts=CONTEXT_CACHE_SIZE):
+        self.root = Node(None, None)
+        self.leaf = self.root
+        self.max_contexts = max_contexts
+        self._nodes = {}
+        self._contexts = OrderedDict()
+        self.sync(messages)
+
+    def node(self, message):
+        """
+        Return the node holding a message, or None if it is not in the tree.
+        """
+        node = self._nodes.get(id(message))
+        if node is None or node.message is not message:
+            return None
+        return node
+
+    def path(self):
+        """
+        Return the messages from the root to the current leaf.
+        """
+        messages = []
+        node = self.leaf
+        while node is not self.root:
+            messages.append(node.message)
+            node = node.parent
+        messages.reverse()
+        return messages
+
+    def append(self, message, parent=None, loaded=True, select=True):
+        """
+        Add a message under ``parent`` (the current leaf by default).
+
+        Siblings are kept in message id order, so branches keep their
+        position when reloaded from the history store.
+        """
+        parent = self.leaf if parent is None else parent
+        node = Node(message, parent, loaded=loaded)
+        key = _order_key(message)
+        index = len(parent.children)
+        while index and _order_key(parent.children[index - 1].message) > key:
+            index -= 1
+        parent.children.insert(index, node)
+        self._nodes[id(message)] = node
+        if select:
+            parent.selected = node
+            self.leaf = node
+        return node
+
+    def sync(self, messages):
+        """
+        Make the current path follow ``messages``.
+
+        Messages missing from the tree are added where they diverge from it,
+        which is how a new branch is grown after ``rewind``. Messages before
+        the first known one become ancestors (an older page was loaded);
+        known ancestors missing from the list are dropped (the list was
+        trimmed).
+        """
+        start = next(
+            (i for i, message in enumerate(messages) if self.node(message)), None
+        )
+        if start is None:
+            if self.leaf is not self.root:
+                # A different conversation; a rewound one continues from the root
+                self._reset()
+            parent = self.root
+        else:
+            anchor = self.node(messages[start])
+            if start and anchor.parent is not self.root:
+                # Not a contiguous extension of what is loaded
+                self._reset()
+                start, parent = 0, self.root
+            else:
+                if start:
+                    self._prepend(messages[:start])
+                elif anchor.parent is not self.root:
+                    self._reroot(anchor)
+                parent = anchor
+                start += 1
+
+        for message in messages[start:]:
+            node = self.node(message)
+            if node is not None and node.parent is parent:
+                parent.selected = node
+                parent = node
+            else:
+                parent = self.append(message, parent)
+        self.leaf = parent
+
+    def rewind(self, node):
+        """
+        Make ``node`` the current leaf, so the next message starts a new branch there.
+
+        Returns:
+            The messages of the new current path.
+        """
+        self.leaf = node
+        return self.path()
+
+    def switch(self, message, offset):
+        """
+        Move to a sibling of ``message`` and down its last visited path.
+
+        Returns:
+            The sibling's node, or None if there is no sibling at that offset.
+        """
+        node = self.node(message)
+        if node is None:
+            return None
+        siblings = node.parent.children
+        index = siblings.index(node) + offset
+        if not 0 <= index < len(siblings):
+            return None
+        target = siblings[index]
+        node.parent.selected = target
+        leaf = target
+        while leaf.selected is not None:
+            leaf = leaf.selected
+        self.leaf = leaf
+        return target
+
+    def position(self, message):
+        """
+        Return the 1-based position of a message among its siblings and their count.
+        """
+        node = self.node(message)
+        if node is None:
+            return 1, 1
+        siblings = node.parent.children
+        return siblings.index(node) + 1, len(siblings)
+
+    def remove(self, message):
+        """
+        Drop a message and the branch below it.
+        """
+        node = self.node(message)
+        if node is None:
+            return
+        parent = node.parent
+        parent.children.remove(node)
+        if parent.selected is node:
+            parent.selected = parent.children[-1] if parent.children else None
+        leaf = self.leaf
+        while leaf is not None and leaf is not node:
+            leaf = leaf.parent
+        if leaf is node:
+            self.leaf = parent
+        self._forget(node)
+
+    def context(self, message):
+        """
+        Return the upstream context cached for the path ending at a message.
+        """
+        node = self.node(message)
+        if node is None or node.context is None:
+            return None
+        self._contexts.move_to_end(id(message))
+        return node.context
+
+    def remember_context(self, message, context):
+        """
+        Cache the upstream context of the path ending at a message.
+
+        Only the most recently used ``max_contexts`` contexts are kept.
+        """
+        node = self.node(message)
+        if node is None:
+            return
+        node.context = context
+        self._contexts[id(message)] = node
+        self._contexts.move_to_end(id(message))
+        while len(self._contexts) > self.max_contexts:
+            _, evicted = self._contexts.popitem(last=False)
+            evicted.context = None
+
+    def clear_contexts(self):
+        for node in self._contexts.values():
+            node.context = None
+        self._contexts.clear()
+
+    def context_bytes(self):
+        return sum(
+            len(node.context) * node.context.itemsize
+            for node in self._contexts.values()
+        )
+
+    def nodes(self, node=None):
+        """
+        Yield every node below ``node`` (the root by default).
+        """
+        stack = list((node or self.root).children)
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children)
+
+    def _prepend(self, messages):
+        """
+        Insert older messages between the root and its children, which they precede.
+        """
+        children, selected = self.root.children, self.root.selected
+        self.root.children, self.root.selected = [], None
+        parent = self.root
+        for message in messages:
+            parent = self.append(message, parent)
+        parent.children, parent.selected = children, selected
+        for child in children:
+            child.parent = parent
+
+    def _reroot(self, node):
+        """
+        Drop everything above ``node``, keeping its siblings and their branches.
+        """
+        kept = node.parent.children
+        below = {id(n) for child in kept for n in (child, *self.nodes(child))}
+        for other in list(self.nodes()):
+            if id(other) not in below:
+                self._nodes.pop(id(other.message), None)
+                self._contexts.pop(id(other.message), None)
+        self.root.children = kept
+        self.root.selected = node
+        for child in kept:
+            child.parent = self.root
+
+    def _forget(self, node):
+        for removed in [node, *self.nodes(node)]:
+            self._nodes.pop(id(removed.message), None)
+            self._contexts.pop(id(removed.message), None)
+
+    def _reset(self):
+        self.root = Node(None, None)
+        self.leaf = self.root
+        self._nodes.clear()
+        self._contexts.clear()
+
+
+def _order_key(message):
+    message_id = message.get("id")
+    return (message_id is None, message_id or 0)
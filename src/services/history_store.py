@@ -0,0 +1,668 @@
+import atexit
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    parent_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation
+    ON messages (conversation_id, id);
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user
+    ON conversations (user_id, updated_at);
+CREATE TABLE IF NOT EXISTS summaries (
+    conversation_id TEXT PRIMARY KEY,
+    through_id INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+"""
+
+# Message ids are handed out by the database, so processes sharing the file
+# never assign the same id; the floor covers stores written before this table
+INIT_MESSAGE_IDS = """
+INSERT OR IGNORE INTO sequences (name, next_id) VALUES ('messages', 1);
+UPDATE sequences
+SET next_id = MAX(next_id, (SELECT IFNULL(MAX(id), 0) + 1 FROM messages))
+WHERE name = 'messages';
+"""
+ID_BLOCK_SIZE = 256  # Message ids claimed from the database at a time
+CLAIM_IDS = "UPDATE sequences SET next_id = next_id + ? WHERE name = 'messages'"
+NEXT_ID = "SELECT next_id FROM sequences WHERE name = 'messages'"
+RETURN_IDS = "UPDATE sequences SET next_id = ? WHERE name = 'messages' AND next_id = ?"
+
+INSERT_MESSAGE = (
+    "INSERT INTO messages (id, conversation_id, role, content, created_at, parent_id) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+APPEND_MESSAGE = (
+    "INSERT INTO messages (id, conversation_id, role, content, created_at, parent_id) "
+    "VALUES (?, ?, ?, ?, ?, "
+    "(SELECT MAX(id) FROM messages WHERE conversation_id = ?))"
+)
+DELETE_MESSAGE = "DELETE FROM messages WHERE id = ?"
+DELETE_SUMMARY = "DELETE FROM summaries WHERE conversation_id = ?"
+
+# Messages form a tree: each one points to the message it follows (NULL for
+# the first of a conversation), so regenerated and edited turns are siblings
+PARENT_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_messages_parent
+    ON messages (conversation_id, parent_id);
+"""
+# Stores created before branching hold linear conversations
+BACKFILL_PARENTS = """
+UPDATE messages SET parent_id = (
+    SELECT MAX(p.id) FROM messages p
+    WHERE p.conversation_id = messages.conversation_id AND p.id < messages.id
+)
+"""
+# Walks up from a message to at most ``limit`` messages, O(depth)
+LOAD_PATH = """
+WITH RECURSIVE path(id, role, content, parent_id, depth) AS (
+    SELECT id, role, content, parent_id, 1 FROM messages WHERE id = ?
+    UNION ALL
+    SELECT m.id, m.role, m.content, m.parent_id, path.depth + 1
+    FROM messages m JOIN path ON m.id = path.parent_id
+    WHERE path.depth < ?
+)
+SELECT id, role, content, parent_id FROM path ORDER BY id
+"""
+# Walks down from a message, following its most recent reply at each step
+LOAD_BRANCH = """
+WITH RECURSIVE branch(id, role, content, parent_id) AS (
+    SELECT id, role, content, parent_id FROM messages WHERE id = ?
+    UNION ALL
+    SELECT m.id, m.role, m.content, m.parent_id FROM branch JOIN messages m
+    ON m.id = (
+        SELECT MAX(c.id) FROM messages c
+        WHERE c.conversation_id = ? AND c.parent_id = branch.id
+    )
+)
+SELECT id, role, content, parent_id FROM branch ORDER BY id
+"""
+IS_ANCESTOR = """
+WITH RECURSIVE up(id, parent_id) AS (
+    SELECT id, parent_id FROM messages WHERE id = ?
+    UNION ALL
+    SELECT m.id, m.parent_id FROM messages m JOIN up ON m.id = up.parent_id
+    WHERE up.id > ?
+)
+SELECT 1 FROM up WHERE id = ?
+"""
+SAVE_SUMMARY = (
+    "INSERT INTO summaries (conversation_id, through_id, text) VALUES (?, ?, ?) "
+    "ON CONFLICT (conversation_id) DO UPDATE "
+    "SET through_id = excluded.through_id, text = excluded.text"
+)
+TOUCH_CONVERSATION = (
+    "INSERT INTO conversations (id, user_id, title, updated_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at"
+)
+
+# The trigram tokenizer also matches languages written without spaces
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5(
+    content, content='messages', content_rowid='id', tokenize='{tokenizer}'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content)
+        VALUES ('delete', old.id, old.content);
+END;
+INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+"""
+SEARCH_TOKENIZERS = ["trigram", "unicode61"]
+# Trigrams cannot match shorter terms ("AI", "東京"), which fall back to LIKE
+TRIGRAM_LENGTH = 3
+SNIPPET_CHARS = 40  # Context kept on each side of a match in LIKE snippets
+
+# Control characters that cannot occur in escaped HTML mark snippet matches
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+_STOP = object()
+_FLUSH = object()  # Makes the writer commit its batch without waiting
+_LATEST = object()
+
+
+class HistoryStore:
+    """
+    SQLite-backed conversation history.
+
+    Finished messages are assigned an id immediately and written behind by a
+    background thread in batches, so appends on the render path never wait
+    for the write itself. A read while writes are queued, or an explicit
+    flush, makes the writer commit its batch at once and waits only for
+    that commit. Ids come from the database, so several processes
+    can share one store. Each message records the one it follows, so a conversation is
+    a tree; reads page backwards along one branch of it.
+    Messages are indexed for full-text search by a trigger on insert, so the
+    index is maintained incrementally as the writer commits each batch.
+    """
+
+    def __init__(self, path, batch_size=64, flush_interval=0.2):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            self.search_enabled = self._create_search_index(conn)
+            self._trigram_search = self.search_enabled and self._uses_trigrams(conn)
+            conn.executescript(INIT_MESSAGE_IDS)
+        finally:
+            conn.close()
+
+        self._local = threading.local()
+        self._id_lock = threading.Lock()
+        self._next_id = self._id_limit = 0
+        self._pending = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._write_loop, name="history-store-writer", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def append(self, conversation_id, role, content, parent_id=_LATEST):
+        """
+        Queue a finished message for persistence.
+
+        Args:
+            parent_id: The message this one follows, None to start a new
+                root. Defaults to the conversation's latest message.
+
+        Returns:
+            The id assigned to the message.
+        """
+        message_id = self.reserve_ids()
+        row = (message_id, conversation_id, role, content, time.time())
+        if parent_id is _LATEST:
+            # Resolved by the writer, after every earlier queued message
+            self._pending.put((APPEND_MESSAGE, (*row, conversation_id)))
+        else:
+            self._pending.put((INSERT_MESSAGE, (*row, parent_id)))
+        return message_id
+
+    def reserve_ids(self, count=1):
+        """
+        Reserve consecutive message ids, returning the first.
+
+        Ids are handed out from a block claimed in a small transaction of
+        its own, so most calls do not touch the database and the ids stay
+        unique across every process using the same file.
+        """
+        with self._id_lock:
+            if self._next_id + count > self._id_limit:
+                claimed = max(count, ID_BLOCK_SIZE)
+                conn = self._reader()
+                with conn:
+                    conn.execute(CLAIM_IDS, (claimed,))
+                    self._id_limit = conn.execute(NEXT_ID).fetchone()[0]
+                self._next_id = self._id_limit - claimed
+            first = self._next_id
+            self._next_id += count
+            return first
+
+    def delete_message(self, message_id):
+        """
+        Queue the removal of a message, e.g. a reply that is being regenerated.
+        """
+        self._pending.put((DELETE_MESSAGE, (message_id,)))
+
+    def touch_conversation(self, conversation_id, user_id, title):
+        """
+        Queue a conversation's creation or last-activity update.
+
+        The title is only recorded when the conversation is first created.
+        """
+        self._pending.put(
+            (TOUCH_CONVERSATION, (conversation_id, user_id, title, time.time()))
+        )
+
+    def save_summary(self, conversation_id, through_id, text):
+        """
+        Queue the rolling summary of a conversation for persistence.
+        """
+        self._pending.put((SAVE_SUMMARY, (conversation_id, through_id, text)))
+
+    def delete_summary(self, conversation_id):
+        """
+        Queue the removal of a conversation's summary.
+        """
+        self._pending.put((DELETE_SUMMARY, (conversation_id,)))
+
+    def load_summary(self, conversation_id):
+        """
+        Return the stored summary of a conversation, or None.
+        """
+        self._wait_for_pending()
+        row = (
+            self._reader()
+            .execute(
+                "SELECT through_id, text FROM summaries WHERE conversation_id = ?",
+                (conversation_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return {"through_id": row[0], "text": row[1]}
+
+    def list_conversations(self, user_id, limit=50):
+        """
+        Return a user's conversations, most recently active first.
+        """
+        self._wait_for_pending()
+        rows = self._reader().execute(
+            "SELECT id, title, updated_at FROM conversations WHERE user_id = ? "
+            "ORDER BY updated_at DESC LIMIT ?",
+            (user_id, limit),
+        )
+        return [
+            {"id": row[0], "title": row[1], "updated_at": row[2]}
+            for row in rows.fetchall()
+        ]
+
+    def load_page(self, conversation_id, before_id=None, limit=20):
+        """
+        Load up to ``limit`` messages of a branch in chronological order.
+
+        Without ``before_id`` the page ends with the conversation's latest
+        message, i.e. on the branch that was last replied on; otherwise it
+        ends with the message ``before_id`` follows.
+        """
+        self._wait_for_pending()
+        reader = self._reader()
+        if before_id is None:
+            row = reader.execute(
+                "SELECT MAX(id) FROM messages WHERE conversation_id = ?",
+                (conversation_id,),
+            ).fetchone()
+        else:
+            row = reader.execute(
+                "SELECT parent_id FROM messages WHERE id = ?", (before_id,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return []
+        return [_message_row(row) for row in reader.execute(LOAD_PATH, (row[0], limit))]
+
+    def has_older(self, conversation_id, before_id):
+        """
+        Return True if the message ``before_id`` follows another one.
+        """
+        if before_id is None:
+            return False
+        self._wait_for_pending()
+        row = (
+            self._reader()
+            .execute(
+                "SELECT parent_id FROM messages WHERE id = ? AND conversation_id = ?",
+                (before_id, conversation_id),
+            )
+            .fetchone()
+        )
+        return row is not None and row[0] is not None
+
+    def load_siblings(self, conversation_id, message_ids):
+        """
+        Return the other replies to the messages that the given ones follow.
+
+        These are the alternative branches next to a loaded page, without
+        anything below them.
+        """
+        if not message_ids:
+            return []
+        self._wait_for_pending()
+        placeholders = ",".join("?" * len(message_ids))
+        rows = self._reader().execute(
+            "SELECT s.id, s.role, s.content, s.parent_id FROM messages m "
+            "JOIN messages s ON s.conversation_id = m.conversation_id "
+            "AND s.parent_id IS m.parent_id AND s.id != m.id "
+            f"WHERE m.conversation_id = ? AND m.id IN ({placeholders}) "
+            "ORDER BY s.id",
+            (conversation_id, *message_ids),
+        )
+        return [_message_row(row) for row in rows]
+
+    def load_branch(self, conversation_id, message_id):
+        """
+        Load a message and the messages below it, following the latest reply.
+        """
+        self._wait_for_pending()
+        rows = self._reader().execute(LOAD_BRANCH, (message_id, conversation_id))
+        return [_message_row(row) for row in rows]
+
+    def is_ancestor(self, ancestor_id, message_id):
+        """
+        Return True if ``message_id`` is on a branch below ``ancestor_id``.
+        """
+        self._wait_for_pending()
+        row = (
+            self._reader()
+            .execute(IS_ANCESTOR, (message_id, ancestor_id, ancestor_id))
+            .fetchone()
+        )
+        return row is not None
+
+    def search(self, user_id, query, limit=20):
+        """
+        Search a user's messages, best matches first.
+
+        Returns:
+            Result dicts with a ``snippet`` whose matches are wrapped in
+            ``HIGHLIGHT_START`` and ``HIGHLIGHT_END``.
+        """
+        terms = query.split()
+        if not self.search_enabled or not terms:
+            return []
+        indexed, short = terms, []
+        if self._trigram_search:
+            indexed = [term for term in terms if len(term) >= TRIGRAM_LENGTH]
+            short = [term for term in terms if len(term) < TRIGRAM_LENGTH]
+        # Short terms filter the indexed matches, or are scanned for on their own
+        like = " AND m.content LIKE ? ESCAPE '\\'" * len(short)
+        patterns = [f"%{_escape_like(term)}%" for term in short]
+
+        self._wait_for_pending()
+        try:
+            if indexed:
+                match = " ".join(
+                    '"' + term.replace('"', '""') + '"' for term in indexed
+                )
+                rows = self._reader().execute(
+                    "SELECT m.id, m.conversation_id, m.role, c.title, "
+                    "snippet(messages_fts, 0, ?, ?, '…', 16) "
+                    "FROM messages_fts "
+                    "JOIN messages m ON m.id = messages_fts.rowid "
+                    "JOIN conversations c ON c.id = m.conversation_id "
+                    f"WHERE messages_fts MATCH ? AND c.user_id = ?{like} "
+                    "ORDER BY rank LIMIT ?",
+                    (HIGHLIGHT_START, HIGHLIGHT_END, match, user_id, *patterns, limit),
+                )
+                results = rows.fetchall()
+            else:
+                rows = self._reader().execute(
+                    "SELECT m.id, m.conversation_id, m.role, c.title, m.content "
+                    "FROM messages m "
+                    "JOIN conversations c ON c.id = m.conversation_id "
+                    f"WHERE c.user_id = ?{like} ORDER BY m.id DESC LIMIT ?",
+                    (user_id, *patterns, limit),
+                )
+                results = [(*row[:4], _snippet(row[4], short)) for row in rows]
+        except sqlite3.OperationalError:
+            logger.exception("Full-text search failed for query %r", query)
+            return []
+        return [
+            {
+                "id": row[0],
+                "conversation_id": row[1],
+                "role": row[2],
+                "title": row[3],
+                "snippet": row[4],
+            }
+            for row in results
+        ]
+
+    def has_conversation(self, conversation_id):
+        """
+        Return True if the conversation exists in the store.
+        """
+        self._wait_for_pending()
+        row = (
+            self._reader()
+            .execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    def iter_conversations(self, user_id=None, batch_size=500):
+        """
+        Yield conversations by id, optionally only a user's, a page at a time.
+
+        Pages are fetched by keyset rather than offset, so iterating a store
+        of any size holds one page in memory and each page is an index seek.
+        """
+        self._wait_for_pending()
+        last_id = ""
+        while True:
+            if user_id is None:
+                rows = self._reader().execute(
+                    "SELECT id, user_id, title, updated_at FROM conversations "
+                    "WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                )
+            else:
+                rows = self._reader().execute(
+                    "SELECT id, user_id, title, updated_at FROM conversations "
+                    "WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (user_id, last_id, batch_size),
+                )
+            page = rows.fetchall()
+            for row in page:
+                yield {
+                    "id": row[0],
+                    "user_id": row[1],
+                    "title": row[2],
+                    "updated_at": row[3],
+                }
+            if len(page) < batch_size:
+                return
+            last_id = page[-1][0]
+
+    def iter_messages(self, conversation_id, batch_size=1000):
+        """
+        Yield a conversation's messages in chronological order, a page at a time.
+        """
+        self._wait_for_pending()
+        last_id = 0
+        while True:
+            rows = self._reader().execute(
+                "SELECT id, role, content, created_at, parent_id FROM messages "
+                "WHERE conversation_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (conversation_id, last_id, batch_size),
+            )
+            page = rows.fetchall()
+            for row in page:
+                yield {
+                    "id": row[0],
+                    "role": row[1],
+                    "content": row[2],
+                    "created_at": row[3],
+                    "parent_id": row[4],
+                }
+            if len(page) < batch_size:
+                return
+            last_id = page[-1][0]
+
+    def import_batch(self, conversations, messages):
+        """
+        Write a batch of archived conversations and messages in one transaction.
+
+        Bypasses the write-behind queue, so a bulk import is bounded by the
+        batch rather than by how far the writer thread lags behind. Existing
+        conversations are kept.
+
+        Args:
+            conversations: ``(id, user_id, title, updated_at)`` tuples.
+            messages: ``(id, conversation_id, role, content, created_at,
+                parent_id)`` tuples, with ids from ``reserve_ids``.
+        """
+        self._wait_for_pending()
+        conn = self._reader()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO conversations (id, user_id, title, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                conversations,
+            )
+            conn.executemany(INSERT_MESSAGE, messages)
+
+    def flush(self):
+        """
+        Block until every queued message has been written.
+
+        The writer commits straight away instead of waiting out its batch
+        interval.
+        """
+        if not self._closed:
+            self._pending.put(_FLUSH)
+        self._pending.join()
+
+    def close(self):
+        """
+        Flush outstanding writes and stop the writer thread.
+
+        Unused ids of the current block are given back unless another
+        process has claimed ids since.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._pending.put(_STOP)
+        self._writer.join()
+        with self._id_lock:
+            if self._next_id < self._id_limit:
+                conn = self._reader()
+                with conn:
+                    conn.execute(RETURN_IDS, (self._next_id, self._id_limit))
+                self._next_id = self._id_limit
+
+    def _wait_for_pending(self):
+        """
+        Make queued writes visible before reading; a no-op when nothing is queued.
+        """
+        if self._pending.unfinished_tasks:
+            self.flush()
+
+    def _migrate(self, conn):
+        """
+        Add parent links to a store created before conversations could branch.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+        if "parent_id" not in columns:
+            with conn:
+                conn.execute("ALTER TABLE messages ADD COLUMN parent_id INTEGER")
+                conn.execute(BACKFILL_PARENTS)
+        conn.executescript(PARENT_SCHEMA)
+
+    def _create_search_index(self, conn):
+        """
+        Create the FTS5 index if needed, returning False when FTS5 is unavailable.
+        """
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        for tokenizer in SEARCH_TOKENIZERS:
+            try:
+                with conn:
+                    conn.executescript(SEARCH_SCHEMA.format(tokenizer=tokenizer))
+                return True
+            except sqlite3.OperationalError:
+                continue
+        logger.warning("SQLite FTS5 is unavailable; history search is disabled")
+        return False
+
+    def _uses_trigrams(self, conn):
+        row = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone()
+        return row is not None and "trigram" in row[0]
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _write_loop(self):
+        conn = self._connect()
+        running = True
+        while running:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] not in (_STOP, _FLUSH):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is _STOP:
+                running = False
+            rows = [item for item in batch if item not in (_STOP, _FLUSH)]
+            try:
+                if rows:
+                    with conn:
+                        self._write_batch(conn, rows)
+            except sqlite3.Error:
+                logger.exception("Failed to persist %d history writes", len(rows))
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+        conn.close()
+
+    def _write_batch(self, conn, rows):
+        for statement, params in rows:
+            conn.execute(statement, params)
+
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _snippet(content, terms):
+    """
+    Cut a highlighted snippet around the first match, like FTS5's snippet().
+    """
+    pattern = re.compile("|".join(map(re.escape, terms)), re.IGNORECASE)
+    first = pattern.search(content)
+    start = max(first.start() - SNIPPET_CHARS, 0) if first else 0
+    end = min((first.end() if first else 0) + SNIPPET_CHARS, len(content))
+    text = pattern.sub(
+        lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_END}", content[start:end]
+    )
+    return ("…" if start else "") + text + ("…" if end < len(content) else "")
+
+
+def _message_row(row):
+    return {"id": row[0], "role": row[1], "content": row[2], "parent_id": row[3]}
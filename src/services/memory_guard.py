@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+import weakref
+
+from .cold_storage import CompressedText
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD = 240  # Approximate bytes of a message dict besides its text
+KEEP_MESSAGES = 2  # Messages left in memory when a session is trimmed
+
+
+def message_size(message):
+    """
+    Approximate the memory held by one message.
+    """
+    content = message.get("content")
+    if isinstance(content, CompressedText):
+        return MESSAGE_OVERHEAD + len(content.data)
+    return MESSAGE_OVERHEAD + len(content or "")
+
+
+def messages_size(messages):
+    return sum(message_size(message) for message in messages)
+
+
+class MemoryGuard:
+    """
+    Process-wide accounting of approximate memory held per session.
+
+    Each session reports its size once per script run. When the process
+    total crosses ``high_water`` bytes, the idlest sessions are shed first
+    until the total falls below ``low_water_ratio`` of the limit: parked
+    conversations are spilled to disk, and the session is asked to trim its
+    visible history to the last ``keep_messages`` messages, which stay in the
+    history store for lazy loading.
+
+    Sessions may be rendering or streaming on other threads, so the guard
+    never touches their history itself: each session applies a requested
+    trim on its own next run, and the bytes only leave the total once it
+    reports its trimmed size. Until then they count as pending, so further
+    reports do not shed more sessions for memory that is already on its
+    way out. Spilling happens outside the guard's lock, as it writes to
+    disk. Sessions are only held by weak reference.
+    """
+
+    def __init__(self, high_water, low_water_ratio=0.8, keep_messages=KEEP_MESSAGES):
+        self.high_water = high_water
+        self.low_water = int(high_water * low_water_ratio)
+        self.keep_messages = keep_messages
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._ended = []
+        self._total = 0
+        self._sheds = 0
+
+    def update(self, session_id, owner, messages, pinned=0):
+        """
+        Record a session's current size and enforce the high-water mark.
+
+        ``owner`` is the session's ConversationService and ``messages`` its
+        visible history; ``pinned`` counts bytes that cannot be shed, such as
+        a reply that is still streaming. The entry is dropped once the owner
+        is garbage collected, i.e. when the session ends.
+        """
+        kept = messages_size(messages[-self.keep_messages :])
+        trimmable = messages_size(messages[: -self.keep_messages])
+        cached = owner.cache.memory_size() if owner.cache is not None else 0
+        nbytes = kept + trimmable + cached + pinned
+
+        with self._lock:
+            self._drop_ended()
+            account = self._sessions.get(session_id)
+            if account is None or account["owner"]() is not owner:
+                ended = self._ended
+                account = {
+                    "owner": weakref.ref(owner, lambda _: ended.append(session_id)),
+                    "bytes": 0,
+                    "trim_requested": False,
+                    "spilling": 0,
+                }
+                self._sessions[session_id] = account
+            self._total += nbytes - account["bytes"]
+            account.update(
+                bytes=nbytes,
+                trimmable=trimmable,
+                cached=cached,
+                last_seen=time.monotonic(),
+            )
+            spills = []
+            if self._total - self._pending() > self.high_water:
+                spills = self._shed(session_id)
+
+        for victim_id, victim, owner in spills:
+            self._spill(victim_id, victim, owner)
+
+    def consume_trim_request(self, session_id):
+        """
+        Return whether a session should trim its history, clearing the request.
+
+        The session keeps its last ``keep_messages`` messages and reports
+        its new size afterwards.
+        """
+        with self._lock:
+            account = self._sessions.get(session_id)
+            if account is None or not account["trim_requested"]:
+                return False
+            account["trim_requested"] = False
+            return True
+
+    def forget(self, session_id):
+        with self._lock:
+            self._drop_ended()
+            account = self._sessions.pop(session_id, None)
+            if account is not None:
+                self._total -= account["bytes"]
+
+    def session_bytes(self, session_id):
+        with self._lock:
+            account = self._sessions.get(session_id)
+            return account["bytes"] if account is not None else 0
+
+    def top(self, n=5):
+        """
+        Return the ``n`` heaviest sessions as (session_id, bytes) pairs.
+        """
+        with self._lock:
+            self._drop_ended()
+            return self._top(n)
+
+    def stats(self):
+        with self._lock:
+            self._drop_ended()
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self._total,
+                "high_water_bytes": self.high_water,
+                "sheds": self._sheds,
+            }
+
+    def _shed(self, current_id):
+        """
+        Pick memory to free, idlest sessions first and the reporting one last.
+
+        Trims are requested and counted as pending until the session reports
+        again. Returns the (session_id, account, owner) triples whose caches
+        the caller spills once the lock is released.
+        """
+        logger.warning(
+            "Session memory %d bytes exceeds %d; heaviest sessions: %s",
+            self._total,
+            self.high_water,
+            self._top(5),
+        )
+        projected = self._total - self._pending()
+        victims = sorted(
+            self._sessions.items(),
+            key=lambda item: (item[0] == current_id, item[1]["last_seen"]),
+        )
+        spills = []
+        for session_id, account in victims:
+            if projected <= self.low_water:
+                break
+            owner = account["owner"]()
+            if owner is None:
+                continue
+            freed = 0
+            if account["cached"] and not account["spilling"]:
+                account["spilling"] = account["cached"]
+                freed += account["cached"]
+                spills.append((session_id, account, owner))
+            if account["trimmable"] and not account["trim_requested"]:
+                account["trim_requested"] = True
+                freed += account["trimmable"]
+            if freed:
+                projected -= freed
+                self._sheds += 1
+        return spills
+
+    def _spill(self, session_id, account, owner):
+        """
+        Spill a session's parked conversations and count them as freed.
+        """
+        # The cache is locked, so it can be spilled from this thread
+        owner.cache.spill_all()
+        with self._lock:
+            # A report in the meantime may already have measured the spill
+            freed = min(account["spilling"], account["cached"])
+            account["spilling"] = 0
+            account.update(
+                bytes=account["bytes"] - freed, cached=account["cached"] - freed
+            )
+            if self._sessions.get(session_id) is account:
+                self._total -= freed
+
+    def _pending(self):
+        """
+        Bytes that sessions have been asked to free but not yet reported.
+        """
+        return sum(
+            account["spilling"]
+            + (account["trimmable"] if account["trim_requested"] else 0)
+            for account in self._sessions.values()
+        )
+
+    def _top(self, n):
+        sizes = [(sid, account["bytes"]) for sid, account in self._sessions.items()]
+        return sorted(sizes, key=lambda item: item[1], reverse=True)[:n]
+
+    def _drop_ended(self):
+        """
+        Forget sessions whose owners were garbage collected.
+
+        The weakref callbacks only record the id, since they may fire while
+        the lock is held.
+        """
+        while self._ended:
+            session_id = self._ended.pop()
+            account = self._sessions.get(session_id)
+            if account is not None and account["owner"]() is None:
+                del self._sessions[session_id]
+                self._total -= account["bytes"]
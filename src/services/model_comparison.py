@@ -0,0 +1,139 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .admission import QUEUE_POLL_INTERVAL
+
+
+@dataclass
+class ModelRun:
+    """
+    Progress and timings of one model's answer in a comparison.
+
+    Streamed chunks are counted as tokens, which matches Ollama-style
+    backends that emit one token per streamed event.
+    """
+
+    model: str
+    chunks: list = field(default_factory=list)
+    started_at: float = 0.0
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    @property
+    def ttft_ms(self):
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.started_at) * 1000
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or len(self.chunks) < 2:
+            return None
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.first_token_at
+        if elapsed <= 0:
+            return None
+        # The first token is accounted for by TTFT
+        return (len(self.chunks) - 1) / elapsed
+
+
+class ModelComparison:
+    """
+    Sends one prompt to several models and consumes all streams concurrently.
+    """
+
+    def __init__(self, client, admission=None, session_id=None):
+        self.client = client
+        self.admission = admission
+        self.session_id = session_id
+
+    def run(self, prompt, models, on_update=None, on_queued=None):
+        """
+        Run a comparison to completion on a local event loop.
+
+        Args:
+            prompt: The prompt sent to every model.
+            models: The model names to compare.
+            on_update: Called with a ModelRun whenever it receives a chunk or ends.
+            on_queued: Called with the queue position while waiting for admission.
+
+        Returns:
+            A list of ModelRun, in the order of ``models``.
+
+        Raises:
+            AdmissionRejected: If the comparison is shed by admission control.
+        """
+        ticket = self._wait_for_slot(len(models), on_queued)
+        # Admission caps the weight, so stream no more models than slots held
+        concurrency = ticket.weight if ticket is not None else None
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(
+                self.stream_all(prompt, models, on_update, concurrency)
+            )
+        finally:
+            loop.close()
+            if ticket is not None:
+                self.admission.release(ticket)
+
+    async def stream_all(self, prompt, models, on_update=None, concurrency=None):
+        """
+        Consume every model's stream concurrently on the running event loop.
+
+        At most ``concurrency`` streams are open at once; the rest start, in
+        order, as earlier ones finish. None streams every model at once.
+        """
+        runs = [ModelRun(model=model) for model in models]
+        limit = asyncio.Semaphore(concurrency or len(runs) or 1)
+        await asyncio.gather(
+            *(self._stream_one(prompt, run, on_update, limit) for run in runs)
+        )
+        return runs
+
+    async def _stream_one(self, prompt, run, on_update, limit):
+        async with limit:
+            await self._consume(prompt, run, on_update)
+
+    async def _consume(self, prompt, run, on_update):
+        run.started_at = time.perf_counter()
+        try:
+            async for chunk in self.client.generate(prompt, run.model):
+                if run.first_token_at is None:
+                    run.first_token_at = time.perf_counter()
+                run.chunks.append(chunk)
+                if on_update is not None:
+                    on_update(run)
+        except Exception as e:
+            run.error = str(e)
+        finally:
+            run.finished_at = time.perf_counter()
+            if on_update is not None:
+                on_update(run)
+
+    def _wait_for_slot(self, slots, on_queued):
+        """
+        Block until admitted with one slot per model streamed concurrently.
+        """
+        if self.admission is None:
+            return None
+        ticket = self.admission.enqueue(self.session_id, weight=slots)
+        try:
+            while not self.admission.try_admit(ticket):
+                if on_queued is not None:
+                    on_queued(self.admission.position(ticket))
+                time.sleep(QUEUE_POLL_INTERVAL)
+        except BaseException:
+            self.admission.release(ticket)
+            raise
+        return ticket
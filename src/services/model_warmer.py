@@ -0,0 +1,55 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmer:
+    """
+    Preloads models when the app starts and keeps them loaded.
+
+    Every configured model is warmed once at startup, then its keep-alive is
+    refreshed on a fixed schedule so idle periods never unload it. Runs on the
+    shared background loop, where it can also open pooled connections early.
+    """
+
+    def __init__(
+        self, client, models, loop, refresh_interval=240.0, prewarm_connections=0
+    ):
+        self.client = client
+        self.models = list(dict.fromkeys(models))
+        self.loop = loop
+        self.refresh_interval = refresh_interval
+        self.prewarm_connections = prewarm_connections
+        self._future = None
+
+    def start(self):
+        if self._future is None:
+            self._future = self.loop.submit(self._run())
+        return self._future
+
+    def stop(self):
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def statuses(self):
+        """
+        Return the warm/cold status of each configured model.
+        """
+        return {model: self.client.model_status(model) for model in self.models}
+
+    async def _run(self):
+        if self.prewarm_connections:
+            await self.client.prewarm_connections(self.prewarm_connections)
+        while True:
+            results = await asyncio.gather(
+                *(self.client.warm_up(model) for model in self.models),
+                return_exceptions=True,
+            )
+            for model, result in zip(self.models, results):
+                if isinstance(result, Exception):
+                    logger.error("Warm-up of model %s failed: %s", model, result)
+            if not self.refresh_interval:
+                return
+            await asyncio.sleep(self.refresh_interval)
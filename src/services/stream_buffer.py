@@ -0,0 +1,76 @@
+import time
+from collections import deque
+
+
+class StreamBuffer:
+    """
+    Accumulates a streamed reply without repeated string concatenation.
+
+    Received chunks are appended in amortized O(1) and revealed as frames
+    are painted, paced by time so that each frame shows every chunk that
+    has come due since the last one. The visible text is extended once per
+    reveal and cached for reads, so a reply painted over N frames is copied
+    N times rather than once per chunk.
+    """
+
+    def __init__(self, chunks=()):
+        self._pending = deque(chunks)
+        self._text = ""
+        self.size = sum(len(chunk) for chunk in self._pending)
+        self.revealed = 0
+        self._reveal_started = None
+
+    def append(self, chunk):
+        self._pending.append(chunk)
+        self.size += len(chunk)
+
+    @property
+    def pending(self):
+        """
+        Number of received chunks that are not visible yet.
+        """
+        return len(self._pending)
+
+    def reveal(self, count=1):
+        """
+        Make up to ``count`` pending chunks visible.
+
+        Returns:
+            The number of chunks revealed.
+        """
+        count = min(count, len(self._pending))
+        if count:
+            chunks = [self._pending.popleft() for _ in range(count)]
+            self._text = "".join([self._text, *chunks])
+            self.revealed += count
+        return count
+
+    def reveal_due(self, rate, now=None):
+        """
+        Reveal every chunk due at ``rate`` chunks per second, at least one.
+
+        The clock starts on the first call, which reveals one chunk.
+
+        Returns:
+            The number of chunks revealed.
+        """
+        now = time.monotonic() if now is None else now
+        if self._reveal_started is None:
+            self._reveal_started = now
+        due = int((now - self._reveal_started) * rate) + 1 - self.revealed
+        return self.reveal(max(due, 1))
+
+    @property
+    def text(self):
+        """
+        The visible text.
+        """
+        return self._text
+
+    def release(self):
+        """
+        Drop all buffered chunks once the reply has been committed.
+        """
+        self._pending.clear()
+        self._text = ""
+        self.size = 0
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JournalWriter:
+    """
+    Appends the chunks of one in-flight reply to its journal file.
+
+    Chunks are buffered and written as a single record every
+    ``checkpoint_chunks`` chunks or ``checkpoint_interval`` seconds, whichever
+    comes first, so journaling costs one small write per checkpoint.
+    """
+
+    def __init__(self, journal, key, path, checkpoint_chunks, checkpoint_interval):
+        self._journal = journal
+        self._key = key
+        self._file = open(path, "a", encoding="utf-8")
+        self._checkpoint_chunks = checkpoint_chunks
+        self._checkpoint_interval = checkpoint_interval
+        self._buffer = []
+        self._last_checkpoint = time.monotonic()
+        self._write({"t": "start", "at": time.time()})
+
+    def append(self, chunk):
+        self._buffer.append(chunk)
+        if (
+            len(self._buffer) >= self._checkpoint_chunks
+            or time.monotonic() - self._last_checkpoint >= self._checkpoint_interval
+        ):
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Write buffered chunks as one journal record.
+        """
+        if self._buffer:
+            self._write({"t": "chunk", "text": "".join(self._buffer)})
+            self._buffer = []
+        self._last_checkpoint = time.monotonic()
+
+    def complete(self):
+        """
+        Mark the reply as fully received and close the file.
+        """
+        self.checkpoint()
+        self._write({"t": "done"})
+        self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        self._journal._release(self._key)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+
+class StreamJournal:
+    """
+    Process-wide append-only journal of replies that are still streaming.
+
+    A journal file exists only while a reply is in flight. Finding one for a
+    conversation that no live writer owns means the process or script thread
+    died mid-answer, and its contents can be used to resume the reply.
+    """
+
+    def __init__(self, directory, checkpoint_chunks=16, checkpoint_interval=0.25):
+        self.directory = directory
+        self.checkpoint_chunks = checkpoint_chunks
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._active = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def begin(self, key):
+        """
+        Start journaling a reply, discarding any stale journal for the same key.
+        """
+        with self._lock:
+            self._active.add(key)
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+        return JournalWriter(
+            self, key, path, self.checkpoint_chunks, self.checkpoint_interval
+        )
+
+    def is_active(self, key):
+        """
+        Return True if a live writer in this process owns the journal.
+        """
+        with self._lock:
+            return key in self._active
+
+    def recover(self, key):
+        """
+        Read back an orphaned journal.
+
+        Returns:
+            A ``(text, complete)`` tuple, or None if there is nothing to recover.
+        """
+        if self.is_active(key):
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+
+        parts = []
+        complete = False
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn final record from a crash mid-write
+                break
+            if record.get("t") == "chunk":
+                parts.append(record["text"])
+            elif record.get("t") == "done":
+                complete = True
+        return "".join(parts), complete
+
+    def discard(self, key):
+        """
+        Delete a journal once its reply is committed or abandoned.
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.exception("Failed to remove stream journal %s", key)
+
+    def _release(self, key):
+        with self._lock:
+            self._active.discard(key)
+
+    def _path(self, key):
+        # Keys come from URLs, so they never become part of a path themselves
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{name}.journal")
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .admission import QUEUE_POLL_INTERVAL, AdmissionRejected
+from .cold_storage import message_text
+
+logger = logging.getLogger(__name__)
+
+ROLE_LABELS = {"user": "User", "ai": "Assistant"}
+# Ends a reply where the model starts writing the user's next transcript turn
+TRANSCRIPT_STOP = (f"\n{ROLE_LABELS['user']}:",)
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an AI assistant.
+Keep facts, decisions, names and open questions. Be concise and write in the language of the conversation.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}
+
+Updated summary:"""
+
+
+def format_transcript(messages):
+    """
+    Render messages as a plain ``Role: content`` transcript.
+    """
+    return "\n".join(
+        f"{ROLE_LABELS.get(m['role'], m['role'])}: {message_text(m)}" for m in messages
+    )
+
+
+class ConversationSummarizer:
+    """
+    Folds older turns of a conversation into a cached rolling summary.
+
+    Summaries are refreshed incrementally on a background thread: each update
+    sends the previous summary plus only the turns added since, so the cost
+    of compaction does not grow with the length of the conversation.
+
+    With an ``admission`` controller, each update waits for a generation
+    slot like a chat reply does, so summaries never add to the concurrency
+    the upstream was sized for. A shed update is retried on the next
+    schedule.
+    """
+
+    def __init__(
+        self, history=None, max_workers=1, cache_size=256, loop=None, admission=None
+    ):
+        self.history = history
+        self.loop = loop
+        self.admission = admission
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="summarizer"
+        )
+        self._lock = threading.Lock()
+        self._summaries = OrderedDict()
+        self._running = set()
+
+    def get(self, conversation_id):
+        """
+        Return the cached summary of a conversation.
+
+        Returns:
+            A dict with ``text`` and ``through_id`` (the last folded message id),
+            or None if the conversation has not been summarized yet.
+        """
+        with self._lock:
+            if conversation_id in self._summaries:
+                self._summaries.move_to_end(conversation_id)
+                return self._summaries[conversation_id]
+
+        summary = None
+        if self.history is not None:
+            summary = self.history.load_summary(conversation_id)
+        self._remember(conversation_id, summary)
+        return summary
+
+    def schedule(self, client, conversation_id, messages):
+        """
+        Fold ``messages`` into the conversation's summary in the background.
+
+        Returns:
+            False if a compaction for the conversation is already running.
+        """
+        with self._lock:
+            if conversation_id in self._running:
+                return False
+            self._running.add(conversation_id)
+        self._executor.submit(self._compact, client, conversation_id, list(messages))
+        return True
+
+    def forget(self, conversation_id):
+        """
+        Drop a conversation's summary, e.g. one folded from another branch.
+        """
+        self._remember(conversation_id, None)
+        if self.history is not None:
+            self.history.delete_summary(conversation_id)
+
+    def is_running(self, conversation_id):
+        with self._lock:
+            return conversation_id in self._running
+
+    def _compact(self, client, conversation_id, messages):
+        try:
+            previous = self.get(conversation_id)
+            prompt = SUMMARY_PROMPT.format(
+                summary=previous["text"] if previous else "(none)",
+                transcript=format_transcript(messages),
+            )
+            text = self._generate(client, conversation_id, prompt).strip()
+            if not text:
+                return
+            summary = {"text": text, "through_id": messages[-1]["id"]}
+            self._remember(conversation_id, summary)
+            if self.history is not None:
+                self.history.save_summary(
+                    conversation_id, summary["through_id"], summary["text"]
+                )
+        except AdmissionRejected as e:
+            logger.info("Deferred summary of conversation %s: %s", conversation_id, e)
+        except Exception:
+            logger.exception("Failed to summarize conversation %s", conversation_id)
+        finally:
+            with self._lock:
+                self._running.discard(conversation_id)
+
+    def _generate(self, client, conversation_id, prompt):
+        async def collect():
+            return "".join([chunk async for chunk in client.generate(prompt)])
+
+        ticket = self._wait_for_slot(conversation_id)
+        try:
+            if self.loop is not None:
+                return self.loop.run(collect())
+
+            loop = asyncio.new_event_loop()
+            try:
+                return loop.run_until_complete(collect())
+            finally:
+                loop.close()
+        finally:
+            if ticket is not None:
+                self.admission.release(ticket)
+
+    def _wait_for_slot(self, conversation_id):
+        """
+        Block this worker until the update holds a generation slot.
+        """
+        if self.admission is None:
+            return None
+        ticket = self.admission.enqueue(f"summary:{conversation_id}")
+        try:
+            while not self.admission.try_admit(ticket):
+                time.sleep(QUEUE_POLL_INTERVAL)
+        except BaseException:
+            self.admission.release(ticket)
+            raise
+        return ticket
+
+    def _remember(self, conversation_id, summary):
+        with self._lock:
+            self._summaries[conversation_id] = summary
+            self._summaries.move_to_end(conversation_id)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
@@ -0,0 +1,253 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SAMPLE_RATE = 50  # One in this many chunk events is logged
+SERVICE_NAME = "st-bubble-chat"
+
+# Correlation fields of the request being served by the current thread or task
+current_request = contextvars.ContextVar("current_request", default=None)
+
+SEVERITY_NUMBERS = {"DEBUG": 5, "INFO": 9, "WARNING": 13, "ERROR": 17, "CRITICAL": 21}
+
+
+class RequestTrace:
+    """
+    Correlates the structured events of one chat request.
+
+    Events are ordinary log records carrying an ``event`` name and an
+    ``attributes`` dict, stamped with the request's correlation fields
+    (request id, session, conversation, message) and its elapsed time.
+    Chunk events are sampled before any record is created, so tracing a
+    long reply costs a counter increment per token.
+    """
+
+    def __init__(self, sample_rate=CHUNK_SAMPLE_RATE, **fields):
+        self.request_id = uuid.uuid4().hex
+        self.fields = {"request_id": self.request_id, **fields}
+        self.sample_rate = sample_rate
+        self.started = time.monotonic()
+        self.marks = {}
+        self._chunks = 0
+
+    def bind(self, **fields):
+        self.fields.update(fields)
+
+    def elapsed_ms(self, since=None):
+        start = self.marks.get(since, self.started)
+        return round((time.monotonic() - start) * 1000, 1)
+
+    def mark(self, name):
+        """
+        Record a point in time that later events can measure from.
+        """
+        self.marks[name] = time.monotonic()
+
+    def event(self, name, level=logging.INFO, **attributes):
+        if not logger.isEnabledFor(level):
+            return
+        attributes.setdefault("elapsed_ms", self.elapsed_ms())
+        logger.log(
+            level,
+            name,
+            extra={"event": name, "attributes": {**self.fields, **attributes}},
+        )
+
+    def chunk(self, text):
+        """
+        Count a streamed chunk, logging one in ``sample_rate`` of them.
+        """
+        self._chunks += 1
+        if self.sample_rate and (self._chunks - 1) % self.sample_rate == 0:
+            self.event(
+                "stream.chunk",
+                level=logging.DEBUG,
+                index=self._chunks,
+                chars=len(text),
+                sample_rate=self.sample_rate,
+            )
+
+    def activate(self):
+        """
+        Make this trace current, so records logged in this context are stamped with it.
+
+        Returns:
+            A token for ``current_request.reset``.
+        """
+        return current_request.set(self)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamps records with the correlation fields of the current request.
+    """
+
+    def filter(self, record):
+        trace = current_request.get()
+        if trace is not None:
+            attributes = getattr(record, "attributes", None) or {}
+            record.attributes = {**trace.fields, **attributes}
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if getattr(record, "event", None):
+            entry["event"] = record.event
+        else:
+            entry["message"] = record.getMessage()
+        entry.update(getattr(record, "attributes", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Formats records as text, appending event attributes as ``key=value`` pairs.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        attributes = getattr(record, "attributes", None)
+        if attributes:
+            text += " " + " ".join(
+                f"{key}={value}" for key, value in attributes.items()
+            )
+        return text
+
+
+class OtlpFileHandler(logging.Handler):
+    """
+    Appends records to a file in the OTLP/JSON logs format.
+
+    Each line is a self-contained ExportLogsServiceRequest, as written by the
+    OpenTelemetry collector's file exporter, so the file can be replayed
+    into any OTLP-compatible backend. The request id doubles as trace id.
+    """
+
+    def __init__(self, path, service_name=SERVICE_NAME):
+        super().__init__()
+        self.path = path
+        self.resource = {"attributes": [_otlp_attribute("service.name", service_name)]}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, record):
+        try:
+            attributes = dict(getattr(record, "attributes", None) or {})
+            log_record = {
+                "timeUnixNano": str(int(record.created * 1e9)),
+                "severityNumber": SEVERITY_NUMBERS.get(record.levelname, 9),
+                "severityText": record.levelname,
+                "body": {"stringValue": record.getMessage()},
+                "attributes": [
+                    _otlp_attribute(key, value)
+                    for key, value in attributes.items()
+                    if value is not None
+                ],
+            }
+            if getattr(record, "event", None):
+                log_record["attributes"].append(
+                    _otlp_attribute("event.name", record.event)
+                )
+            trace_id = attributes.get("request_id")
+            if trace_id:
+                log_record["traceId"] = trace_id
+            if record.exc_text:
+                log_record["attributes"].append(
+                    _otlp_attribute("exception.stacktrace", record.exc_text)
+                )
+            line = {
+                "resourceLogs": [
+                    {
+                        "resource": self.resource,
+                        "scopeLogs": [
+                            {"scope": {"name": record.name}, "logRecords": [log_record]}
+                        ],
+                    }
+                ]
+            }
+            self._file.write(json.dumps(line, default=str) + "\n")
+            self._file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def configure_logging(level="INFO", json_format=False, otlp_path=None):
+    """
+    Route application logging through a queue drained on a background thread.
+
+    Callers only pay for putting a record on an unbounded queue; formatting
+    and I/O happen on the listener thread, so logging never blocks the
+    request path on a slow stream or disk.
+
+    Returns:
+        The started QueueListener.
+    """
+    handlers = [logging.StreamHandler()]
+    handlers[0].setFormatter(JsonFormatter() if json_format else TextFormatter())
+    if otlp_path:
+        handlers.append(OtlpFileHandler(otlp_path))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    # Per-request access logs of the HTTP client would drown the events
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    listener.start()
+    atexit.register(_stop_listener, listener, root, queue_handler)
+    return listener
+
+
+def _stop_listener(listener, root, queue_handler):
+    root.removeHandler(queue_handler)
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -0,0 +1,65 @@
+import os
+import re
+import subprocess
+import sys
+
+# Budget for the app's own imports on top of streamlit, in milliseconds
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "75"))
+
+# Modules that must only be imported on first use, never at startup
+DEFERRED_MODULES = [
+    "httpx",
+    "pandas",
+    "numpy",
+    "dev",
+    "clients.ollama_api_client.client",
+    "components.compare_view",
+    "services.model_comparison",
+    "services.model_warmer",
+]
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)")
+
+
+def measure_imports():
+    """Import the app module under -X importtime and return cumulative us per module"""
+    project_root = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.join(project_root, "src"),
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            cumulative[match.group(2)] = int(match.group(1))
+    return cumulative
+
+
+class TestImportTime:
+
+    def test_deferred_modules_stay_off_startup_path(self):
+        """Test that heavy and debug-only modules are not imported at startup"""
+        cumulative = measure_imports()
+
+        eager = [name for name in DEFERRED_MODULES if name in cumulative]
+        assert not eager, f"Imported at startup: {', '.join(eager)}"
+
+    def test_app_import_time_within_budget(self):
+        """Test that the app's own imports stay within the startup budget"""
+        # Best of several runs, to keep the check stable on noisy machines
+        own_ms = min(
+            (cumulative["main"] - cumulative.get("streamlit", 0)) / 1000
+            for cumulative in (measure_imports() for _ in range(3))
+        )
+
+        print(f"\n⏱️ App import time on top of streamlit: {own_ms:.1f} ms")
+        assert (
+            own_ms <= IMPORT_TIME_BUDGET_MS
+        ), f"App imports took {own_ms:.1f} ms, budget is {IMPORT_TIME_BUDGET_MS} ms"
@@ -7,6 +7,7 @@ import pytest
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
 
 from dev.mocks.mock_ollama_client import MockOllamaApiClient
+from src.services.chat_engine import Turn
 from src.services.conversation_service import ConversationService
 
 
@@ -100,16 +101,13 @@ class TestMockClientIntegration:
     def test_prepare_streaming_chunks_integration(self, conversation_service, mock_st):
         """Test _prepare_streaming_chunks with real mock client"""
         mock_st.session_state.messages = [{"role": "user", "content": "test"}]
-        mock_st.session_state.streaming_response = (
-            ""  # Initialize this to prevent += error
-        )
 
         # This should work without CHARACTER_DELAY error
         try:
-            conversation_service._prepare_streaming_chunks("test message")
+            turn = Turn("test message", None, {"role": "ai", "content": ""})
+            conversation_service._prepare_streaming_chunks(turn)
             # Check that chunks were prepared
-            assert "stream_chunks" in mock_st.session_state
-            assert "chunk_index" in mock_st.session_state
+            assert "stream_buffer" in mock_st.session_state
         except NameError as e:
             if "CHARACTER_DELAY" in str(e):
                 pytest.fail("CHARACTER_DELAY error in streaming preparation")
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.clients.ollama_api_client import OllamaApiClient
+from src.services.background_loop import BackgroundLoop
+
+
+def sse(*events):
+    return "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+
+
+class TestOllamaApiClient:
+    """Test suite for OllamaApiClient against a mocked transport"""
+
+    @pytest.fixture
+    def requests(self):
+        return []
+
+    @pytest.fixture
+    def client(self, requests):
+        def handler(request):
+            requests.append(request)
+            if request.method == "GET":
+                return httpx.Response(200)
+            return httpx.Response(
+                200,
+                text=sse(
+                    {"response": "Hi"},
+                    {"response": "!"},
+                    {"done": True, "context": [1, 2, 3], "eval_count": 2},
+                ),
+            )
+
+        real_async_client = httpx.AsyncClient
+
+        def async_client(**kwargs):
+            return real_async_client(transport=httpx.MockTransport(handler), **kwargs)
+
+        with patch(
+            "src.clients.ollama_api_client.client.httpx.AsyncClient", async_client
+        ):
+            yield OllamaApiClient(
+                "http://ollama.test", default_model="default-model", keep_alive=60
+            )
+
+    async def test_generate_streams_chunks(self, client, requests):
+        """Test that response fields are yielded as chunks"""
+        chunks = [chunk async for chunk in client.generate("Hello")]
+
+        assert chunks == ["Hi", "!"]
+        assert json.loads(requests[0].content)["model_name"] == "default-model"
+
+    async def test_generate_sends_and_reports_context(self, client, requests):
+        """Test that a previous context is sent and the final one reported"""
+        done = {}
+        chunks = [
+            chunk
+            async for chunk in client.generate(
+                "Next", context=[7, 8], on_done=done.update
+            )
+        ]
+
+        assert chunks == ["Hi", "!"]
+        assert json.loads(requests[0].content)["context"] == [7, 8]
+        assert done == {"context": [1, 2, 3], "eval_count": 2}
+
+    async def test_warm_up_marks_model_warm(self, client, requests):
+        """Test that warm-up sends an empty prompt with a keep-alive"""
+        assert client.model_status("m") == "cold"
+
+        assert await client.warm_up("m") is True
+
+        payload = json.loads(requests[0].content)
+        assert payload["prompt"] == ""
+        assert payload["keep_alive"] == "60s"
+        assert client.model_status("m") == "warm"
+
+    async def test_model_goes_cold_after_keep_alive(self, client):
+        """Test that a warm model is reported cold once keep-alive lapses"""
+        await client.warm_up("m")
+        client._warmed_at["m"] -= 61
+        assert client.model_status("m") == "cold"
+
+    def test_pool_is_reused_on_its_loop(self, client):
+        """Test that requests on the pool's loop share one HTTP client"""
+        loop = BackgroundLoop()
+        try:
+            loop.run(client.open_pool())
+            pool = client._pool
+
+            async def generate_and_capture():
+                async with client._http_client() as http_client:
+                    captured = http_client
+                return captured, [c async for c in client.generate("Hello")]
+
+            captured, chunks = loop.run(generate_and_capture())
+            assert captured is pool
+            assert chunks == ["Hi", "!"]
+
+            # A different loop falls back to a short-lived client
+            async def capture():
+                async with client._http_client() as http_client:
+                    return http_client
+
+            assert asyncio.run(capture()) is not pool
+            loop.run(client.close_pool())
+        finally:
+            loop.stop()
+
+    async def test_stop_sequence_closes_stream_early(self):
+        """Test that a matched stop sequence ends the reply and closes the response"""
+        sent = []
+
+        class Events(httpx.AsyncByteStream):
+            closed = False
+
+            async def __aiter__(self):
+                for word in ["Done.", "\nUs", "er:", " more", " text"]:
+                    sent.append(word)
+                    yield sse({"response": word}).encode()
+                yield sse({"done": True}).encode()
+
+            async def aclose(self):
+                Events.closed = True
+
+        def handler(request):
+            return httpx.Response(200, stream=Events())
+
+        real_async_client = httpx.AsyncClient
+
+        def async_client(**kwargs):
+            return real_async_client(transport=httpx.MockTransport(handler), **kwargs)
+
+        with patch(
+            "src.clients.ollama_api_client.client.httpx.AsyncClient", async_client
+        ):
+            client = OllamaApiClient("http://ollama.test", default_model="m")
+            done = {}
+            chunks = [
+                c
+                async for c in client.generate(
+                    "Hi", stop=["\nUser:"], on_done=done.update
+                )
+            ]
+
+        assert "".join(chunks) == "Done."
+        assert done == {"done_reason": "stop"}
+        assert sent == ["Done.", "\nUs", "er:"]
+        assert Events.closed
+
+    async def test_prewarm_opens_connections(self, client, requests):
+        """Test that prewarming issues one request per connection"""
+        await client.prewarm_connections(3)
+        assert [r.method for r in requests] == ["GET", "GET", "GET"]
+        await client.close_pool()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.clients.ollama_api_client.output_limiter import OutputLimiter
+
+
+def run(chunks, **kwargs):
+    limiter = OutputLimiter(**kwargs)
+    text = "".join(limiter.feed(chunk) for chunk in chunks) + limiter.flush()
+    return text, limiter.done_reason
+
+
+class TestOutputLimiter:
+    """Test suite for OutputLimiter"""
+
+    def test_unlimited_passes_text_through(self):
+        """Test that text without stop sequences or caps is emitted unchanged"""
+        assert run(["Hello", " world"]) == ("Hello world", None)
+
+    def test_stop_sequence_split_across_chunks(self):
+        """Test that a stop sequence spanning chunk boundaries is found and cut"""
+        chunks = ["Sure, here", " it is.\nU", "ser", ": and now"]
+        assert run(chunks, stop=["\nUser:"]) == ("Sure, here it is.", "stop")
+
+    def test_partial_match_is_held_back_then_released(self):
+        """Test that a prefix of a stop sequence is only emitted once ruled out"""
+        limiter = OutputLimiter(stop=["```"])
+        assert limiter.feed("code ``") == "code "
+        assert limiter.feed("x") == "``x"
+        assert limiter.flush() == ""
+
+    def test_overlapping_stop_sequences(self):
+        """Test that the first completed stop sequence wins, cut at its start"""
+        assert run(["xaab"], stop=["ab", "aab"]) == ("x", "stop")
+        assert run(["aaa", "ab"], stop=["aab"]) == ("aa", "stop")
+
+    def test_max_chars(self):
+        """Test that output is truncated at the character cap"""
+        assert run(["hello", "world"], max_chars=7) == ("hellowo", "length")
+
+    def test_max_tokens_releases_held_text(self):
+        """Test that the token cap ends the reply, keeping held-back text"""
+        assert run(["a", "b", "c"], max_tokens=2, stop=["bz"]) == ("ab", "length")
+
+    @pytest.mark.parametrize("size", [1, 2, 3, 7])
+    def test_chunking_does_not_change_output(self, size):
+        """Test that the result is independent of chunk boundaries"""
+        text = "alpha beta\nAssistant: gamma\nUser: delta"
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert run(chunks, stop=["\nUser:", "gammax"]) == (
+            "alpha beta\nAssistant: gamma",
+            "stop",
+        )
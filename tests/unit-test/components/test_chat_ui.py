@@ -0,0 +1,62 @@
+import os
+import sys
+import textwrap
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+# chat_ui imports its siblings the way the app does, from the src directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../src"))
+
+from src.components.chat_ui import render_ai_message, render_user_message
+from src.components.markdown import RenderCache
+from src.services.cold_storage import CompressedText
+
+markdown_it = pytest.importorskip("markdown_it")
+
+CODE = """Before
+
+```python
+def f():
+
+    return 1
+```
+After"""
+
+
+def streamlit_markdown(text):
+    # st.markdown dedents its body before the frontend parses it as CommonMark
+    cleaned = textwrap.dedent(text).strip()
+    return markdown_it.MarkdownIt("commonmark").parse(cleaned)
+
+
+class TestChatUi:
+    """Test suite for chat bubble rendering"""
+
+    def test_code_with_blank_line_stays_in_bubble(self):
+        """Test that a code block with a blank line remains one HTML block"""
+        tokens = streamlit_markdown(render_ai_message(CODE))
+
+        # The style sheet and the bubble are separate HTML blocks
+        assert [token.type for token in tokens] == ["html_block", "html_block"]
+        bubble = tokens[-1].content
+        assert "<p>Before</p>" in bubble and "<p>After</p>" in bubble
+        assert "def f():&#10;&#10;    return 1" in bubble
+
+    def test_compressed_user_message_is_rendered_once(self):
+        """Test that a cached user bubble is not decompressed again"""
+        cache = RenderCache()
+        content = CompressedText("a < b\n" * 1000)
+        first = render_user_message(content, cache)
+
+        with patch.object(CompressedText, "__str__", side_effect=AssertionError):
+            assert render_user_message(content, cache) == first
+        assert "a &lt; b<br>" in first
+        # The same text as an AI reply is rendered as Markdown, in its own entry
+        render_ai_message(content, cache)
+        assert cache.stats()["entries"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
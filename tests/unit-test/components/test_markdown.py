@@ -0,0 +1,128 @@
+import os
+import sys
+from unittest.mock import Mock, patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.components.markdown import (
+    IncrementalMarkdown,
+    RenderCache,
+    render_block,
+    render_inline,
+    render_markdown,
+    split_blocks,
+)
+
+SAMPLE = """# Plan
+
+Use **bold**, *italics* and `inline <code>`.
+
+1. First
+2. Second
+
+| Name | Score |
+|------|------:|
+| a    | 1     |
+
+```python
+print("<hi>")
+```
+Trailing paragraph"""
+
+
+class TestRenderMarkdown:
+    """Test suite for the Markdown renderer"""
+
+    def test_renders_blocks(self):
+        """Test that headings, lists, tables and code blocks are rendered"""
+        rendered = render_markdown(SAMPLE)
+
+        assert "<h1>Plan</h1>" in rendered
+        assert "<ol><li>First</li><li>Second</li></ol>" in rendered
+        assert '<th style="text-align: right">Score</th>' in rendered
+        assert '<pre><code class="language-python">' in rendered
+        assert "print(&quot;&lt;hi&gt;&quot;)" in rendered
+        assert rendered.endswith("<p>Trailing paragraph</p>")
+
+    def test_escapes_raw_html(self):
+        """Test that HTML in the model output is never passed through"""
+        rendered = render_markdown('<img src=x onerror="alert(1)"> **ok**')
+
+        assert "<img" not in rendered
+        assert "&lt;img src=x onerror=&quot;alert(1)&quot;&gt;" in rendered
+        assert "<strong>ok</strong>" in rendered
+
+    def test_only_safe_links_are_rendered(self):
+        """Test that links with unsafe schemes are reduced to their label"""
+        assert '<a href="https://example.com/?a=1&amp;b=2"' in render_inline(
+            "[docs](https://example.com/?a=1&b=2)"
+        )
+        assert "<a" not in render_inline("[x](javascript:alert)")
+
+    def test_code_spans_are_not_formatted(self):
+        """Test that emphasis markers inside code spans are kept literally"""
+        assert render_inline("`a*b*c`") == "<code>a*b*c</code>"
+        assert render_inline("snake_case_name") == "snake_case_name"
+
+
+class TestRenderCache:
+    """Test suite for RenderCache"""
+
+    def test_caches_by_cache_key(self):
+        """Test that content with a cache_key is rendered once and not re-read"""
+        content = Mock(cache_key=b"key")
+        content.__str__ = Mock(return_value="**hi**")
+        cache = RenderCache(capacity=2)
+
+        assert cache.render(content) == "<p><strong>hi</strong></p>"
+        assert cache.render(content) == "<p><strong>hi</strong></p>"
+
+        content.__str__.assert_called_once()
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache stays within its capacity"""
+        cache = RenderCache(capacity=2)
+        for text in ["a", "b", "a", "c"]:
+            cache.render(text)
+
+        assert cache.stats()["entries"] == 2
+        cache.render("a")
+        assert cache.stats()["hits"] == 2
+
+
+class TestIncrementalMarkdown:
+    """Test suite for IncrementalMarkdown"""
+
+    def test_matches_full_render_for_every_prefix(self):
+        """Test that incremental output equals a full render at each step"""
+        renderer = IncrementalMarkdown()
+        for end in range(1, len(SAMPLE) + 1):
+            assert renderer.render(SAMPLE[:end]) == render_markdown(SAMPLE[:end])
+
+    def test_completed_blocks_are_rendered_once(self):
+        """Test that only the open tail is re-parsed as text grows"""
+        renderer = IncrementalMarkdown()
+        renderer.render("first block\n\nsecond")
+        with patch(
+            "src.components.markdown.render_block", wraps=render_block
+        ) as render:
+            renderer.render("first block\n\nsecond block")
+
+        assert [call.args[0] for call in render.call_args_list] == ["second block"]
+
+    def test_restarts_when_text_is_replaced(self):
+        """Test that unrelated text is rendered from scratch"""
+        renderer = IncrementalMarkdown()
+        renderer.render("# One\n\nbody")
+
+        assert renderer.render("# Two\n\n") == "<h1>Two</h1>"
+
+    def test_split_blocks_keeps_open_fence_in_tail(self):
+        """Test that an unclosed code fence is never treated as complete"""
+        text = "intro\n\n```\ncode\n\nmore code\n"
+        blocks, tail_start = split_blocks(text)
+
+        assert blocks == ["intro\n"]
+        assert text[tail_start:] == "```\ncode\n\nmore code\n"
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.config.settings import Settings, load_settings
+
+
+class TestLoadSettings:
+    """Test suite for load_settings"""
+
+    def test_defaults_when_nothing_is_configured(self):
+        """Test that an empty environment yields the dataclass defaults"""
+        assert load_settings(environ={}) == Settings()
+
+    def test_parses_typed_values(self):
+        """Test that values are converted to each field's type"""
+        settings = load_settings(
+            environ={
+                "OLLAMA_API_ENDPOINT": "http://ollama:11434",
+                "OLLAMA_POOL_SIZE": "4",
+                "OLLAMA_READ_TIMEOUT": "30.5",
+                "WARMUP_ENABLED": "Yes",
+                "OLLAMA_COMPARE_MODELS": "a, b,,c ",
+                "STREAM_FRAME_INTERVAL_MS": "100",
+            }
+        )
+
+        assert settings.ollama_api_endpoint == "http://ollama:11434"
+        assert settings.ollama_pool_size == 4
+        assert settings.ollama_read_timeout == 30.5
+        assert settings.warmup_enabled is True
+        assert settings.ollama_compare_models == ("a", "b", "c")
+        assert settings.stream_frame_interval == 0.1
+
+    def test_environment_overrides_secrets(self):
+        """Test that secrets are only a fallback for unset variables"""
+        settings = load_settings(
+            environ={"OLLAMA_MODEL": "from-env"},
+            secrets={"OLLAMA_MODEL": "from-secrets", "DEBUG": "true"},
+        )
+
+        assert settings.ollama_model == "from-env"
+        assert settings.debug is True
+
+    def test_invalid_values_are_reported_together(self):
+        """Test that every bad value is listed in one error"""
+        with pytest.raises(ValueError) as error:
+            load_settings(environ={"OLLAMA_POOL_SIZE": "many", "MAX_MESSAGES": "0"})
+
+        assert "OLLAMA_POOL_SIZE='many' is not a valid int" in str(error.value)
+        assert "MAX_MESSAGES must be positive" in str(error.value)
+
+    @pytest.mark.parametrize(
+        "name",
+        [
+            "OLLAMA_MAX_OUTPUT_CHARS",
+            "OLLAMA_MAX_OUTPUT_TOKENS",
+            "WARMUP_REFRESH_INTERVAL",
+            "WARMUP_CONNECTIONS",
+            "MAX_QUEUED_GENERATIONS",
+            "CONVERSATION_CACHE_SIZE",
+            "LOG_CHUNK_SAMPLE_RATE",
+        ],
+    )
+    def test_zero_is_accepted_where_it_disables(self, name):
+        """Test that 0 is a valid value for unlimited or disabled settings"""
+        settings = load_settings(environ={name: "0"})
+
+        assert getattr(settings, name.lower()) == 0
+        with pytest.raises(ValueError, match=f"{name} must not be negative"):
+            load_settings(environ={name: "-1"})
+
+    def test_models_to_warm_defaults_to_configured_models(self):
+        """Test that warm-up falls back to the default and compare models"""
+        settings = Settings(ollama_model="a", ollama_compare_models=("a", "b"))
+        assert settings.models_to_warm == ("a", "b")
+
+        settings = Settings(ollama_model="a", warmup_models=("c",))
+        assert settings.models_to_warm == ("c",)
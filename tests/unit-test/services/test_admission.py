@@ -0,0 +1,107 @@
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController:
+    """Test suite for AdmissionController"""
+
+    def test_admits_up_to_max_concurrent(self):
+        """Test that only max_concurrent tickets are admitted at once"""
+        controller = AdmissionController(max_concurrent=2)
+        tickets = [controller.enqueue(f"session-{i}") for i in range(3)]
+
+        assert controller.try_admit(tickets[0]) is True
+        assert controller.try_admit(tickets[1]) is True
+        assert controller.try_admit(tickets[2]) is False
+        assert controller.position(tickets[2]) == 1
+
+    def test_release_frees_slot_for_next_in_queue(self):
+        """Test that releasing a slot lets the head of the queue in"""
+        controller = AdmissionController(max_concurrent=1)
+        first = controller.enqueue("a")
+        second = controller.enqueue("b")
+        assert controller.try_admit(first) is True
+        assert controller.try_admit(second) is False
+
+        controller.release(first)
+
+        assert controller.try_admit(second) is True
+        assert controller.position(second) == 0
+
+    def test_queue_is_fifo(self):
+        """Test that a later ticket cannot jump ahead of an earlier one"""
+        controller = AdmissionController(max_concurrent=1)
+        holder = controller.enqueue("holder")
+        controller.try_admit(holder)
+        early = controller.enqueue("early")
+        late = controller.enqueue("late")
+        controller.release(holder)
+
+        assert controller.try_admit(late) is False
+        assert controller.try_admit(early) is True
+
+    def test_one_ticket_per_session(self):
+        """Test that a session re-enqueueing gets its existing ticket back"""
+        controller = AdmissionController(max_concurrent=1)
+        controller.enqueue("holder")
+        ticket = controller.enqueue("a")
+        assert controller.enqueue("a") is ticket
+        assert controller.stats()["queued"] == 1
+
+    def test_sheds_load_when_queue_full(self):
+        """Test that requests beyond the queue bound are rejected"""
+        controller = AdmissionController(max_concurrent=1, max_queue=2)
+        controller.enqueue("holder")
+        controller.enqueue("a")
+        controller.enqueue("b")
+
+        with pytest.raises(AdmissionRejected, match="busy"):
+            controller.enqueue("c")
+
+    def test_free_slot_is_taken_without_queueing(self):
+        """Test that an idle controller admits even when queueing is disabled"""
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        ticket = controller.enqueue("a")
+
+        assert controller.position(ticket) == 0
+        assert controller.try_admit(ticket) is True
+        with pytest.raises(AdmissionRejected, match="busy"):
+            controller.enqueue("b")
+
+    def test_per_session_rate_limit(self):
+        """Test that a session exceeding its rate limit is rejected"""
+        controller = AdmissionController(rate_limit=2, rate_window=60.0)
+        for _ in range(2):
+            ticket = controller.enqueue("a")
+            controller.try_admit(ticket)
+            controller.release(ticket)
+
+        with pytest.raises(AdmissionRejected, match="too quickly"):
+            controller.enqueue("a")
+        # Other sessions are unaffected
+        controller.enqueue("b")
+
+    def test_stale_tickets_are_expired(self):
+        """Test that abandoned tickets do not block the queue"""
+        controller = AdmissionController(max_concurrent=1, stale_after=5.0)
+        holder = controller.enqueue("holder")
+        controller.try_admit(holder)
+
+        with patch("src.services.admission.time.monotonic", return_value=0.0):
+            abandoned = controller.enqueue("abandoned")
+        controller.release(holder)
+        waiting = controller.enqueue("waiting")
+
+        assert controller.try_admit(waiting) is True
+        assert controller.position(abandoned) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
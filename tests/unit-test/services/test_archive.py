@@ -0,0 +1,157 @@
+import gzip
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.archive import (
+    ArchiveError,
+    encode_archive,
+    export_records,
+    import_records,
+    read_archive,
+)
+from src.services.history_store import HistoryStore
+
+
+class TestArchive:
+    """Test suite for streaming history export and import"""
+
+    @pytest.fixture
+    def source(self, tmp_path):
+        store = HistoryStore(str(tmp_path / "source.sqlite3"), flush_interval=0.01)
+        store.touch_conversation("c1", "alice", "First")
+        store.append("c1", "user", "Hello")
+        store.append("c1", "ai", "Hi — ünïcode")
+        store.touch_conversation("c2", "alice", "Second")
+        store.append("c2", "user", "Another")
+        store.touch_conversation("c3", "bob", "Bob's")
+        store.append("c3", "user", "Not alice")
+        yield store
+        store.close()
+
+    @pytest.fixture
+    def target(self, tmp_path):
+        store = HistoryStore(str(tmp_path / "target.sqlite3"), flush_interval=0.01)
+        yield store
+        store.close()
+
+    def test_export_groups_messages_under_conversations(self, source):
+        """Test that each conversation record precedes its messages"""
+        records = list(export_records(source, user_id="alice"))
+
+        assert records[0]["type"] == "archive"
+        assert [
+            (r["type"], r["id"] if r["type"] == "conversation" else r["content"])
+            for r in records[1:]
+        ] == [
+            ("conversation", "c1"),
+            ("message", "Hello"),
+            ("message", "Hi — ünïcode"),
+            ("conversation", "c2"),
+            ("message", "Another"),
+        ]
+
+    @pytest.mark.parametrize("compress", [False, True])
+    def test_round_trip(self, source, target, compress):
+        """Test that an exported archive imports into an empty store"""
+        data = b"".join(
+            encode_archive(export_records(source), compress=compress, chunk_size=64)
+        )
+        assert data.startswith(b"\x1f\x8b") is compress
+
+        stats = import_records(target, read_archive(io.BytesIO(data)), batch_size=2)
+
+        assert stats == {"conversations": 3, "messages": 4, "skipped": 0}
+        assert [c["id"] for c in target.list_conversations("alice")] == ["c2", "c1"]
+        assert [m["content"] for m in target.load_page("c1")] == [
+            "Hello",
+            "Hi — ünïcode",
+        ]
+        assert target.search("alice", "Another")[0]["conversation_id"] == "c2"
+
+    def test_encode_yields_bounded_chunks(self, source):
+        """Test that the encoder yields chunks instead of one buffer"""
+        chunks = list(encode_archive(export_records(source), chunk_size=64))
+
+        assert len(chunks) > 2
+        assert all(len(chunk) < 64 + 200 for chunk in chunks)
+
+    def test_import_skips_existing_conversations(self, source, target):
+        """Test that importing the same archive twice adds nothing"""
+        data = b"".join(encode_archive(export_records(source)))
+        import_records(target, read_archive(io.BytesIO(data)))
+
+        stats = import_records(target, read_archive(io.BytesIO(data)))
+
+        assert stats == {"conversations": 0, "messages": 0, "skipped": 3}
+        assert len(target.load_page("c1")) == 2
+
+    def test_round_trip_keeps_branches(self, source, target):
+        """Test that regenerated replies stay siblings after an import"""
+        question = source.load_page("c1")[0]["id"]
+        source.append("c1", "ai", "Hi again", parent_id=question)
+        data = b"".join(encode_archive(export_records(source, user_id="alice")))
+
+        import_records(target, read_archive(io.BytesIO(data)))
+
+        page = target.load_page("c1")
+        assert [m["content"] for m in page] == ["Hello", "Hi again"]
+        siblings = target.load_siblings("c1", [page[-1]["id"]])
+        assert [m["content"] for m in siblings] == ["Hi — ünïcode"]
+
+    def test_import_as_user(self, source, target):
+        """Test that imported conversations can be reassigned to another user"""
+        data = b"".join(encode_archive(export_records(source, user_id="bob")))
+
+        import_records(target, read_archive(io.BytesIO(data)), user_id="carol")
+
+        assert [c["id"] for c in target.list_conversations("carol")] == ["c3"]
+
+    def test_import_ids_follow_existing_messages(self, source, target):
+        """Test that imported messages get fresh ids after the store's own"""
+        own_id = target.append("local", "user", "Mine")
+        data = b"".join(encode_archive(export_records(source)))
+
+        import_records(target, read_archive(io.BytesIO(data)))
+
+        ids = [m["id"] for m in target.load_page("c1")]
+        assert min(ids) > own_id
+        assert target.append("local", "ai", "Next") > max(ids)
+
+    def test_read_rejects_other_files(self):
+        """Test that files without an archive header are rejected"""
+        with pytest.raises(ArchiveError):
+            list(read_archive(io.BytesIO(b'{"prompt": "not an archive"}\n')))
+        with pytest.raises(ArchiveError):
+            list(read_archive(io.BytesIO(b'{"type": "archive", "version": 99}\n')))
+
+    def test_read_skips_torn_last_line(self):
+        """Test that a truncated final line is skipped"""
+        data = (
+            json.dumps({"type": "archive", "version": 1})
+            + "\n"
+            + json.dumps({"type": "conversation", "id": "c1"})
+            + '\n{"type": "mess'
+        )
+
+        records = list(read_archive(io.BytesIO(data.encode())))
+
+        assert records == [{"type": "conversation", "id": "c1"}]
+
+    def test_read_leaves_file_open(self, tmp_path):
+        """Test that reading does not close the caller's file"""
+        path = tmp_path / "archive.jsonl.gz"
+        path.write_bytes(gzip.compress(b'{"type": "archive", "version": 1}\n'))
+
+        with open(path, "rb") as f:
+            assert list(read_archive(f)) == []
+            assert not f.closed
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,204 @@
+import asyncio
+import os
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.chat_engine import ChatEngine, DoneEvent, ErrorEvent, TokenEvent
+from src.services.history_store import HistoryStore
+from src.services.summarizer import ConversationSummarizer
+
+
+class EchoClient:
+    """Fake client echoing the prompt word by word and reporting a context"""
+
+    def __init__(self, fail_after=None):
+        self.calls = []
+        self.fail_after = fail_after
+
+    async def generate(self, prompt, model=None, context=None, on_done=None, stop=None):
+        self.calls.append((prompt, context))
+        for index, word in enumerate(prompt.split()):
+            if index == self.fail_after:
+                raise RuntimeError("upstream failed")
+            yield word + " "
+        on_done({"context": [1, 2, 3], "eval_count": 4})
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+class TestChatEngine:
+    """Test suite for ChatEngine"""
+
+    def test_send_yields_tokens_then_done(self, tmp_path):
+        """Test that a reply streams as token events and is stored when done"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        try:
+            engine = ChatEngine(EchoClient(), history=store)
+            state = engine.new_state("c1")
+
+            events = asyncio.run(collect(engine.send(state, "hello there")))
+
+            assert [e.text for e in events[:-1]] == ["hello ", "there "]
+            assert all(isinstance(e, TokenEvent) for e in events[:-1])
+            done = events[-1]
+            assert isinstance(done, DoneEvent)
+            assert done.message["content"] == "hello there "
+            assert done.message["id"] is not None
+            assert done.timings == {"eval_count": 4}
+            assert [m["role"] for m in state["messages"]] == ["user", "ai"]
+
+            # A fresh state sees the same conversation through the history store
+            reloaded = engine.new_state("c1")
+            assert [m["content"] for m in reloaded["messages"]] == [
+                "hello there",
+                "hello there ",
+            ]
+        finally:
+            store.close()
+
+    def test_next_turn_reuses_context(self):
+        """Test that the second turn sends only the new message with the context"""
+        client = EchoClient()
+        engine = ChatEngine(client)
+        state = engine.new_state("c1")
+
+        asyncio.run(collect(engine.send(state, "first")))
+        asyncio.run(collect(engine.send(state, "second")))
+
+        assert client.calls[1][0] == "second"
+        assert list(client.calls[1][1]) == [1, 2, 3]
+
+    def test_upstream_failure_yields_error(self):
+        """Test that a failed stream ends with an error and an interrupted reply"""
+        engine = ChatEngine(EchoClient(fail_after=1))
+        state = engine.new_state("c1")
+
+        events = asyncio.run(collect(engine.send(state, "one two three")))
+
+        assert isinstance(events[-1], ErrorEvent)
+        assert events[-1].error == "upstream failed"
+        assert state["messages"][-1]["content"] == "one "
+        assert state["messages"][-1]["interrupted"] is True
+
+    def test_closing_the_stream_early_marks_reply_interrupted(self):
+        """Test that a consumer leaving mid-reply leaves a consistent history"""
+        engine = ChatEngine(EchoClient())
+        state = engine.new_state("c1")
+
+        async def first_token():
+            events = engine.send(state, "one two three")
+            event = await events.__anext__()
+            await events.aclose()
+            return event
+
+        assert asyncio.run(first_token()).text == "one "
+        assert state["messages"][-1]["interrupted"] is True
+        assert engine.tree(state).context_bytes() == 0
+
+    def test_store_calls_do_not_block_other_replies(self):
+        """Test that a slow store call in one conversation leaves the loop free"""
+        engine = ChatEngine(EchoClient())
+        slow, fast = engine.new_state("slow"), engine.new_state("fast")
+        release = threading.Event()
+        add_user_message = engine.add_user_message
+
+        def blocking_add(state, content):
+            if state is slow:
+                release.wait(5)
+            return add_user_message(state, content)
+
+        async def both():
+            blocked = asyncio.ensure_future(collect(engine.send(slow, "waiting")))
+            await asyncio.sleep(0)
+            events = await collect(engine.send(fast, "hello"))
+            finished_first = not blocked.done()
+            release.set()
+            await blocked
+            return events, finished_first
+
+        with patch.object(engine, "add_user_message", blocking_add):
+            events, finished_first = asyncio.run(both())
+
+        assert isinstance(events[-1], DoneEvent)
+        assert finished_first
+
+    def test_regenerate_keeps_previous_reply(self):
+        """Test that a regenerated reply is a sibling resuming the earlier context"""
+        client = EchoClient()
+        engine = ChatEngine(client)
+        state = engine.new_state("c1")
+        asyncio.run(collect(engine.send(state, "first")))
+        asyncio.run(collect(engine.send(state, "second")))
+        original = state["messages"]
+
+        asyncio.run(collect(engine.regenerate(state, original[-1])))
+
+        assert client.calls[-1][0] == "second"
+        assert list(client.calls[-1][1]) == [1, 2, 3]
+        assert state["messages"][:3] == original[:3]
+        assert state["messages"][-1] is not original[-1]
+        assert engine.branch_position(state, state["messages"][-1]) == (2, 2)
+        assert engine.switch_branch(state, state["messages"][-1], -1)
+        assert state["messages"] == original
+
+    def test_edited_branches_reload_from_store(self, tmp_path):
+        """Test that an edit is stored as a branch that can be switched back from"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        try:
+            engine = ChatEngine(EchoClient(), history=store)
+            state = engine.new_state("c1")
+            asyncio.run(collect(engine.send(state, "first")))
+            asyncio.run(collect(engine.send(state, "second")))
+
+            asyncio.run(collect(engine.edit(state, state["messages"][2], "changed")))
+
+            reloaded = engine.new_state("c1")
+            messages = reloaded["messages"]
+            assert [m["content"] for m in messages] == [
+                "first",
+                "first ",
+                "changed",
+                "changed ",
+            ]
+            assert engine.branch_position(reloaded, messages[2]) == (2, 2)
+            assert engine.switch_branch(reloaded, messages[2], -1)
+            assert [m["content"] for m in reloaded["messages"]] == [
+                "first",
+                "first ",
+                "second",
+                "second ",
+            ]
+        finally:
+            store.close()
+
+    def test_summary_of_another_branch_is_dropped(self, tmp_path):
+        """Test that a summary folded from a sibling branch is not used"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        try:
+            engine = ChatEngine(EchoClient(), history=store)
+            state = engine.new_state("c1")
+            asyncio.run(collect(engine.send(state, "first")))
+            store.save_summary("c1", state["messages"][1]["id"], "about first")
+            summarizer = ConversationSummarizer(history=store)
+            engine = ChatEngine(EchoClient(), history=store, summarizer=summarizer)
+            state = engine.new_state("c1")
+
+            assert engine.current_summary(state)["text"] == "about first"
+            assert engine.rewind(state, state["messages"][0])
+            engine.add_user_message(state, "other")
+
+            assert engine.current_summary(state) is None
+            assert store.load_summary("c1") is None
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
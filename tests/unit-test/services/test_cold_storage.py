@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.cold_storage import ColdStorage, CompressedText, message_text
+
+
+class TestColdStorage:
+    """Test suite for ColdStorage"""
+
+    def test_compresses_only_large_messages(self):
+        """Test that messages below the threshold are left as plain text"""
+        storage = ColdStorage(threshold=100)
+        small = {"role": "user", "content": "short"}
+        large = {"role": "ai", "content": "lorem ipsum " * 50}
+
+        storage.freeze([small, large])
+
+        assert small["content"] == "short"
+        assert isinstance(large["content"], CompressedText)
+        assert message_text(large) == "lorem ipsum " * 50
+        assert f"{large['content']}" == "lorem ipsum " * 50
+
+    def test_keeps_text_that_would_not_shrink(self):
+        """Test that text is left alone when compression would not save memory"""
+        message = {"role": "ai", "content": "abcdefgh"}
+
+        ColdStorage(threshold=1).freeze([message])
+
+        assert message["content"] == "abcdefgh"
+
+    def test_stats_report_savings(self):
+        """Test that stats sum raw and stored sizes of compressed messages"""
+        storage = ColdStorage(threshold=10)
+        messages = [
+            {"role": "ai", "content": "a" * 1000},
+            {"role": "user", "content": "hi"},
+        ]
+        storage.freeze(messages)
+
+        stats = storage.stats(messages)
+
+        assert stats["compressed_messages"] == 1
+        assert stats["raw_bytes"] == 1000
+        assert stats["saved_bytes"] == 1000 - stats["stored_bytes"]
+        assert stats["ratio"] > 10
+
+    def test_stats_without_compressed_messages(self):
+        """Test that stats are empty when nothing is compressed"""
+        stats = ColdStorage().stats([{"role": "user", "content": "hi"}])
+
+        assert stats["compressed_messages"] == 0
+        assert stats["ratio"] is None
@@ -0,0 +1,113 @@
+import gc
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.cold_storage import CompressedText
+from src.services.conversation_cache import ConversationCache
+
+
+def make_state(text):
+    return {
+        "messages": [{"id": 1, "role": "user", "content": text}],
+        "has_older_messages": False,
+    }
+
+
+class TestConversationCache:
+    """Test suite for ConversationCache"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        return ConversationCache(str(tmp_path / "spill"), capacity=2)
+
+    def test_pop_returns_parked_state(self, cache):
+        """Test that a parked conversation is returned and removed"""
+        cache.put("a", make_state("A"))
+        assert cache.pop("a")["messages"][0]["content"] == "A"
+        assert cache.pop("a") is None
+
+    def test_least_recently_used_is_spilled(self, cache, tmp_path):
+        """Test that only `capacity` conversations stay in memory"""
+        cache.put("a", make_state("A"))
+        cache.put("b", make_state("B"))
+        cache.put("c", make_state("C"))
+
+        assert cache.in_memory() == ["b", "c"]
+        assert os.path.exists(cache._spill_path("a"))
+
+    def test_spilled_conversation_reloads_on_demand(self, cache, tmp_path):
+        """Test that a spilled conversation round-trips through disk"""
+        cache.put("a", make_state("A"))
+        cache.put("b", make_state("B"))
+        cache.put("c", make_state("C"))
+
+        state = cache.pop("a")
+
+        assert state == make_state("A")
+        assert not os.path.exists(cache._spill_path("a"))
+
+    def test_compressed_messages_spill_as_text(self, cache):
+        """Test that compressed message content is written out as plain text"""
+        state = make_state("A")
+        state["messages"][0]["content"] = CompressedText("long answer " * 10)
+        cache.put("a", state)
+        cache.put("b", make_state("B"))
+        cache.put("c", make_state("C"))
+
+        assert cache.pop("a")["messages"][0]["content"] == "long answer " * 10
+
+    def test_spill_all_frees_memory(self, cache, tmp_path):
+        """Test that spill_all moves every parked conversation to disk"""
+        cache.put("a", make_state("A" * 100))
+        cache.put("b", make_state("B"))
+        assert cache.memory_size() > 100
+
+        cache.spill_all()
+
+        assert cache.in_memory() == []
+        assert cache.memory_size() == 0
+        assert cache.pop("a") == make_state("A" * 100)
+
+    def test_put_refreshes_recency(self, cache):
+        """Test that re-parking a conversation makes it most recent"""
+        cache.put("a", make_state("A"))
+        cache.put("b", make_state("B"))
+        cache.put("a", make_state("A2"))
+        cache.put("c", make_state("C"))
+
+        assert cache.in_memory() == ["a", "c"]
+
+    def test_discard_removes_spill_file(self, cache, tmp_path):
+        """Test that discard forgets a spilled conversation"""
+        for key in ["a", "b", "c"]:
+            cache.put(key, make_state(key))
+        cache.discard("a")
+        assert cache.pop("a") is None
+
+    def test_ids_stay_inside_the_spill_dir(self, cache, tmp_path):
+        """Test that an id with path segments cannot name a file elsewhere"""
+        for key in ["../a", "b", "c"]:
+            cache.put(key, make_state(key))
+
+        assert list(tmp_path.glob("*.json.z")) == []
+        assert cache.pop("../a") == make_state("../a")
+
+    def test_spill_dir_is_removed_with_the_cache(self, tmp_path):
+        """Test that a session's spill directory does not outlive its cache"""
+        spill_dir = tmp_path / "session"
+        cache = ConversationCache(str(spill_dir), capacity=0)
+        cache.put("a", make_state("A"))
+        assert spill_dir.exists()
+
+        del cache
+        gc.collect()
+
+        assert not spill_dir.exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
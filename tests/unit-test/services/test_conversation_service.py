@@ -1,3 +1,5 @@
+import gzip
+import json
 import os
 import sys
 from unittest.mock import Mock, patch
@@ -6,7 +8,14 @@ import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
 
+from src.services.admission import AdmissionController
+from src.services.cold_storage import ColdStorage, CompressedText
+from src.services.conversation_cache import ConversationCache
 from src.services.conversation_service import ConversationService
+from src.services.history_store import HistoryStore
+from src.services.memory_guard import MemoryGuard, messages_size
+from src.services.stream_buffer import StreamBuffer
+from src.services.stream_journal import StreamJournal
 
 
 class MockStreamlitSessionState:
@@ -49,7 +58,9 @@ class TestConversationService:
         """Create a mock client for testing"""
         client = Mock()
 
-        async def mock_generate(prompt, model=None):
+        async def mock_generate(
+            prompt, model=None, context=None, on_done=None, stop=None
+        ):
             # Mock streaming response
             test_response = "Test response"
             for char in test_response:
@@ -161,24 +172,347 @@ class TestConversationService:
             conversation_service._start_streaming()
 
             assert mock_st.session_state.get("streaming_active") is True
-            assert mock_st.session_state.get("streaming_response") == ""
             assert mock_st.session_state.get("streaming_complete") is False
             assert len(mock_st.session_state.messages) == 2
             assert mock_st.session_state.messages[-1]["role"] == "ai"
-            mock_prepare.assert_called_once_with("Test message")
+            (turn,) = mock_prepare.call_args[0]
+            assert turn.prompt == "Test message"
+            assert turn.context is None
+            assert turn.message is mock_st.session_state.messages[-1]
 
     def test_cleanup_streaming(self, conversation_service, mock_st):
         """Test _cleanup_streaming clears state"""
         # Set up streaming state
         mock_st.session_state["ai_thinking"] = True
         mock_st.session_state["streaming_active"] = True
-        mock_st.session_state["stream_chunks"] = ["T", "e", "s", "t"]
+        buffer = StreamBuffer(["T", "e", "s", "t"])
+        mock_st.session_state["stream_buffer"] = buffer
 
         conversation_service._cleanup_streaming()
 
         assert mock_st.session_state.get("ai_thinking") is False
         assert mock_st.session_state.get("streaming_active") is False
-        assert mock_st.session_state.get("stream_chunks") is None
+        assert mock_st.session_state.get("stream_buffer") is None
+        assert buffer.pending == 0
+
+    def test_each_frame_reveals_every_chunk_due(self, conversation_service, mock_st):
+        """Test that a long reply is painted in a bounded number of frames"""
+        chunks = [f"{i} " for i in range(5000)]
+        mock_st.session_state["stream_buffer"] = StreamBuffer(chunks)
+        mock_st.session_state.messages = [{"role": "ai", "content": ""}]
+        clock = iter(i * 0.05 for i in range(10_000))
+        frames = 0
+
+        with (
+            patch("src.services.conversation_service.time.sleep"),
+            patch("src.services.stream_buffer.time.monotonic", lambda: next(clock)),
+            patch.object(conversation_service, "_finish_streaming") as mock_finish,
+        ):
+            while not mock_finish.called:
+                conversation_service._continue_streaming()
+                frames += 1
+
+        assert mock_st.session_state.messages[-1]["content"] == "".join(chunks)
+        assert frames <= 102
+
+    def test_handle_ai_thinking_waits_in_queue(self, mock_client, mock_st):
+        """Test that a queued request reports its position instead of streaming"""
+        admission = AdmissionController(max_concurrent=1)
+        holder = admission.enqueue("other-session")
+        admission.try_admit(holder)
+        service = ConversationService(
+            mock_client, admission=admission, session_id="session"
+        )
+        mock_st.session_state.messages = [{"role": "user", "content": "Hi"}]
+        mock_st.session_state["ai_thinking"] = True
+
+        with (
+            patch("src.services.conversation_service.time.sleep"),
+            patch.object(service, "_start_streaming") as mock_start,
+        ):
+            service.handle_ai_thinking()
+            mock_start.assert_not_called()
+
+        assert mock_st.session_state.get("queue_position") == 1
+        mock_st.rerun.assert_called_once()
+
+    def test_handle_ai_thinking_sheds_load(self, mock_client, mock_st):
+        """Test that a shed request is answered with an error bubble"""
+        admission = AdmissionController(max_concurrent=1, max_queue=0)
+        admission.enqueue("busy")
+        service = ConversationService(
+            mock_client, admission=admission, session_id="session"
+        )
+        mock_st.session_state.messages = [{"role": "user", "content": "Hi"}]
+        mock_st.session_state["ai_thinking"] = True
+
+        service.handle_ai_thinking()
+
+        assert mock_st.session_state.messages[-1]["role"] == "ai"
+        assert mock_st.session_state.messages[-1]["error"] is True
+        assert mock_st.session_state.get("ai_thinking") is False
+
+    def test_history_is_persisted_and_lazy_loaded(self, mock_client, mock_st, tmp_path):
+        """Test that trimmed messages can be lazy-loaded from the history store"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        try:
+            service = ConversationService(mock_client, history=store)
+            service.load_conversation("c1")
+            for i in range(12):
+                service.add_user_message(f"Message {i}")
+
+            with patch.object(store, "has_older", side_effect=AssertionError):
+                # Trimming after a reply must not wait for the writer
+                service.limit_messages(max_messages=10)
+            assert mock_st.session_state.messages[0]["content"] == "Message 2"
+            assert mock_st.session_state.get("has_older_messages") is True
+
+            service.load_older_messages()
+            assert len(mock_st.session_state.messages) == 12
+            assert mock_st.session_state.messages[0]["content"] == "Message 0"
+            assert mock_st.session_state.get("has_older_messages") is False
+
+            service.load_conversation("c1")
+            assert mock_st.session_state.messages[-1]["content"] == "Message 11"
+        finally:
+            store.close()
+
+    def test_memory_guard_trim_is_applied_on_next_run(self, mock_client, mock_st):
+        """Test that a session trims its own history when the guard asks"""
+        guard = MemoryGuard(high_water=1, keep_messages=2)
+        service = ConversationService(mock_client, memory_guard=guard, session_id="s1")
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = [
+            {"role": "user", "content": f"Message {i}"} for i in range(5)
+        ]
+        service.report_memory()
+        assert len(mock_st.session_state.messages) == 5
+
+        service.report_memory()
+
+        assert [m["content"] for m in mock_st.session_state.messages] == [
+            "Message 3",
+            "Message 4",
+        ]
+        assert guard.session_bytes("s1") == messages_size(
+            mock_st.session_state.messages
+        )
+
+    def test_switch_conversation(self, mock_client, mock_st, tmp_path):
+        """Test switching threads parks the current one and lists both"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        try:
+            service = ConversationService(
+                mock_client,
+                history=store,
+                cache=ConversationCache(str(tmp_path / "spill"), capacity=1),
+            )
+            mock_st.session_state["user_id"] = "user"
+            service.load_conversation("c1")
+            service.add_user_message("First thread")
+
+            service.switch_conversation("c2")
+            assert mock_st.session_state.messages == []
+            service.add_user_message("Second thread")
+
+            service.switch_conversation("c1")
+            assert mock_st.session_state.conversation_id == "c1"
+            assert mock_st.session_state.messages[0]["content"] == "First thread"
+
+            titles = [c["title"] for c in service.list_conversations()]
+            assert titles == ["Second thread", "First thread"]
+        finally:
+            store.close()
+
+    def test_archive_exporter_captures_user(self, mock_client, mock_st, tmp_path):
+        """Test that the deferred export only covers the current user"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        try:
+            service = ConversationService(mock_client, history=store)
+            store.touch_conversation("other", "someone else", "Theirs")
+            mock_st.session_state["user_id"] = "user"
+            service.load_conversation("c1")
+            service.add_user_message("Mine")
+            export = service.archive_exporter()
+            mock_st.session_state["user_id"] = "changed"
+
+            lines = gzip.decompress(export()).decode().splitlines()
+        finally:
+            store.close()
+
+        assert [json.loads(line)["type"] for line in lines] == [
+            "archive",
+            "conversation",
+            "message",
+        ]
+        assert ConversationService(mock_client).archive_exporter() is None
+
+    def test_load_conversation_recovers_interrupted_reply(
+        self, mock_client, mock_st, tmp_path
+    ):
+        """Test that a partial reply left by a restart is marked interrupted"""
+        store = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        journal = StreamJournal(str(tmp_path / "journal"), checkpoint_chunks=1)
+        try:
+            store.append("c1", "user", "Question")
+            writer = journal.begin("c1")
+            writer.append("Partial answer")
+            # Simulate a restart: no live writer owns the journal any more
+            journal._release("c1")
+
+            service = ConversationService(mock_client, history=store, journal=journal)
+            service.load_conversation("c1")
+
+            assert mock_st.session_state.messages[-1]["content"] == "Partial answer"
+            assert mock_st.session_state.messages[-1]["interrupted"] is True
+            assert journal.recover("c1") is None
+            assert service.should_start_ai_thinking() is False
+        finally:
+            store.close()
+
+    def test_stalled_stream_is_recovered_from_journal(
+        self, mock_client, mock_st, tmp_path
+    ):
+        """Test that a session stuck mid-stream is unstuck with the partial reply"""
+        journal = StreamJournal(str(tmp_path / "journal"), checkpoint_chunks=1)
+        writer = journal.begin("c1")
+        writer.append("Half of the")
+        journal._release("c1")
+
+        service = ConversationService(mock_client, journal=journal)
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = [
+            {"role": "user", "content": "Question"},
+            {"role": "ai", "content": ""},
+        ]
+        mock_st.session_state["ai_thinking"] = True
+        mock_st.session_state["streaming_active"] = True
+
+        service.handle_ai_thinking()
+
+        assert mock_st.session_state.messages[-1]["content"] == "Half of the"
+        assert mock_st.session_state.messages[-1]["interrupted"] is True
+        assert mock_st.session_state.get("ai_thinking") is False
+
+        service.regenerate_interrupted()
+        assert mock_st.session_state.messages[-1]["role"] == "user"
+        assert service.should_start_ai_thinking() is True
+
+    def test_build_prompt_first_message_is_sent_as_is(
+        self, conversation_service, mock_st
+    ):
+        """Test that a message without history is sent without a transcript"""
+        mock_st.session_state.messages = [{"role": "user", "content": "Hello"}]
+        assert (
+            conversation_service.engine.build_prompt(mock_st.session_state) == "Hello"
+        )
+
+    def test_large_messages_are_compressed_but_still_usable(
+        self, mock_client, mock_st, tmp_path
+    ):
+        """Test that cold storage compresses finished messages transparently"""
+        service = ConversationService(
+            mock_client,
+            cache=ConversationCache(str(tmp_path / "spill"), capacity=0),
+            cold_storage=ColdStorage(threshold=100),
+        )
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = []
+        long_text = "Please review this paragraph. " * 20
+
+        service.add_user_message(long_text)
+
+        assert isinstance(mock_st.session_state.messages[-1]["content"], CompressedText)
+        assert service.engine.build_prompt(mock_st.session_state) == long_text
+
+        # Spilled conversations are reloaded as text and compressed again
+        service.switch_conversation("c2")
+        service.switch_conversation("c1")
+        assert isinstance(mock_st.session_state.messages[-1]["content"], CompressedText)
+        assert str(mock_st.session_state.messages[-1]["content"]) == long_text
+
+    def test_build_prompt_uses_summary_and_recent_turns(self, mock_client, mock_st):
+        """Test that summarized turns are replaced by the cached summary"""
+        summarizer = Mock()
+        summarizer.get.return_value = {"text": "User is Ada.", "through_id": 2}
+        service = ConversationService(mock_client, summarizer=summarizer)
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = [
+            {"id": 1, "role": "user", "content": "My name is Ada"},
+            {"id": 2, "role": "ai", "content": "Hi Ada"},
+            {"id": 3, "role": "user", "content": "What is 2+2?"},
+            {"id": 4, "role": "ai", "content": "4"},
+            {"id": 5, "role": "user", "content": "What is my name?"},
+        ]
+
+        prompt = service.engine.build_prompt(mock_st.session_state)
+
+        assert prompt.startswith("Summary of the earlier conversation:\nUser is Ada.")
+        assert "My name is Ada" not in prompt
+        assert "User: What is 2+2?\nAssistant: 4\nUser: What is my name?" in prompt
+        assert prompt.endswith("Assistant:")
+
+    def test_finish_streaming_schedules_compaction(self, mock_client, mock_st):
+        """Test that aged-out messages are handed to the summarizer"""
+        summarizer = Mock()
+        summarizer.get.return_value = None
+        service = ConversationService(mock_client, summarizer=summarizer)
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = [
+            {"id": i, "role": "user" if i % 2 else "ai", "content": str(i)}
+            for i in range(1, 9)
+        ]
+
+        service._finish_streaming()
+
+        client, conversation_id, pending = summarizer.schedule.call_args[0]
+        assert conversation_id == "c1"
+        assert [m["id"] for m in pending] == [1, 2]
+
+    def test_next_turn_reuses_upstream_context(self, mock_client, mock_st):
+        """Test that only the new turn is sent while the upstream context is valid"""
+        calls = []
+
+        async def generate(prompt, model=None, context=None, on_done=None, stop=None):
+            calls.append((prompt, context))
+            yield "Reply"
+            on_done({"context": [1, 2, 3], "eval_count": 1})
+
+        mock_client.generate = generate
+        service = ConversationService(mock_client, context_messages=6)
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = []
+
+        def turn(text):
+            service.add_user_message(text)
+            service._start_streaming()
+            while mock_st.session_state.get("streaming_active"):
+                service._continue_streaming()
+
+        turn("My name is Ada")
+        turn("What is my name?")
+
+        assert calls[1][0] == "What is my name?"
+        assert list(calls[1][1]) == [1, 2, 3]
+
+        # A regenerated reply resumes from the context before the question
+        mock_st.session_state.messages[-1]["interrupted"] = True
+        service.regenerate_interrupted()
+        service._start_streaming()
+        assert calls[2][0] == "What is my name?"
+        assert list(calls[2][1]) == [1, 2, 3]
+
+    def test_oversized_context_is_not_reused(self, mock_client, mock_st):
+        """Test that a context above the token cap falls back to the history prompt"""
+        service = ConversationService(mock_client, context_max_tokens=2)
+        mock_st.session_state["conversation_id"] = "c1"
+        mock_st.session_state.messages = [{"role": "ai", "content": "Hi"}]
+        engine, state = service.engine, mock_st.session_state
+
+        engine.commit_context(state, state.messages[-1], {"context": [1, 2, 3]})
+        state.messages.append({"role": "user", "content": "Hello"})
+
+        assert engine.reusable_context(state, engine.prompt_history(state)) is None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+import os
+import sys
+from array import array
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.conversation_tree import ConversationTree
+
+
+def messages(*contents):
+    return [
+        {"role": "user" if i % 2 == 0 else "ai", "content": content}
+        for i, content in enumerate(contents)
+    ]
+
+
+class TestConversationTree:
+    """Test suite for ConversationTree"""
+
+    def test_sync_builds_the_path(self):
+        """Test that a flat message list becomes the current path"""
+        history = messages("q1", "a1", "q2")
+        tree = ConversationTree(history)
+
+        assert tree.path() == history
+        assert tree.position(history[1]) == (1, 1)
+
+    def test_branches_share_their_prefix(self):
+        """Test that a regenerated reply is a sibling sharing the same ancestors"""
+        history = messages("q1", "a1", "q2", "a2")
+        tree = ConversationTree(history)
+
+        path = tree.rewind(tree.node(history[2]))
+        retry = {"role": "ai", "content": "a2 again"}
+        tree.sync(path + [retry])
+
+        assert tree.path() == history[:3] + [retry]
+        assert tree.node(retry).parent is tree.node(history[2])
+        assert tree.position(retry) == (2, 2)
+        assert tree.path()[0] is history[0]
+
+    def test_switch_follows_last_visited_path(self):
+        """Test that switching returns to where a branch was left"""
+        history = messages("q1", "a1", "q2", "a2")
+        tree = ConversationTree(history)
+        tree.sync(tree.rewind(tree.node(history[0])) + messages("x", "b1")[1:])
+        branch = tree.path()
+
+        assert tree.switch(branch[1], -1) is tree.node(history[1])
+        assert tree.path() == history
+        tree.switch(history[1], 1)
+        assert tree.path() == branch
+        assert tree.switch(branch[1], 1) is None
+
+    def test_edit_of_first_message_branches_at_root(self):
+        """Test that rewinding to the root keeps the original branch"""
+        history = messages("q1", "a1")
+        tree = ConversationTree(history)
+
+        path = tree.rewind(tree.root)
+        edited = {"role": "user", "content": "q1 edited"}
+        tree.sync(path + [edited])
+
+        assert tree.path() == [edited]
+        assert tree.position(edited) == (2, 2)
+        tree.switch(edited, -1)
+        assert tree.path() == history
+
+    def test_sync_prepends_older_messages(self):
+        """Test that a loaded older page becomes the ancestors of the root's children"""
+        history = messages("q1", "a1", "q2", "a2")
+        tree = ConversationTree(history[2:])
+        tree.sync(tree.rewind(tree.root) + [{"role": "user", "content": "q2b"}])
+        tree.switch(tree.path()[0], -1)
+
+        tree.sync(history)
+
+        assert tree.path() == history
+        assert tree.position(history[2]) == (1, 2)
+        assert tree.node(history[2]).parent is tree.node(history[1])
+
+    def test_sync_reroots_a_trimmed_list(self):
+        """Test that trimming the list drops ancestors but keeps sibling branches"""
+        history = messages("q1", "a1", "q2", "a2")
+        tree = ConversationTree(history)
+        tree.sync(tree.rewind(tree.node(history[1])) + [{"role": "user", "c": 1}])
+        tree.switch(tree.path()[-1], -1)
+
+        tree.sync(history[2:])
+
+        assert tree.path() == history[2:]
+        assert tree.node(history[0]) is None
+        assert tree.position(history[2]) == (1, 2)
+
+    def test_remove_drops_branch(self):
+        """Test that removing the leaf moves the path up"""
+        history = messages("q1", "a1")
+        tree = ConversationTree(history)
+
+        tree.remove(history[1])
+
+        assert tree.path() == history[:1]
+        assert tree.node(history[1]) is None
+
+    def test_contexts_are_bounded(self):
+        """Test that only the most recently used contexts are kept"""
+        history = messages("q1", "a1", "q2", "a2", "q3", "a3")
+        tree = ConversationTree(history, max_contexts=2)
+
+        for message in history[1::2]:
+            tree.remember_context(message, array("i", [1, 2]))
+        tree.context(history[3])
+        tree.remember_context(history[1], array("i", [3]))
+
+        assert tree.context(history[5]) is None
+        assert list(tree.context(history[3])) == [1, 2]
+        assert tree.context_bytes() == 3 * array("i").itemsize
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
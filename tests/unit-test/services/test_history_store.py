@@ -0,0 +1,269 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.history_store import (
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    ID_BLOCK_SIZE,
+    HistoryStore,
+)
+
+
+class TestHistoryStore:
+    """Test suite for HistoryStore"""
+
+    @pytest.fixture
+    def db_path(self, tmp_path):
+        return str(tmp_path / "history.sqlite3")
+
+    @pytest.fixture
+    def store(self, db_path):
+        store = HistoryStore(db_path, flush_interval=0.01)
+        yield store
+        store.close()
+
+    def test_append_assigns_increasing_ids(self, store):
+        """Test that append returns ids without waiting for the write"""
+        first = store.append("c1", "user", "Hello")
+        second = store.append("c1", "ai", "Hi")
+        assert second == first + 1
+
+    def test_read_after_append_does_not_wait_for_batch_interval(self, db_path):
+        """Test that a read makes the writer commit its batch at once"""
+        store = HistoryStore(db_path, flush_interval=5.0)
+        try:
+            store.append("c1", "user", "Hello")
+            started = time.monotonic()
+
+            page = store.load_page("c1")
+
+            assert time.monotonic() - started < 1.0
+            assert [m["content"] for m in page] == ["Hello"]
+        finally:
+            store.close()
+
+    def test_uses_wal_mode(self, store, db_path):
+        """Test that the database is opened in WAL mode"""
+        store.flush()
+        conn = sqlite3.connect(db_path)
+        try:
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            conn.close()
+        assert mode == "wal"
+
+    def test_load_page_returns_latest_messages_in_order(self, store):
+        """Test that the latest page is returned oldest first"""
+        for i in range(5):
+            store.append("c1", "user", f"Message {i}")
+        store.append("c2", "user", "Other conversation")
+
+        page = store.load_page("c1", limit=3)
+
+        assert [m["content"] for m in page] == ["Message 2", "Message 3", "Message 4"]
+
+    def test_load_page_before_id(self, store):
+        """Test lazy loading of older pages by message id"""
+        ids = [store.append("c1", "user", f"Message {i}") for i in range(5)]
+
+        page = store.load_page("c1", before_id=ids[2], limit=10)
+
+        assert [m["id"] for m in page] == ids[:2]
+        assert store.has_older("c1", ids[2]) is True
+        assert store.has_older("c1", ids[0]) is False
+
+    def test_branches_share_their_prefix(self, store):
+        """Test that pages follow one branch and siblings are listed next to it"""
+        question = store.append("c1", "user", "Question")
+        first = store.append("c1", "ai", "First answer")
+        store.append("c1", "user", "Follow-up")
+        second = store.append("c1", "ai", "Second answer", parent_id=question)
+
+        page = store.load_page("c1")
+
+        assert [m["content"] for m in page] == ["Question", "Second answer"]
+        assert page[-1]["parent_id"] == question
+        assert [m["id"] for m in store.load_siblings("c1", [second])] == [first]
+        branch = store.load_branch("c1", first)
+        assert [m["content"] for m in branch] == ["First answer", "Follow-up"]
+        assert store.has_older("c1", second) is True
+        assert store.has_older("c1", question) is False
+        assert store.is_ancestor(question, branch[-1]["id"]) is True
+        assert store.is_ancestor(first, second) is False
+
+    def test_linear_history_is_migrated(self, db_path):
+        """Test that a store without parent links gets them backfilled"""
+        conn = sqlite3.connect(db_path)
+        conn.executescript(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id TEXT, "
+            "role TEXT, content TEXT, created_at REAL);"
+            "INSERT INTO messages VALUES (1, 'c1', 'user', 'Hi', 0), "
+            "(2, 'c2', 'user', 'Other', 0), (3, 'c1', 'ai', 'Hello', 0);"
+        )
+        conn.close()
+
+        store = HistoryStore(db_path)
+        try:
+            page = store.load_page("c1")
+        finally:
+            store.close()
+
+        assert [(m["id"], m["parent_id"]) for m in page] == [(1, None), (3, 1)]
+
+    def test_history_survives_reopen(self, store, db_path):
+        """Test that a new store instance sees previously written messages"""
+        store.append("c1", "user", "Persisted")
+        store.close()
+
+        reopened = HistoryStore(db_path)
+        try:
+            assert reopened.load_page("c1")[0]["content"] == "Persisted"
+            assert reopened.append("c1", "ai", "Next") == 2
+        finally:
+            reopened.close()
+
+    def test_iterators_page_by_keyset(self, store):
+        """Test that iteration crosses page boundaries without gaps"""
+        for i in range(5):
+            store.touch_conversation(f"c{i}", "user" if i % 2 else "other", "T")
+            store.append(f"c{i}", "user", f"Message {i}")
+        for i in range(4):
+            store.append("c0", "ai", f"Reply {i}")
+
+        conversations = list(store.iter_conversations(batch_size=2))
+        messages = list(store.iter_messages("c0", batch_size=2))
+
+        assert [c["id"] for c in conversations] == ["c0", "c1", "c2", "c3", "c4"]
+        assert [c["id"] for c in store.iter_conversations("user")] == ["c1", "c3"]
+        assert [m["content"] for m in messages] == [
+            "Message 0",
+            "Reply 0",
+            "Reply 1",
+            "Reply 2",
+            "Reply 3",
+        ]
+
+    def test_processes_sharing_a_file_get_distinct_ids(self, store):
+        """Test that two stores on one file never assign the same message id"""
+        other = HistoryStore(store.path, flush_interval=0.01)
+        try:
+            ids = []
+            for index in range(3):
+                ids.append(store.append("c1", "user", f"From app {index}"))
+                ids.append(other.append("c2", "user", f"From server {index}"))
+            other.flush()
+            store.flush()
+
+            assert len(set(ids)) == len(ids)
+            assert ids[::2] == sorted(ids[::2])
+            assert ids[1::2] == sorted(ids[1::2])
+            assert len(store.load_page("c1")) == 3
+            assert len(store.load_page("c2")) == 3
+        finally:
+            other.close()
+
+    def test_ids_are_claimed_from_the_database_in_blocks(self, store, db_path):
+        """Test that appends hand out ids without a transaction each"""
+        ids = [store.append("c1", "user", f"Message {i}") for i in range(10)]
+        conn = sqlite3.connect(db_path)
+        try:
+            claimed = conn.execute("SELECT next_id FROM sequences").fetchone()[0]
+        finally:
+            conn.close()
+
+        assert ids == list(range(ids[0], ids[0] + 10))
+        assert claimed == ids[0] + ID_BLOCK_SIZE
+
+    def test_import_batch_writes_one_transaction(self, store):
+        """Test that imported rows are visible and indexed once the call returns"""
+        first_id = store.reserve_ids(2)
+        store.import_batch(
+            [("c1", "user", "Imported", 1.0)],
+            [
+                (first_id, "c1", "user", "Archived question", 1.0, None),
+                (first_id + 1, "c1", "ai", "Answer", 2.0, first_id),
+            ],
+        )
+
+        assert store.has_conversation("c1")
+        assert [m["content"] for m in store.load_page("c1")] == [
+            "Archived question",
+            "Answer",
+        ]
+        assert store.search("user", "Archived")[0]["conversation_id"] == "c1"
+
+    def test_search_ranks_and_highlights_matches(self, store):
+        """Test full-text search over committed messages"""
+        store.touch_conversation("c1", "user", "Python")
+        store.append("c1", "user", "How do I reverse a list in Python?")
+        store.append("c1", "ai", "Use slicing: items[::-1] reverses the list.")
+        store.append("c1", "ai", "Unrelated answer about gardening")
+
+        results = store.search("user", "reverse")
+
+        assert len(results) == 2
+        assert results[0]["conversation_id"] == "c1"
+        assert results[0]["title"] == "Python"
+        assert f"{HIGHLIGHT_START}reverse" in results[0]["snippet"]
+        assert HIGHLIGHT_END in results[0]["snippet"]
+
+    def test_search_is_scoped_to_user(self, store):
+        """Test that search never returns other users' messages"""
+        store.touch_conversation("c1", "alice", "Alice")
+        store.touch_conversation("c2", "bob", "Bob")
+        store.append("c1", "user", "secret recipe")
+        store.append("c2", "user", "secret plans")
+
+        results = store.search("alice", "secret")
+
+        assert [r["conversation_id"] for r in results] == ["c1"]
+
+    def test_search_matches_short_terms(self, store):
+        """Test that terms shorter than a trigram still match"""
+        store.touch_conversation("c1", "user", "Short")
+        store.append("c1", "user", "東京で AI の勉強会があります")
+        store.append("c1", "ai", "Tokyo has many AI meetups")
+        store.append("c1", "ai", "Nothing relevant, 100% sure")
+
+        assert [r["id"] for r in store.search("user", "東京")] == [1]
+        results = store.search("user", "ai")
+        assert [r["id"] for r in results] == [2, 1]
+        assert f"{HIGHLIGHT_START}AI{HIGHLIGHT_END}" in results[0]["snippet"]
+        assert [r["id"] for r in store.search("user", "AI meetups")] == [2]
+        assert store.search("user", "0%") != []
+        assert store.search("user", "_") == []
+
+    def test_search_handles_fts_syntax_in_query(self, store):
+        """Test that FTS operators in user input are treated as text"""
+        store.touch_conversation("c1", "user", "Quotes")
+        store.append("c1", "user", 'She said "hello" AND left')
+
+        assert store.search("user", '"hello" AND') != []
+        assert store.search("user", "   ") == []
+
+    def test_search_index_is_built_for_existing_history(self, db_path):
+        """Test that opening an older database indexes its messages"""
+        conn = sqlite3.connect(db_path)
+        conn.executescript(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id TEXT, "
+            "role TEXT, content TEXT, created_at REAL);"
+            "INSERT INTO messages VALUES (1, 'c1', 'user', 'legacy message', 0);"
+        )
+        conn.close()
+
+        store = HistoryStore(db_path)
+        try:
+            store.touch_conversation("c1", "user", "Legacy")
+            assert store.search("user", "legacy")[0]["id"] == 1
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,123 @@
+import gc
+import os
+import sys
+import weakref
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.conversation_cache import ConversationCache
+from src.services.memory_guard import MESSAGE_OVERHEAD, MemoryGuard, messages_size
+
+
+class Owner:
+    """Stand-in for a session's ConversationService"""
+
+    def __init__(self, cache=None):
+        self.cache = cache
+
+
+def make_messages(count, size=1000):
+    return [{"id": i + 1, "role": "user", "content": "x" * size} for i in range(count)]
+
+
+class TestMemoryGuard:
+    """Test suite for MemoryGuard"""
+
+    def test_tracks_sessions_and_reports_heaviest(self):
+        """Test that session sizes are totalled and ranked"""
+        guard = MemoryGuard(high_water=10**9)
+        light, heavy = Owner(), Owner()
+        guard.update("light", light, make_messages(1))
+        guard.update("heavy", heavy, make_messages(3), pinned=500)
+
+        assert guard.top(1) == [("heavy", 3 * (1000 + MESSAGE_OVERHEAD) + 500)]
+        assert guard.stats()["total_bytes"] == 4 * (1000 + MESSAGE_OVERHEAD) + 500
+        assert guard.session_bytes("light") == 1000 + MESSAGE_OVERHEAD
+
+    def test_updates_replace_previous_size(self):
+        """Test that a repeated report adjusts the total instead of adding up"""
+        guard = MemoryGuard(high_water=10**9)
+        owner = Owner()
+        guard.update("s", owner, make_messages(3))
+        guard.update("s", owner, make_messages(1))
+
+        assert guard.stats()["total_bytes"] == messages_size(make_messages(1))
+
+    def test_sheds_idlest_sessions_first(self, tmp_path):
+        """Test that crossing the high-water mark trims idle sessions first"""
+        per_session = messages_size(make_messages(5))
+        guard = MemoryGuard(high_water=int(per_session * 1.5), keep_messages=1)
+        idle_cache = ConversationCache(str(tmp_path / "spill"))
+        idle_cache.put(
+            "parked", {"messages": make_messages(1), "has_older_messages": False}
+        )
+        idle, active = Owner(idle_cache), Owner()
+        idle_messages, active_messages = make_messages(4), make_messages(5)
+
+        with patch("src.services.memory_guard.time.monotonic", side_effect=[1.0, 2.0]):
+            guard.update("idle", idle, idle_messages)
+            guard.update("active", active, active_messages)
+
+        # Other sessions' lists are left to their own threads
+        assert len(idle_messages) == 4
+        assert idle_cache.in_memory() == []
+        assert guard.consume_trim_request("idle") is True
+        assert guard.consume_trim_request("idle") is False
+        assert guard.consume_trim_request("active") is False
+        # The trim only counts once the session reports its new size
+        assert guard.stats()["total_bytes"] > guard.high_water
+
+        guard.update("idle", idle, idle_messages[-1:])
+        assert guard.session_bytes("idle") == messages_size(idle_messages[-1:])
+        assert guard.stats()["total_bytes"] <= guard.high_water
+
+    def test_pending_trims_are_not_shed_twice(self):
+        """Test that reports while a trim is pending do not shed more sessions"""
+        per_session = messages_size(make_messages(5))
+        guard = MemoryGuard(high_water=int(per_session * 1.5), keep_messages=1)
+        idle, active = Owner(), Owner()
+
+        with patch(
+            "src.services.memory_guard.time.monotonic", side_effect=[1.0, 2.0, 3.0]
+        ):
+            guard.update("idle", idle, make_messages(5))
+            guard.update("active", active, make_messages(5))
+            # The idle session has not run since, so its trim is still pending
+            guard.update("active", active, make_messages(5))
+
+        assert guard.consume_trim_request("active") is False
+        assert guard.stats()["sheds"] == 1
+        assert guard.stats()["total_bytes"] == 2 * per_session
+
+    def test_does_not_keep_histories_alive(self):
+        """Test that the guard holds neither the session nor its messages"""
+
+        class Messages(list):
+            pass
+
+        guard = MemoryGuard(high_water=10**9)
+        owner, messages = Owner(), Messages(make_messages(2))
+        guard.update("s", owner, messages)
+        messages_ref = weakref.ref(messages)
+
+        del owner, messages
+        gc.collect()
+
+        assert messages_ref() is None
+
+    def test_forgets_sessions_whose_owner_is_gone(self):
+        """Test that ended sessions no longer count towards the total"""
+        guard = MemoryGuard(high_water=10**9)
+        owner = Owner()
+        guard.update("s", owner, make_messages(2))
+
+        del owner
+        gc.collect()
+
+        assert guard.stats() == {
+            "sessions": 0,
+            "total_bytes": 0,
+            "high_water_bytes": 10**9,
+            "sheds": 0,
+        }
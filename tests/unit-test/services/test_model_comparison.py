@@ -0,0 +1,139 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.admission import AdmissionController, AdmissionRejected
+from src.services.model_comparison import ModelComparison
+
+
+class FakeClient:
+    """Fake client whose models stream at different speeds"""
+
+    def __init__(self):
+        self.events = []
+
+    async def generate(self, prompt, model=None):
+        if model == "broken":
+            raise RuntimeError("model not found")
+        delay = {"fast": 0.001, "slow": 0.01}[model]
+        for i in range(3):
+            await asyncio.sleep(delay)
+            self.events.append(model)
+            yield f"{model}{i} "
+
+
+class TestModelComparison:
+    """Test suite for ModelComparison"""
+
+    def test_streams_are_consumed_concurrently(self):
+        """Test that models stream on one loop and finish independently"""
+        client = FakeClient()
+        updates = []
+
+        runs = ModelComparison(client).run(
+            "Hi", ["slow", "fast"], on_update=lambda run: updates.append(run.model)
+        )
+
+        assert [run.model for run in runs] == ["slow", "fast"]
+        assert runs[1].text == "fast0 fast1 fast2 "
+        # The fast model finishes before the slow one has streamed everything
+        assert client.events.index("fast") < client.events.index("slow")
+        assert client.events[:3] == ["fast", "fast", "fast"]
+        assert updates.count("slow") == 4
+
+    def test_metrics_are_recorded_per_model(self):
+        """Test TTFT and throughput are measured for each model"""
+        runs = ModelComparison(FakeClient()).run("Hi", ["slow", "fast"])
+
+        for run in runs:
+            assert run.done
+            assert run.ttft_ms > 0
+            assert run.tokens_per_second > 0
+        assert runs[1].ttft_ms < runs[0].ttft_ms
+
+    def test_failing_model_does_not_stop_others(self):
+        """Test that one model's error is reported on its own run"""
+        runs = ModelComparison(FakeClient()).run("Hi", ["broken", "fast"])
+
+        assert runs[0].error == "model not found"
+        assert runs[1].text == "fast0 fast1 fast2 "
+
+    def test_comparison_goes_through_admission(self):
+        """Test that a comparison holds a slot and releases it afterwards"""
+        admission = AdmissionController(max_concurrent=1)
+        ModelComparison(FakeClient(), admission, session_id="s").run("Hi", ["fast"])
+        assert admission.stats() == {
+            "active": 0,
+            "queued": 0,
+            "max_concurrent": 1,
+            "max_queue": 16,
+        }
+
+    def test_comparison_holds_a_slot_per_model(self):
+        """Test that a 3-model comparison counts as 3 concurrent generations"""
+        admission = AdmissionController(max_concurrent=4)
+        active = []
+
+        ModelComparison(FakeClient(), admission, session_id="s").run(
+            "Hi",
+            ["fast", "slow", "fast"],
+            on_update=lambda run: active.append(admission.stats()["active"]),
+        )
+
+        assert set(active) == {3}
+        assert admission.stats()["active"] == 0
+
+    def test_comparison_streams_no_more_models_than_slots(self):
+        """Test that a comparison wider than max_concurrent streams in turns"""
+        admission = AdmissionController(max_concurrent=2)
+        client = FakeClient()
+        open_streams = []
+        peak = []
+
+        async def tracked(prompt, model=None):
+            open_streams.append(model)
+            peak.append(len(open_streams))
+            try:
+                async for chunk in FakeClient.generate(client, prompt, model):
+                    yield chunk
+            finally:
+                open_streams.remove(model)
+
+        client.generate = tracked
+        runs = ModelComparison(client, admission, session_id="s").run(
+            "Hi", ["fast", "slow", "fast", "slow"]
+        )
+
+        assert max(peak) == 2
+        assert all(run.done and run.error is None for run in runs)
+        assert admission.stats()["active"] == 0
+
+    def test_comparison_waits_for_enough_slots(self):
+        """Test that a comparison is not admitted while too few slots are free"""
+        admission = AdmissionController(max_concurrent=3)
+        busy = admission.enqueue("busy")
+        assert admission.try_admit(busy) is True
+
+        ticket = admission.enqueue("s", weight=3)
+
+        assert admission.try_admit(ticket) is False
+        admission.release(busy)
+        assert admission.try_admit(ticket) is True
+        assert admission.stats()["active"] == 3
+
+    def test_comparison_is_shed_when_queue_is_full(self):
+        """Test that a comparison is rejected by load shedding"""
+        admission = AdmissionController(max_concurrent=1, max_queue=0)
+        admission.enqueue("busy")
+        comparison = ModelComparison(FakeClient(), admission, session_id="s")
+
+        with pytest.raises(AdmissionRejected):
+            comparison.run("Hi", ["fast"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.background_loop import BackgroundLoop
+from src.services.model_warmer import ModelWarmer
+
+
+class FakeClient:
+    def __init__(self):
+        self.warmed = []
+        self.prewarmed = 0
+
+    async def warm_up(self, model=None):
+        self.warmed.append(model)
+        return True
+
+    async def prewarm_connections(self, count=None):
+        self.prewarmed = count
+
+    def model_status(self, model=None):
+        return "warm" if model in self.warmed else "cold"
+
+
+class TestModelWarmer:
+    """Test suite for ModelWarmer"""
+
+    @pytest.fixture
+    def loop(self):
+        loop = BackgroundLoop()
+        yield loop
+        loop.stop()
+
+    def test_warms_each_model_once_at_startup(self, loop):
+        """Test that every configured model is preloaded"""
+        client = FakeClient()
+        warmer = ModelWarmer(
+            client, ["a", "b", "a"], loop, refresh_interval=0, prewarm_connections=2
+        )
+
+        warmer.start().result(timeout=5)
+
+        assert sorted(client.warmed) == ["a", "b"]
+        assert client.prewarmed == 2
+        assert warmer.statuses() == {"a": "warm", "b": "warm"}
+
+    def test_refreshes_keep_alive_on_schedule(self, loop):
+        """Test that models are re-warmed every refresh interval"""
+        client = FakeClient()
+        warmer = ModelWarmer(client, ["a"], loop, refresh_interval=0.01)
+
+        warmer.start()
+        loop.run(asyncio.sleep(0.1))
+        warmer.stop()
+
+        assert client.warmed.count("a") >= 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,57 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.stream_buffer import StreamBuffer
+
+
+class TestStreamBuffer:
+    """Test suite for StreamBuffer"""
+
+    def test_reveals_chunks_in_order(self):
+        """Test that revealed chunks are joined into the visible text"""
+        buffer = StreamBuffer()
+        for chunk in ["Hel", "lo", " world"]:
+            buffer.append(chunk)
+
+        assert buffer.text == ""
+        assert buffer.reveal() == 1
+        assert buffer.text == "Hel"
+        assert buffer.reveal(5) == 2
+        assert buffer.text == "Hello world"
+        assert buffer.pending == 0
+        assert buffer.reveal() == 0
+
+    def test_text_is_extended_once_per_reveal(self):
+        """Test that the visible text is cached between reveals"""
+        buffer = StreamBuffer(["a", "b", "c"])
+        buffer.reveal()
+        first = buffer.text
+        buffer.reveal(2)
+
+        assert buffer.text == "abc"
+        assert buffer.text is buffer.text
+        assert first == "a"
+        assert buffer.revealed == 3
+
+    def test_reveals_every_chunk_due_per_frame(self):
+        """Test that a frame reveals all chunks that came due since the last"""
+        buffer = StreamBuffer(str(i) for i in range(10))
+
+        assert buffer.reveal_due(rate=10, now=4.0) == 1
+        assert buffer.reveal_due(rate=10, now=4.01) == 1
+        assert buffer.reveal_due(rate=10, now=4.5) == 4
+        assert buffer.text == "012345"
+        assert buffer.reveal_due(rate=10, now=60.0) == 4
+        assert buffer.pending == 0
+
+    def test_release_drops_chunks(self):
+        """Test that release frees both pending and visible text"""
+        buffer = StreamBuffer(["a", "b"])
+        buffer.reveal()
+
+        buffer.release()
+
+        assert buffer.pending == 0
+        assert buffer.text == ""
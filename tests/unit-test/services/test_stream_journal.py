@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.stream_journal import StreamJournal
+
+
+class TestStreamJournal:
+    """Test suite for StreamJournal"""
+
+    @pytest.fixture
+    def journal(self, tmp_path):
+        return StreamJournal(
+            str(tmp_path / "journal"), checkpoint_chunks=2, checkpoint_interval=60
+        )
+
+    def test_checkpoints_every_n_chunks(self, journal):
+        """Test that only checkpointed chunks are visible after a crash"""
+        writer = journal.begin("c1")
+        for chunk in ["a", "b", "c"]:
+            writer.append(chunk)
+        # Simulate the process dying: the writer is never completed
+        journal._release("c1")
+
+        assert journal.recover("c1") == ("ab", False)
+
+    def test_completed_reply_is_recovered_in_full(self, journal):
+        """Test that a completed journal reports the full reply"""
+        writer = journal.begin("c1")
+        for chunk in ["Hello", " ", "world"]:
+            writer.append(chunk)
+        writer.complete()
+
+        assert journal.recover("c1") == ("Hello world", True)
+
+    def test_active_journal_is_not_recovered(self, journal):
+        """Test that a reply still being received is left alone"""
+        writer = journal.begin("c1")
+        writer.append("a")
+        writer.checkpoint()
+
+        assert journal.is_active("c1") is True
+        assert journal.recover("c1") is None
+        writer.close()
+
+    def test_torn_record_is_ignored(self, journal, tmp_path):
+        """Test that a partially written final record does not break recovery"""
+        writer = journal.begin("c1")
+        writer.append("a")
+        writer.append("b")
+        writer.close()
+        with open(journal._path("c1"), "a") as f:
+            f.write('{"t": "chunk", "te')
+
+        assert journal.recover("c1") == ("ab", False)
+
+    def test_discard_removes_journal(self, journal):
+        """Test that discarded journals have nothing to recover"""
+        journal.begin("c1").complete()
+        journal.discard("c1")
+        assert journal.recover("c1") is None
+
+    def test_keys_stay_inside_the_directory(self, journal, tmp_path):
+        """Test that a key with path segments cannot name a file elsewhere"""
+        journal.begin("../outside").complete()
+
+        assert list(tmp_path.glob("*.journal")) == []
+        assert len(list((tmp_path / "journal").iterdir())) == 1
+        assert journal.recover("../outside") == ("", True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.admission import AdmissionController
+from src.services.summarizer import ConversationSummarizer
+
+
+def wait_until_idle(summarizer, conversation_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while summarizer.is_running(conversation_id):
+        assert time.monotonic() < deadline, "summarizer did not finish"
+        time.sleep(0.01)
+
+
+class TestConversationSummarizer:
+    """Test suite for ConversationSummarizer"""
+
+    @pytest.fixture
+    def client(self):
+        client = Mock()
+        client.prompts = []
+
+        async def mock_generate(prompt, model=None):
+            client.prompts.append(prompt)
+            yield f"summary #{len(client.prompts)}"
+
+        client.generate = mock_generate
+        return client
+
+    def test_summary_is_built_in_background(self, client):
+        """Test that scheduled messages are folded into a cached summary"""
+        summarizer = ConversationSummarizer()
+        messages = [
+            {"id": 1, "role": "user", "content": "My name is Ada"},
+            {"id": 2, "role": "ai", "content": "Nice to meet you, Ada"},
+        ]
+
+        assert summarizer.schedule(client, "c1", messages) is True
+        wait_until_idle(summarizer, "c1")
+
+        assert summarizer.get("c1") == {"text": "summary #1", "through_id": 2}
+        assert "User: My name is Ada" in client.prompts[0]
+        assert "(none)" in client.prompts[0]
+
+    def test_summary_is_refreshed_incrementally(self, client):
+        """Test that a refresh sends the previous summary and only new turns"""
+        summarizer = ConversationSummarizer()
+        summarizer.schedule(client, "c1", [{"id": 1, "role": "user", "content": "Old"}])
+        wait_until_idle(summarizer, "c1")
+
+        summarizer.schedule(client, "c1", [{"id": 3, "role": "ai", "content": "New"}])
+        wait_until_idle(summarizer, "c1")
+
+        assert "summary #1" in client.prompts[1]
+        assert "Old" not in client.prompts[1]
+        assert summarizer.get("c1")["through_id"] == 3
+
+    def test_summary_waits_for_an_admission_slot(self, client):
+        """Test that a summary is only generated once it holds a slot"""
+        admission = AdmissionController(max_concurrent=1)
+        chat = admission.enqueue("chat-session")
+        summarizer = ConversationSummarizer(admission=admission)
+
+        with patch("src.services.summarizer.QUEUE_POLL_INTERVAL", 0.01):
+            summarizer.schedule(
+                client, "c1", [{"id": 1, "role": "user", "content": "x"}]
+            )
+            time.sleep(0.1)
+            assert client.prompts == []
+            assert admission.stats()["queued"] == 1
+
+            admission.release(chat)
+            wait_until_idle(summarizer, "c1")
+
+        assert summarizer.get("c1")["text"] == "summary #1"
+        assert admission.stats()["active"] == 0
+
+    def test_failed_compaction_keeps_previous_summary(self):
+        """Test that an upstream failure does not drop the cached summary"""
+        client = Mock()
+
+        async def failing_generate(prompt, model=None):
+            raise RuntimeError("upstream down")
+            yield
+
+        client.generate = failing_generate
+        summarizer = ConversationSummarizer()
+        summarizer.schedule(client, "c1", [{"id": 1, "role": "user", "content": "x"}])
+        wait_until_idle(summarizer, "c1")
+
+        assert summarizer.get("c1") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
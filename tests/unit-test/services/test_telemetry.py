@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../../"))
+
+from src.services.telemetry import (
+    ContextFilter,
+    JsonFormatter,
+    OtlpFileHandler,
+    RequestTrace,
+    configure_logging,
+    current_request,
+)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestTelemetry:
+    """Test suite for request tracing and log handlers"""
+
+    @pytest.fixture
+    def records(self):
+        handler = RecordingHandler()
+        handler.addFilter(ContextFilter())
+        logger = logging.getLogger("src.services.telemetry")
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        yield handler.records
+        logger.removeHandler(handler)
+        logger.setLevel(logging.NOTSET)
+
+    def test_events_carry_correlation_fields(self, records):
+        """Test that trace events include the request's bound fields"""
+        trace = RequestTrace(session_id="s1", conversation_id="c1")
+        trace.bind(message_id=7)
+        trace.event("request.finish", total_ms=12.5)
+
+        record = records[0]
+        assert record.event == "request.finish"
+        assert record.attributes["request_id"] == trace.request_id
+        assert record.attributes["session_id"] == "s1"
+        assert record.attributes["message_id"] == 7
+        assert record.attributes["total_ms"] == 12.5
+
+    def test_chunk_events_are_sampled(self, records):
+        """Test that only one in sample_rate chunk events is logged"""
+        trace = RequestTrace(sample_rate=10)
+        for _ in range(25):
+            trace.chunk("x")
+
+        assert [r.attributes["index"] for r in records] == [1, 11, 21]
+
+    def test_context_filter_stamps_untraced_records(self, records):
+        """Test that plain records logged while a trace is current are correlated"""
+        trace = RequestTrace(session_id="s1")
+        token = trace.activate()
+        try:
+            logging.getLogger("src.services.telemetry").warning("upstream slow")
+        finally:
+            current_request.reset(token)
+
+        assert records[0].attributes["request_id"] == trace.request_id
+
+    def test_json_formatter(self, records):
+        """Test that events are formatted as flat JSON objects"""
+        RequestTrace(session_id="s1").event("stream.start", prompt_chars=5)
+        entry = json.loads(JsonFormatter().format(records[0]))
+
+        assert entry["event"] == "stream.start"
+        assert entry["session_id"] == "s1"
+        assert entry["prompt_chars"] == 5
+
+    def test_otlp_file_handler(self, records, tmp_path):
+        """Test that records are written as OTLP/JSON log requests"""
+        trace = RequestTrace(session_id="s1")
+        trace.event("request.finish", total_ms=3.0)
+        path = tmp_path / "otlp" / "logs.jsonl"
+        handler = OtlpFileHandler(str(path))
+        handler.emit(records[0])
+        handler.close()
+
+        line = json.loads(path.read_text().splitlines()[0])
+        log_record = line["resourceLogs"][0]["scopeLogs"][0]["logRecords"][0]
+        attributes = {a["key"]: a["value"] for a in log_record["attributes"]}
+        assert log_record["traceId"] == trace.request_id
+        assert attributes["event.name"] == {"stringValue": "request.finish"}
+        assert attributes["total_ms"] == {"doubleValue": 3.0}
+
+    def test_configure_logging_delivers_records_off_thread(self, tmp_path):
+        """Test that records reach the sinks through the queue listener"""
+        path = tmp_path / "logs.jsonl"
+        root = logging.getLogger()
+        level, handlers = root.level, list(root.handlers)
+        listener = configure_logging("DEBUG", otlp_path=str(path))
+        try:
+            RequestTrace(session_id="s1").event("request.start")
+        finally:
+            listener.stop()
+            for handler in listener.handlers:
+                handler.close()
+            for handler in root.handlers[len(handlers) :]:
+                root.removeHandler(handler)
+            root.setLevel(level)
+
+        assert "request.start" in path.read_text()
@@ -0,0 +1,132 @@
+import asyncio
+import io
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../"))
+
+from src.batch_generate import completed_ids, generate_one, read_prompts, run_batch
+from src.clients.ollama_api_client import OllamaApiClient
+
+
+class RecordingClient:
+    """Fake client that tracks how many generations run at once"""
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt, model=None, on_done=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if prompt == "fail":
+                raise RuntimeError("boom")
+            for word in prompt.split():
+                yield word
+            on_done({"eval_count": len(prompt.split())})
+        finally:
+            self.active -= 1
+
+
+class TestBatchGenerate:
+    """Test suite for the batch generation CLI"""
+
+    @pytest.fixture
+    def prompts_file(self, tmp_path):
+        path = tmp_path / "prompts.jsonl"
+        lines = [
+            json.dumps({"id": f"p{i}", "prompt": f"prompt {i}"}) for i in range(10)
+        ]
+        lines.insert(3, "not json")
+        lines.append(json.dumps({"prompt": "fail"}))
+        path.write_text("\n".join(lines) + "\n")
+        return str(path)
+
+    def test_read_prompts_streams_valid_records(self, prompts_file):
+        """Test that invalid lines are skipped and missing ids use line numbers"""
+        items = list(read_prompts(prompts_file))
+        assert items[0] == ("p0", "prompt 0")
+        assert items[-1] == ("12", "fail")
+        assert len(items) == 11
+
+    async def test_run_batch_bounds_concurrency(self, prompts_file):
+        """Test that no more than `concurrency` generations run at once"""
+        client = RecordingClient()
+        output = io.StringIO()
+
+        stats = await run_batch(
+            client, read_prompts(prompts_file), output, concurrency=3
+        )
+
+        assert client.peak == 3
+        assert stats["completed"] == 10
+        assert stats["failed"] == 1
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        by_id = {r["id"]: r for r in results}
+        assert by_id["p4"]["response"] == "prompt4"
+        assert by_id["p4"]["ttft_ms"] is not None
+        assert by_id["12"]["error"] == "boom"
+
+    async def test_resume_skips_completed_items(self, prompts_file, tmp_path):
+        """Test that a rerun only processes items that did not succeed"""
+        output_path = tmp_path / "results.jsonl"
+        output_path.write_text(
+            json.dumps({"id": "p0", "response": "done"})
+            + "\n"
+            + json.dumps({"id": "12", "error": "boom"})
+            + "\n"
+            + '{"id": "p1", "resp'
+        )
+        skip = completed_ids(str(output_path))
+        assert skip == {"p0"}
+
+        output = io.StringIO()
+        stats = await run_batch(
+            RecordingClient(), read_prompts(prompts_file), output, skip=skip
+        )
+
+        assert stats["skipped"] == 1
+        assert "p0" not in output.getvalue()
+
+    @pytest.mark.parametrize(
+        "response",
+        [
+            httpx.ConnectError("connection refused"),
+            httpx.Response(500, text="model crashed"),
+            httpx.Response(200, text='data: {"response": "partial"}\n\n'),
+        ],
+    )
+    async def test_upstream_failure_is_retryable(self, response, tmp_path):
+        """Test that failures the client swallows are recorded as errors"""
+
+        def handler(request):
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        real_async_client = httpx.AsyncClient
+
+        def async_client(**kwargs):
+            return real_async_client(transport=httpx.MockTransport(handler), **kwargs)
+
+        with patch(
+            "src.clients.ollama_api_client.client.httpx.AsyncClient", async_client
+        ):
+            client = OllamaApiClient("http://ollama.test", default_model="m")
+            result = await generate_one(client, "p0", "hello")
+
+        assert "error" in result
+        output_path = tmp_path / "results.jsonl"
+        output_path.write_text(json.dumps(result) + "\n")
+        assert completed_ids(str(output_path)) == set()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../"))
+
+from src.history_archive import count_records
+from src.services.history_store import HistoryStore
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "../../src/history_archive.py")
+
+
+class TestHistoryArchive:
+    """Test suite for the history archive CLI"""
+
+    def run(self, *args):
+        return subprocess.run(
+            [sys.executable, SCRIPT, *args], capture_output=True, text=True
+        )
+
+    def test_count_records(self):
+        """Test that records pass through while being counted"""
+        stats = {"conversations": 0, "messages": 0}
+        records = [{"type": "archive"}, {"type": "conversation"}, {"type": "message"}]
+
+        assert list(count_records(records, stats)) == records
+        assert stats == {"conversations": 1, "messages": 1}
+
+    def test_export_then_import(self, tmp_path):
+        """Test a gzipped round trip between two databases"""
+        source_db = str(tmp_path / "source.sqlite3")
+        store = HistoryStore(source_db)
+        store.touch_conversation("c1", "alice", "Title")
+        store.append("c1", "user", "Hello")
+        store.close()
+        archive = str(tmp_path / "history.jsonl.gz")
+
+        exported = self.run("export", archive, "--db", source_db)
+        imported = self.run("import", archive, "--db", str(tmp_path / "target.sqlite3"))
+
+        assert exported.returncode == 0, exported.stderr
+        assert json.loads(exported.stderr.splitlines()[-1])["messages"] == 1
+        assert imported.returncode == 0, imported.stderr
+        assert json.loads(imported.stderr.splitlines()[-1])["conversations"] == 1
+
+    def test_import_rejects_other_files(self, tmp_path):
+        """Test that a non-archive input fails without importing"""
+        path = tmp_path / "prompts.jsonl"
+        path.write_text('{"prompt": "hi"}\n')
+
+        result = self.run("import", str(path), "--db", str(tmp_path / "db.sqlite3"))
+
+        assert result.returncode == 1
+        assert "Not a history archive" in result.stderr
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
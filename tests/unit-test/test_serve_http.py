@@ -0,0 +1,160 @@
+import http.client
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../"))
+
+from src.serve_http import ChatServer
+from src.services.archive import encode_archive, export_records
+from src.services.background_loop import BackgroundLoop
+from src.services.chat_engine import ChatEngine
+from src.services.history_store import HistoryStore
+
+
+class WordClient:
+    """Fake client replying with the prompt's words"""
+
+    async def generate(self, prompt, model=None, context=None, on_done=None, stop=None):
+        for word in prompt.split():
+            yield word + " "
+        on_done({"eval_count": len(prompt.split())})
+
+
+def read_events(response):
+    events = []
+    for block in response.read().decode("utf-8").split("\n\n"):
+        if block:
+            kind, data = block.split("\n")
+            events.append((kind[len("event: ") :], json.loads(data[len("data: ") :])))
+    return events
+
+
+class TestServeHttp:
+    """Test suite for the HTTP/SSE adapter"""
+
+    @pytest.fixture
+    def server(self):
+        loop = BackgroundLoop()
+        server = ChatServer(("127.0.0.1", 0), ChatEngine(WordClient()), loop)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield server
+        server.shutdown()
+        server.server_close()
+        loop.stop()
+
+    def request(self, server, method, path, body=None):
+        connection = http.client.HTTPConnection(*server.server_address[:2])
+        connection.request(method, path, body=json.dumps(body) if body else None)
+        return connection.getresponse()
+
+    def test_post_streams_events(self, server):
+        """Test that a message is answered with token events and a done event"""
+        response = self.request(
+            server, "POST", "/v1/conversations/c1/messages", {"content": "hi there"}
+        )
+
+        assert response.status == 200
+        assert response.getheader("Content-Type").startswith("text/event-stream")
+        events = read_events(response)
+        assert events[:2] == [("token", {"text": "hi "}), ("token", {"text": "there "})]
+        kind, data = events[2]
+        assert kind == "done"
+        assert data["message"] == {"role": "ai", "content": "hi there "}
+        assert data["timings"] == {"eval_count": 2}
+
+        response = self.request(server, "GET", "/v1/conversations/c1/messages")
+        messages = json.loads(response.read())["messages"]
+        assert [m["role"] for m in messages] == ["user", "ai"]
+
+    def test_invalid_requests(self, server):
+        """Test that malformed bodies and unknown paths are rejected"""
+        path = "/v1/conversations/c1/messages"
+        assert self.request(server, "POST", path, {"text": "x"}).status == 400
+        assert self.request(server, "POST", path, {"content": "  "}).status == 400
+        assert self.request(server, "GET", "/v1/unknown").status == 404
+
+    def test_least_recently_used_conversations_are_dropped(self, server):
+        """Test that only the most recently used conversation states are kept"""
+        server.max_conversations = 2
+        for conversation_id in ["c1", "c2", "c1", "c3"]:
+            path = f"/v1/conversations/{conversation_id}/messages"
+            self.request(server, "GET", path).read()
+
+        assert list(server._conversations) == ["c1", "c3"]
+
+    def test_export_streams_archive(self):
+        """Test that the export endpoint streams the encoded archive"""
+        calls = []
+
+        def export_archive(user_id, compress):
+            calls.append((user_id, compress))
+            yield b'{"type": "archive", "version": 1}\n'
+            yield b'{"type": "conversation", "id": "c1"}\n'
+
+        loop = BackgroundLoop()
+        server = ChatServer(
+            ("127.0.0.1", 0), ChatEngine(WordClient()), loop, export_archive
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            response = self.request(server, "GET", "/v1/export?user=u1&gzip=1")
+            body = response.read()
+        finally:
+            server.shutdown()
+            server.server_close()
+            loop.stop()
+
+        assert response.status == 200
+        assert response.getheader("Content-Type") == "application/gzip"
+        assert body.count(b"\n") == 2
+        assert calls == [("u1", True)]
+
+    def test_conversations_are_exported(self, tmp_path):
+        """Test that a conversation created over HTTP is recorded for its user"""
+        history = HistoryStore(str(tmp_path / "history.sqlite3"), flush_interval=0.01)
+        loop = BackgroundLoop()
+
+        def export_archive(user_id, compress):
+            return encode_archive(export_records(history, user_id), compress=compress)
+
+        server = ChatServer(
+            ("127.0.0.1", 0),
+            ChatEngine(WordClient(), history=history),
+            loop,
+            export_archive,
+        )
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            for path, content in [
+                ("/v1/conversations/c1/messages", "hi"),
+                ("/v1/conversations/c2/messages?user=u1", "other"),
+            ]:
+                self.request(server, "POST", path, {"content": content}).read()
+            history.flush()
+            response = self.request(server, "GET", "/v1/export?user=api")
+            records = [json.loads(line) for line in response.read().splitlines()]
+        finally:
+            server.shutdown()
+            server.server_close()
+            loop.stop()
+            history.close()
+
+        assert [(r["type"], r.get("id")) for r in records[1:2]] == [
+            ("conversation", "c1")
+        ]
+        assert [r["content"] for r in records if r["type"] == "message"] == [
+            "hi",
+            "hi ",
+        ]
+        assert [c["id"] for c in history.list_conversations("u1")] == ["c2"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])